@@ -0,0 +1,181 @@
+"""
+Responses for the stand-in servers, shaped like the ones recorded from
+universalis, XIVAPI and the wiki and scaled up to any number of items.
+
+Everything is derived from the item id or name, so the same request always
+gets the same response.
+"""
+
+import json
+import re
+import zlib
+from typing import Any, Dict, List, Optional
+
+# one item of a universalis multi-item response, trimmed to the fields that
+# are read; pass a recorded one to UniversalisFixture to replay it instead
+UNIVERSALIS_ITEM = {
+    "itemID": 0,
+    "worldID": 53,
+    "lastUploadTime": 1700000000000,
+    "currentAveragePriceNQ": 0.0,
+    "nqSaleVelocity": 0.0,
+    "minPriceNQ": 0,
+    "averagePrice": 0.0,
+    "listings": [],
+    "recentHistory": [],
+}
+LISTINGS_PER_ITEM = 20
+SALES_PER_ITEM = 50
+
+def name_id(name: str) -> int:
+    # a stable id for a generated item name
+    return zlib.crc32(name.encode("utf-8")) % 40000 + 1
+
+class UniversalisFixture:
+    def __init__(
+            self,
+            template: Optional[Dict[str, Any]] = None,
+            listings: int = LISTINGS_PER_ITEM,
+            sales: int = SALES_PER_ITEM,
+        ):
+        self.template = template or UNIVERSALIS_ITEM
+        self.listings = listings
+        self.sales = sales
+
+    @classmethod
+    def from_recording(cls, path: str) -> "UniversalisFixture":
+        """
+        Replay a recorded response: either a single item, or a multi-item
+        response whose first item is used.
+        """
+        with open(path, "r") as f:
+            recorded = json.load(f)
+        if "items" in recorded:
+            recorded = next(iter(recorded["items"].values()))
+        return cls(
+            recorded,
+            len(recorded.get("listings", [])),
+            len(recorded.get("recentHistory", [])),
+        )
+
+    def item(self, item_id: int) -> Dict[str, Any]:
+        base = 100 + item_id % 997
+        item = dict(self.template)
+        recorded_listings = self.template.get("listings") or []
+        recorded_sales = self.template.get("recentHistory") or []
+        item.update({
+            "itemID": item_id,
+            "currentAveragePriceNQ": base * 1.1,
+            "nqSaleVelocity": item_id % 13 + 0.5,
+            "minPriceNQ": base,
+            "listings": recorded_listings or [
+                {
+                    "listingID": f"{item_id}-{k}",
+                    "pricePerUnit": base + 3 * k,
+                    "quantity": k % 5 + 1,
+                    "hq": k % 4 == 0,
+                }
+                for k in range(self.listings)
+            ],
+            "recentHistory": recorded_sales or [
+                {
+                    "pricePerUnit": base + k % 7,
+                    "quantity": k % 3 + 1,
+                    "hq": k % 4 == 0,
+                    "timestamp": 1700000000 - 3600 * k,
+                }
+                for k in range(self.sales)
+            ],
+        })
+        return item
+
+    def response(self, item_ids: List[int]) -> Dict[str, Any]:
+        if len(item_ids) == 1:
+            return self.item(item_ids[0])
+        return {
+            "itemIDs": item_ids,
+            "items": {str(item_id): self.item(item_id) for item_id in item_ids},
+            "unresolvedItems": [],
+        }
+
+def xivapi_search(name: str) -> Dict[str, Any]:
+    """
+    An index_search response with the one result that was asked for.
+    """
+    item_id = name_id(name)
+    return {
+        "Pagination": {"Page": 1, "Results": 1, "ResultsTotal": 1},
+        "Results": [{
+            "ID": item_id,
+            "Name": name,
+            "IsUntradable": int(item_id % 10 == 0),
+            "PriceMid": item_id % 500 + 10,
+            "PriceLow": item_id % 50,
+        }],
+    }
+
+def item_names(page: str, rows: int) -> List[str]:
+    return [f"Benchmark {page} Item {k}" for k in range(rows)]
+
+def _page(tables: str) -> str:
+    return f"<html><head></head><body><div>{tables}</div></body></html>"
+
+def npc_table_page(page: str, rows: int) -> str:
+    """
+    A vendor page of "npc sortable" tables, like the quartermaster and scrip
+    exchange pages.
+    """
+    body = "".join(
+        f'<tr id="vendor{k}"><td>\xa0\xa0{name}</td><td>Misc</td>'
+        f'<td data-sort-value="{"purple" if k % 2 else "white"}">'
+        f"\xa0{k % 900 + 100:,}\n</td></tr>"
+        for k, name in enumerate(item_names(page, rows))
+    )
+    return _page(
+        '<table class="npc sortable"><tr><th>Item</th><th>Type</th>'
+        f"<th>Cost</th></tr>{body}</table>"
+    )
+
+def item_table_page(page: str, rows: int) -> str:
+    """
+    An "item sortable" table with a header row, like the tomestone pages.
+    """
+    body = "".join(
+        f"<tr><td>\xa0\xa0{name}</td><td>Misc</td><td>\xa0{k % 900 + 100}\n</td></tr>"
+        for k, name in enumerate(item_names(page, rows))
+    )
+    return _page(
+        '<table class="item sortable"><tr><th>Item</th><th>Type</th>'
+        f"<th>Cost</th></tr>{body}</table>"
+    )
+
+def poetics_page(page: str, rows: int) -> str:
+    """
+    The poetics page: one "item table" whose cells run name, type, cost
+    after a leading expansion cell.
+    """
+    cells = "".join(
+        f"<td>\xa0\xa0{name}</td><td>Misc</td><td>\xa0{k % 900 + 100}\n</td>"
+        for k, name in enumerate(item_names(page, rows))
+    )
+    return _page(
+        f'<table class="item table"><tr><td>Endwalker</td>{cells}</tr></table>'
+    )
+
+# the start of each wiki page's path -> how it's laid out
+WIKI_LAYOUTS = {
+    "Allagan_Tomestone_of_Poetics": poetics_page,
+    "Allagan_Tomestone_of_Causality": item_table_page,
+}
+
+def wiki_page(path: str, rows: int) -> str:
+    page = path.split("/wiki/", 1)[-1]
+    layout = next(
+        (
+            layout for prefix, layout in WIKI_LAYOUTS.items()
+            if page.startswith(prefix)
+        ),
+        npc_table_page,
+    )
+    # item names are made from the page name, so every page has its own
+    return layout(re.sub(r"\W+", " ", page).strip(), rows)
@@ -0,0 +1,345 @@
+"""
+End-to-end timings of the network bound paths of ffxiv_shugo, against the
+local stand-ins in benchmarks.stand_ins so that they run anywhere and the
+numbers only change when the code does.
+
+    python -m benchmarks.run --sizes 100 1000 --latency-ms 0 50 \\
+        --output results.json --compare previous_results.json
+
+The fetch_prices_materia and select_rows_items_by_currency cases run what
+each app does when its form is submitted after "Refresh data", with
+streamlit in bare mode so nothing is rendered. The currency app has no
+fetch_prices; it builds its ranking index (which looks up the prices) and
+then calls select_rows for each currency.
+
+Each case is run at every size and latency: size is the number of items
+asked for, or the number of rows on each wiki page for the scraper. The
+results file holds p50/p99 per call, throughput in items per second and the
+peak memory traced during one extra call. tracemalloc only sees what Python
+allocates, not arrow's buffers, so the process's max RSS so far is recorded
+alongside it.
+
+The scraper skips the bicolor gemstone page, which needs a browser.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:
+    # not on windows
+    resource = None
+
+from benchmarks.fixtures import UniversalisFixture
+from benchmarks.stand_ins import StandInServer
+
+CASES = [
+    "lookup_prices_cold",
+    "lookup_prices_warm",
+    "fetch_prices_from_api",
+    "fetch_prices_from_api_async",
+    "select_rows_items_by_currency",
+    "fetch_prices_materia",
+    "load_data_items_by_currency",
+    "load_data_materia",
+    "scraper_main",
+]
+DEFAULT_SIZES = [100, 500]
+DEFAULT_LATENCIES_MS = [0, 50]
+# the stand-ins take whatever they're sent, so only the real hosts' limits
+# should hold the benchmarks back
+UNLIMITED_HOST = {
+    "HTTP_DEFAULT_RATE": "100000",
+    "HTTP_DEFAULT_BURST": "100000",
+    "HTTP_DEFAULT_MAX_CONCURRENCY": "16",
+}
+
+Case = Callable[[], int]
+
+def prepare_environment(server: StandInServer, base_dir: str) -> None:
+    """
+    Point ffxiv_shugo at the stand-ins and a scratch BASE_DIR. Has to run
+    before anything from ffxiv_shugo is imported.
+    """
+    os.makedirs(os.path.join(base_dir, "data"), exist_ok=True)
+    with open(os.path.join(base_dir, "secrets.toml"), "w") as f:
+        f.write('[ffxivapi]\napi_key = "benchmark"\n')
+    os.environ.update({
+        "BASE_DIR": base_dir,
+        "UNIVERSALIS_API_URL": f"{server.url}/api/v2",
+        "XIVAPI_BASE_URL": server.url,
+        "WIKI_BASE_URL": f"{server.url}/wiki",
+    })
+    for name, value in UNLIMITED_HOST.items():
+        os.environ.setdefault(name, value)
+    # measure the direct path, not whatever a local setup routes through
+    for name in ("PRICE_SERVICE_URL", "PRICES_FROM_STORE_ONLY"):
+        os.environ.pop(name, None)
+
+def write_catalog_tables(size: int) -> None:
+    import pandas as pd
+    from ffxiv_shugo.data_store import write_table
+
+    currencies = ["poetics", "gc_seals", "wolf_marks", "minor_tome"]
+    write_table("items_by_currency", pd.DataFrame({
+        "id": range(1, size + 1),
+        "item_name": [f"Item {k}" for k in range(1, size + 1)],
+        "currency_cost": [k % 900 + 1 for k in range(size)],
+        "currency_type": [currencies[k % len(currencies)] for k in range(size)],
+        "is_untradable": [k % 10 == 0 for k in range(size)],
+    }))
+    write_table("materia", pd.DataFrame({
+        "id": range(1, size + 1),
+        "grade_idx": [k % 10 for k in range(size)],
+        "grade_name": [str(k % 10) for k in range(size)],
+        "materia_type": [
+            ("combat", "crafting", "gathering")[k % 3] for k in range(size)
+        ],
+        "materia_name": [f"Materia {k}" for k in range(size)],
+        "stat_boosted": [f"Stat {k % 13}" for k in range(size)],
+    }))
+
+def build_cases(size: int) -> Dict[str, Case]:
+    import streamlit as st
+    from streamlit import config
+    from streamlit.logger import set_log_level
+
+    # bare mode warns on every call that there's no app running. Parsing the
+    # config sets the log level, so it's parsed first
+    config.get_option("logger.level")
+    set_log_level("error")
+    from ffxiv_shugo.apps import item_by_currency_price_lookup, materia_price_lookup
+    from ffxiv_shugo.scripts import scrape_for_items_by_currency as scraper
+    from ffxiv_shugo.data_store import read_table
+    from ffxiv_shugo.market_depth import SELL_HORIZON_DAYS
+    from ffxiv_shugo.page_fetch import FetchBackend
+    from ffxiv_shugo.utilities import (
+        fetch_prices_from_api,
+        fetch_prices_from_api_async,
+        lookup_prices,
+    )
+
+    item_ids = list(range(1, size + 1))
+    http_loaders = [
+        name for name, (_, _, backend, _) in scraper.DATA_LOADERS.items()
+        if backend == FetchBackend.HTTP
+    ]
+
+    def run_scraper() -> int:
+        # main runs on the current event loop, which an asyncio.run in an
+        # earlier case will have cleared
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            scraper.main(["--force", "--loaders", *http_loaders])
+        finally:
+            loop.close()
+            asyncio.set_event_loop(None)
+        return len(read_table(scraper.OUTPUT_TABLE))
+
+    def select_rows_items_by_currency() -> int:
+        app = item_by_currency_price_lookup
+        data = app.load_data()
+        currencies = data["currency_type"].unique().tolist()
+        st.session_state["refresh_prices"] = True
+        index, _ = app.load_ranking_index(data, currencies, 1, SELL_HORIZON_DAYS)
+        for currency in currencies:
+            app.select_rows(
+                index.top_k(currency, 25),
+                st.empty(),
+                app.DEFAULT_KEYS,
+                "best_spend_value",
+                "False",
+            )
+        return len(index.data)
+
+    def fetch_prices_materia() -> int:
+        app = materia_price_lookup
+        data = app.load_data()
+        st.session_state["refresh_prices"] = True
+        app.fetch_prices(
+            data,
+            st.empty(),
+            app.DEFAULT_COLS_TO_SHOW,
+            app.SORT_OPTIONS[0],
+            "False",
+        )
+        return len(data)
+
+    return {
+        "lookup_prices_cold": lambda: len(lookup_prices(item_ids, refresh=True)),
+        "lookup_prices_warm": lambda: len(lookup_prices(item_ids)),
+        "fetch_prices_from_api": lambda: len(fetch_prices_from_api(item_ids)),
+        "fetch_prices_from_api_async": lambda: len(
+            asyncio.run(fetch_prices_from_api_async(item_ids))
+        ),
+        "select_rows_items_by_currency": select_rows_items_by_currency,
+        "fetch_prices_materia": fetch_prices_materia,
+        "load_data_items_by_currency": lambda: len(
+            item_by_currency_price_lookup.load_data()
+        ),
+        "load_data_materia": lambda: len(materia_price_lookup.load_data()),
+        "scraper_main": run_scraper,
+    }
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+def max_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # kilobytes on linux, bytes on macos
+    scale = 2 ** 20 if platform.system() == "Darwin" else 2 ** 10
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+def measure(case: Case, repeat: int) -> Dict[str, Any]:
+    case()  # warm up imports, pools and the os page cache
+    durations = []
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = case()
+        durations.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        case()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    total = sum(durations)
+    return {
+        "items": items,
+        "p50_s": percentile(durations, 0.5),
+        "p99_s": percentile(durations, 0.99),
+        "mean_s": statistics.mean(durations),
+        "throughput_items_per_s": items * len(durations) / total if total else None,
+        "peak_memory_mb": peak / 2 ** 20,
+        "max_rss_mb": max_rss_mb(),
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: List[Dict[str, Any]], path: str) -> None:
+    with open(path, "r") as f:
+        previous = {
+            (row["case"], row["size"], row["latency_ms"]): row
+            for row in json.load(f)["results"]
+        }
+    print(f"\nCompared to {path} (p50, new / old):")
+    for row in results:
+        old = previous.get((row["case"], row["size"], row["latency_ms"]))
+        if old is None or not old["p50_s"]:
+            continue
+        print(
+            f"{row['case']:<30} size={row['size']:<7} "
+            f"latency={row['latency_ms']:<5} {row['p50_s'] / old['p50_s']:.2f}x"
+        )
+
+def parse_args(args: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark ffxiv_shugo against local stand-in services.",
+    )
+    parser.add_argument(
+        "--cases", nargs="+", choices=CASES, default=CASES,
+    )
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, default=DEFAULT_SIZES,
+        help="Items per call, or rows per wiki page for the scraper.",
+    )
+    parser.add_argument(
+        "--latency-ms", nargs="+", type=float, default=DEFAULT_LATENCIES_MS,
+        help="How long the stand-ins take to answer each request.",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--universalis-recording",
+        default=None,
+        help="A recorded universalis response to replay for every item.",
+    )
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument(
+        "--compare",
+        default=None,
+        help="A previous results file to compare p50 timings against.",
+    )
+    return parser.parse_args(args)
+
+def main(args: Optional[List[str]] = None):
+    args = parse_args(args)
+    fixture = (
+        UniversalisFixture.from_recording(args.universalis_recording)
+        if args.universalis_recording else UniversalisFixture()
+    )
+    server = StandInServer(universalis=fixture).start()
+    base_dir = tempfile.mkdtemp(prefix="ffxiv_shugo_bench_")
+    prepare_environment(server, base_dir)
+
+    results = []
+    try:
+        for size in args.sizes:
+            write_catalog_tables(size)
+            server.rows_per_page = size
+            cases = build_cases(size)
+            for latency_ms in args.latency_ms:
+                server.latency = latency_ms / 1000
+                for name in args.cases:
+                    server.reset_counts()
+                    row = {
+                        "case": name,
+                        "size": size,
+                        "latency_ms": latency_ms,
+                        "repeat": args.repeat,
+                        **measure(cases[name], args.repeat),
+                        # per call, counting the warm up and memory runs
+                        "requests": {
+                            service: count / (args.repeat + 2)
+                            for service, count in server.reset_counts().items()
+                        },
+                    }
+                    results.append(row)
+                    print(
+                        f"{name:<30} size={size:<7} latency={latency_ms:<5} "
+                        f"p50={row['p50_s'] * 1000:.1f}ms "
+                        f"p99={row['p99_s'] * 1000:.1f}ms "
+                        f"peak={row['peak_memory_mb']:.1f}MB"
+                    )
+    finally:
+        server.shutdown()
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump({
+            "commit": git_commit(),
+            "created_at": datetime.datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "settings": vars(args),
+            "results": results,
+        }, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
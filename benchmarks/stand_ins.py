@@ -0,0 +1,96 @@
+"""
+Local stand-ins for universalis, XIVAPI and the wiki, all served from one
+port so that benchmarks need no network access, API key or browser.
+
+    /api/v2/{world}/{ids}   universalis market data
+    /search                 XIVAPI index_search
+    /wiki/{page}            consolegameswiki vendor pages
+
+Every response is held back by the configured latency, like a real round
+trip would be.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import unquote, urlsplit
+
+from benchmarks.fixtures import UniversalisFixture, wiki_page, xivapi_search
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self, body: bytes, content_type: str) -> None:
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self, service: str) -> None:
+        with self.server.lock:
+            requests = self.server.requests
+            requests[service] = requests.get(service, 0) + 1
+
+    def do_GET(self):
+        path = unquote(urlsplit(self.path).path)
+        if path.startswith("/api/v2/"):
+            self._count("universalis")
+            ids = path.rsplit("/", 1)[-1]
+            item_ids = [int(item_id) for item_id in ids.split(",")]
+            body = self.server.universalis.response(item_ids)
+            return self._respond(json.dumps(body).encode(), "application/json")
+        if path.startswith("/wiki/"):
+            self._count("wiki")
+            page = wiki_page(path, self.server.rows_per_page)
+            return self._respond(page.encode(), "text/html; charset=utf-8")
+        self.send_error(404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if urlsplit(self.path).path != "/search":
+            return self.send_error(404)
+        self._count("xivapi")
+        # pyxivapi sends the same query once per language
+        should = request["body"]["query"]["bool"]["should"][0]
+        name = next(iter(should.values()))["NameCombined_en"]["query"]
+        body = json.dumps(xivapi_search(name)).encode()
+        self._respond(body, "application/json")
+
+    def log_message(self, format, *args):
+        pass
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+            self,
+            port: int = 0,
+            latency: float = 0.0,
+            rows_per_page: int = 100,
+            universalis: Optional[UniversalisFixture] = None,
+        ):
+        super().__init__(("127.0.0.1", port), StandInHandler)
+        self.latency = latency
+        self.rows_per_page = rows_per_page
+        self.universalis = universalis or UniversalisFixture()
+        self.requests: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def reset_counts(self) -> Dict[str, int]:
+        with self.lock:
+            counts, self.requests = self.requests, {}
+        return counts
@@ -0,0 +1,80 @@
+"""
+Caching shared by every session of the streamlit apps.
+
+Streamlit reruns the whole app on each interaction, so anything expensive is
+cached here per process rather than per session.
+"""
+
+import datetime
+import pandas as pd
+import streamlit as st
+from typing import Iterable, List, Optional, Tuple
+
+from ffxiv_shugo.constants import PRICE_CACHE_TTL
+from ffxiv_shugo.utilities import (
+    PriceResult,
+    World,
+    lookup_prices,
+    lookup_prices_by_world,
+)
+
+def format_timestamp(timestamp: Optional[float]) -> str:
+    if timestamp is None:
+        return "never"
+    return datetime.datetime.fromtimestamp(timestamp).strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+
+@st.cache_data(ttl=PRICE_CACHE_TTL, show_spinner=False)
+def _lookup_prices(item_ids: Tuple[int, ...]) -> Tuple[List[PriceResult], float]:
+    return lookup_prices(list(item_ids)), datetime.datetime.now().timestamp()
+
+def lookup_prices_cached(
+        item_ids: Iterable[int],
+    ) -> Tuple[List[PriceResult], float]:
+    """
+    lookup_prices, shared across sessions for PRICE_CACHE_TTL seconds.
+    Also returns when the prices were looked up. A pending refresh_control
+    request fetches them again from upstream.
+    """
+    item_ids = tuple(int(item_id) for item_id in item_ids)
+    if st.session_state.pop("refresh_prices", False):
+        lookup_prices(list(item_ids), refresh=True)
+        _lookup_prices.clear()
+    return _lookup_prices(item_ids)
+
+@st.cache_data(ttl=PRICE_CACHE_TTL, show_spinner=False)
+def _lookup_prices_by_world(
+        item_ids: Tuple[int, ...], worlds: Tuple[World, ...],
+    ) -> Tuple[pd.DataFrame, float]:
+    return (
+        lookup_prices_by_world(list(item_ids), worlds),
+        datetime.datetime.now().timestamp(),
+    )
+
+def lookup_prices_by_world_cached(
+        item_ids: Iterable[int], worlds: Iterable[World],
+    ) -> Tuple[pd.DataFrame, float]:
+    """
+    lookup_prices_by_world, shared across sessions like lookup_prices_cached.
+    """
+    item_ids = tuple(int(item_id) for item_id in item_ids)
+    worlds = tuple(worlds)
+    if st.session_state.pop("refresh_world_prices", False):
+        lookup_prices_by_world(list(item_ids), worlds, refresh=True)
+        _lookup_prices_by_world.clear()
+    return _lookup_prices_by_world(item_ids, worlds)
+
+def refresh_control(catalog_loaders: Iterable = ()) -> None:
+    """
+    A button that drops the cached catalog data and makes the next price
+    lookup skip every cache.
+    """
+    if st.button("Refresh data", help="Reload item data and refetch prices."):
+        for loader in catalog_loaders:
+            loader.clear()
+        st.session_state["refresh_prices"] = True
+        st.session_state["refresh_world_prices"] = True
+
+def show_as_of(label: str, timestamp: Optional[float]) -> None:
+    st.caption(f"{label} as of {format_timestamp(timestamp)}")
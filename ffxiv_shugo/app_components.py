@@ -0,0 +1,130 @@
+"""
+Widgets shared by the streamlit apps.
+"""
+
+import pandas as pd
+import streamlit as st
+import time
+from typing import List
+
+from ffxiv_shugo.app_cache import lookup_prices_by_world_cached, show_as_of
+from ffxiv_shugo.constants import (
+    DATACENTER_WORLDS,
+    DEFAULT_WORLD,
+    LIVE_LISTINGS_ENABLED,
+    WORLD_NAMES,
+)
+from ffxiv_shugo.live_listings import LiveListings
+from ffxiv_shugo.price_history import (
+    HISTORY_COLUMNS,
+    compare_to_rolling,
+    read_history,
+)
+from ffxiv_shugo.utilities import World, compare_worlds, expand_worlds
+
+def world_selector() -> List[World]:
+    return st.multiselect(
+        label="Worlds or datacenters to compare prices across",
+        options=[*DATACENTER_WORLDS, *WORLD_NAMES],
+        default=[DEFAULT_WORLD],
+        format_func=lambda world: WORLD_NAMES.get(world, world),
+    )
+
+def show_world_comparison(
+        data: pd.DataFrame, worlds: List[World], name_col: str,
+    ) -> None:
+    """
+    For each item in data, show the cheapest world and the spread in minimum
+    prices across worlds. Nothing is shown unless worlds covers more than one
+    world.
+    """
+    if len(expand_worlds(worlds)) < 2:
+        return
+    prices, prices_as_of = lookup_prices_by_world_cached(
+        data["id"].values.tolist(), worlds,
+    )
+    comparison = data[["id", name_col]].merge(
+        compare_worlds(prices), left_on="id", right_on="item_id",
+    ).drop(columns="item_id")
+    st.subheader("Cross-world comparison")
+    st.write(comparison.sort_values("price_spread", ascending=False))
+    show_as_of("World prices", prices_as_of)
+
+def show_price_history(data: pd.DataFrame, name_col: str) -> None:
+    """
+    Chart the stored price history of items picked out of data, and compare
+    their latest prices to a rolling average. Only reads the local history,
+    never universalis.
+    """
+    st.subheader("Price history")
+    names = st.multiselect(
+        label="Items to chart",
+        options=data[name_col].tolist(),
+        max_selections=10,
+    )
+    column = st.selectbox(
+        label="Price to chart",
+        options=HISTORY_COLUMNS,
+        index=HISTORY_COLUMNS.index("median_price"),
+    )
+    days = st.slider(label="Days of history", min_value=1, max_value=365, value=30)
+    window = st.slider(
+        label="Rolling average window (days)", min_value=1, max_value=90, value=7,
+    )
+    if not names:
+        return
+
+    items = data.loc[data[name_col].isin(names), ["id", name_col]]
+    history = read_history(
+        items["id"], start=time.time() - days * 86400, world=DEFAULT_WORLD,
+    )
+    if history.empty:
+        st.caption("No price history has been recorded for these items yet.")
+        return
+    history = history.merge(items, left_on="item_id", right_on="id")
+    st.line_chart(
+        history.pivot_table(index="time", columns=name_col, values=column)
+    )
+    comparison = compare_to_rolling(history, column, f"{window}D")
+    st.write(
+        items.merge(comparison, left_on="id", right_on="item_id")
+        .drop(columns="item_id")
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_live_listings() -> LiveListings:
+    # one subscription per process, shared by every session
+    return LiveListings([DEFAULT_WORLD]).start()
+
+def show_live_listings(data: pd.DataFrame, name_col: str) -> None:
+    """
+    Up to the second minimum prices and depth for items picked out of data,
+    from the live listings feed. Nothing is shown unless LIVE_LISTINGS_ENABLED.
+    """
+    if not LIVE_LISTINGS_ENABLED:
+        return
+    st.subheader("Live listings")
+    feed = get_live_listings()
+    names = st.multiselect(
+        label="Items to watch",
+        options=data[name_col].tolist(),
+        max_selections=10,
+    )
+    if not names:
+        return
+    items = data.loc[data[name_col].isin(names), ["id", name_col]]
+    feed.watch(items["id"])
+    if not feed.connected.is_set():
+        if feed.last_error is None:
+            st.caption("Connecting to the live listings feed...")
+        else:
+            st.caption(
+                f"Reconnecting to the live listings feed ({feed.last_error})..."
+            )
+    min_prices = feed.min_prices(DEFAULT_WORLD)
+    st.write(items.assign(min_price=items["id"].map(min_prices)))
+    for item_id, name in items.itertuples(index=False):
+        book = feed.book(DEFAULT_WORLD, item_id)
+        if book is not None and len(book):
+            st.caption(name)
+            st.write(book.depth())
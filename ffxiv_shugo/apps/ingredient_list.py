@@ -1,4 +1,112 @@
 """
 This app provides a tabular breakdown of the raw materials required to craft all of
-the provided items.
+the provided items, and of whether each intermediate is cheaper to buy or to craft.
 """
+
+import pandas as pd
+import streamlit as st
+from typing import Dict, List, Optional
+
+from ffxiv_shugo.app_cache import (
+    lookup_prices_cached,
+    refresh_control,
+    show_as_of,
+)
+from ffxiv_shugo.data_store import table_exists, table_modified_at
+from ffxiv_shugo.recipes import RecipeGraph
+from ffxiv_shugo.utilities import merge_prices
+
+# what buying a unit is taken to cost
+PRICE_OPTIONS = [
+    "min_listing_price",
+    "median_price",
+    "average_recent_price",
+]
+
+@st.cache_resource(show_spinner=False)
+def _load_graph(modified_at: Optional[float]) -> RecipeGraph:
+    # shared by every session, so that resolved trees are remembered across
+    # orders; modified_at is only here so a regenerated table rebuilds it
+    return RecipeGraph.load()
+
+def load_graph() -> RecipeGraph:
+    return _load_graph(table_modified_at("recipes"))
+
+def unit_prices(item_ids: List[int], price_col: str) -> Dict[int, float]:
+    # every component is priced in one lookup, not one per node
+    price_results, prices_as_of = lookup_prices_cached(item_ids)
+    prices = merge_prices(pd.DataFrame({"id": item_ids}), price_results)
+    show_as_of("Prices", prices_as_of)
+    return dict(zip(prices["id"], prices[price_col].astype(float)))
+
+def main():
+    st.title("FFXIV: Ingredient List")
+    st.info(
+        "This app breaks down the raw materials required to craft all of the "
+        "provided items."
+    )
+    if not table_exists("recipes"):
+        st.error(
+            "No recipe data yet, generate it with "
+            "`python -m ffxiv_shugo.scripts.get_recipes`."
+        )
+        return
+    show_as_of("Recipe data", table_modified_at("recipes"))
+    refresh_control([_load_graph])
+
+    graph = load_graph()
+    craftable = graph.craftable()
+    ids_by_name = dict(zip(craftable["item_name"], craftable["item_id"]))
+    items = st.multiselect(
+        label="Items to craft",
+        options=list(ids_by_name),
+    )
+    with st.form("Order", clear_on_submit=False):
+        quantities = {
+            name: st.number_input(
+                label=f"How many {name}",
+                min_value=1,
+                value=1,
+                step=1,
+            )
+            for name in items
+        }
+        optimize = st.checkbox(
+            label="Buy intermediates when that's cheaper than crafting them",
+            value=True,
+        )
+        price_col = st.selectbox(
+            label="Price to buy at",
+            options=PRICE_OPTIONS,
+        )
+        submit = st.form_submit_button(label="Submit")
+    if not submit or not quantities:
+        return
+
+    order = {
+        ids_by_name[name]: quantity for name, quantity in quantities.items()
+    }
+    if not optimize:
+        expansion = graph.expand(order)
+        st.subheader("Raw materials")
+        st.write(expansion.raw_materials)
+        st.subheader("Crafts")
+        st.write(expansion.crafted)
+        return
+
+    plan = graph.optimize(
+        order, unit_prices(graph.components(order), price_col),
+    )
+    st.metric("Total cost", f"{plan.total:,.0f} gil")
+    unpriced = plan.purchases["unit_price"].isna().sum()
+    if unpriced:
+        st.warning(f"{unpriced} purchases have no price and aren't in the total.")
+    st.subheader("To buy")
+    st.write(plan.purchases)
+    st.subheader("Crafts")
+    st.write(plan.crafted)
+    st.subheader("Buy or craft")
+    st.write(plan.decisions)
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,26 @@ Get the best ROI for a given currency based on current market board
 prices for Exodus.
 """
 
-import numpy as np
-import os
 import pandas as pd
 import streamlit as st
+from typing import Dict, List, Optional, Tuple
 
-from ffxiv_shugo.constants import DATA_DIR
-from ffxiv_shugo.utilities import lookup_prices
+from ffxiv_shugo.app_cache import (
+    lookup_prices_cached,
+    refresh_control,
+    show_as_of,
+)
+from ffxiv_shugo.app_components import (
+    show_live_listings,
+    show_price_history,
+    show_world_comparison,
+    world_selector,
+)
+from ffxiv_shugo.data_store import read_table, table_modified_at
+from ffxiv_shugo.market_depth import SELL_HORIZON_DAYS
+from ffxiv_shugo.market_stats import STAT_COLUMNS
+from ffxiv_shugo.ranking import RankingIndex, build_ranking_index
+from ffxiv_shugo.utilities import PriceResult
 
 # TODO: clean this code up
 
@@ -17,8 +30,32 @@ COLS_TO_NORMALIZE = [
     "current_average_price",
     # "min_price",
     "average_recent_price",
+    "median_price",
+    "volume_weighted_price",
+    "trimmed_mean_price",
 ]
 NORMALIZED_COLS = [f"normalized_{col}" for col in COLS_TO_NORMALIZE]
+SELL_ESTIMATE_COLS = [
+    "expected_units_sold",
+    "marginal_price",
+    "expected_proceeds",
+    "proceeds_per_unit",
+    "normalized_expected_proceeds",
+]
+DEFAULT_KEYS = [
+    "id",
+    "item_name",
+    "currency_cost",
+    "current_average_price",
+    "average_recent_price",
+    "sale_velocity",
+    "average_recent_stack_size",
+    "normalized_current_average_price",
+    "normalized_average_recent_price",
+    "marginal_price",
+    "expected_units_sold",
+    "best_spend_value",
+]
 ALL_KEYS = [
     # from items_by_currency
     "id",
@@ -28,90 +65,204 @@ ALL_KEYS = [
     *COLS_TO_NORMALIZE,
     "sale_velocity",
     "average_recent_stack_size",
+    *[col for col in STAT_COLUMNS if col not in COLS_TO_NORMALIZE],
     # from computation here
     *NORMALIZED_COLS,
+    *SELL_ESTIMATE_COLS,
+    "best_spend_value",
 ]
 
 def load_data() -> pd.DataFrame:
-    data_path = os.path.join(DATA_DIR, "items_by_currency.csv")
-    data = pd.read_csv(data_path)
-    data = data.loc[data["is_untradable"] == 0].drop("is_untradable", axis=1)
-    return data
+    data = read_table(
+        "items_by_currency", filters=[("is_untradable", "==", False)],
+    )
+    return data.drop("is_untradable", axis=1)
+
+@st.cache_data(show_spinner=False)
+def _load_catalog(
+        modified_at: Optional[float],
+    ) -> Tuple[pd.DataFrame, List[str]]:
+    # modified_at is only here so that a rescrape invalidates the cache
+    data = load_data()
+    return data, data["currency_type"].unique().tolist()
+
+def load_catalog() -> Tuple[pd.DataFrame, List[str]]:
+    return _load_catalog(table_modified_at("items_by_currency"))
 
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _ranking_index(
+        _data: pd.DataFrame,
+        _price_results: List[PriceResult],
+        modified_at: Optional[float],
+        currencies: Tuple[str, ...],
+        prices_as_of: float,
+        sell_quantity: int,
+        horizon_days: float,
+    ) -> RankingIndex:
+    # rebuilt only when the catalog is rescraped, the prices are refreshed or
+    # the currencies or selling plan change
+    return build_ranking_index(
+        _data,
+        _price_results,
+        COLS_TO_NORMALIZE,
+        sell_quantity=sell_quantity,
+        horizon_days=horizon_days,
+    )
+
+def load_ranking_index(
+        data: pd.DataFrame,
+        currencies: List[str],
+        sell_quantity: int,
+        horizon_days: float,
+    ) -> Tuple[RankingIndex, float]:
+    """
+    Prices for the items of currencies, indexed by the gil per currency unit
+    that selling sell_quantity of each item would bring in. Also returns
+    when the prices were looked up.
+    """
+    currencies = tuple(sorted(currencies))
+    data = data.loc[data["currency_type"].isin(currencies)]
+    price_results, prices_as_of = lookup_prices_cached(data["id"].unique())
+    index = _ranking_index(
+        data,
+        price_results,
+        table_modified_at("items_by_currency"),
+        currencies,
+        prices_as_of,
+        sell_quantity,
+        horizon_days,
+    )
+    return index, prices_as_of
 
 def main():
-    data = load_data()
-    available_currencies = data["currency_type"].unique().tolist()
+    data, available_currencies = load_catalog()
 
     st.title("FFXIV: Fetch Prices")
     st.info(
         "This app looks up current market prices so you can spend your currencies "
         "on the best ROI."
     )
+    show_as_of("Item data", table_modified_at("items_by_currency"))
+    refresh_control([_load_catalog])
     with st.form("Options", clear_on_submit=False):
         currency = st.selectbox(
             label="Currency",
             options=available_currencies,
         )
+        top_k = st.number_input(
+            label="Number of items to show",
+            min_value=1,
+            value=25,
+        )
+        min_velocity = st.number_input(
+            label="Minimum sales per day",
+            min_value=0.0,
+            value=0.0,
+        )
+        sell_quantity = st.number_input(
+            label="Units of each item you would sell",
+            min_value=1,
+            value=1,
+        )
+        horizon_days = st.number_input(
+            label="Days you would wait for them to sell",
+            min_value=1.0,
+            value=SELL_HORIZON_DAYS,
+        )
         keys_to_show = st.multiselect(
             label="Final columns to show in output",
             options=ALL_KEYS,
-            default=ALL_KEYS,
+            default=DEFAULT_KEYS,
         )
         sort_by_column = st.selectbox(
             label="Column to sort the output by",
             options=ALL_KEYS, # narrow this down
+            index=ALL_KEYS.index("best_spend_value"),
         )
         sort_ascending = st.selectbox(
             label="Sort output by column ascending?",
             options=["False", "True"],
         )
+        worlds = world_selector()
         submit = st.form_submit_button(label="Submit")
         display = st.empty()
         if submit:
-            fetch_prices(
-                data.loc[data["currency_type"] == currency],
+            index, prices_as_of = load_ranking_index(
+                data, [currency], int(sell_quantity), horizon_days,
+            )
+            show_as_of("Prices", prices_as_of)
+            ascending = str(sort_ascending).lower() == "true"
+            select_rows(
+                index.top_k(
+                    currency,
+                    int(top_k),
+                    min_velocity,
+                    sort_by=sort_by_column,
+                    ascending=ascending,
+                ),
                 display,
                 keys_to_show,
                 sort_by_column,
                 sort_ascending,
+                worlds,
             )
+    currency_data = data.loc[data["currency_type"] == currency]
+    show_price_history(currency_data, "item_name")
+    show_live_listings(currency_data, "item_name")
+    show_best_use(
+        data,
+        available_currencies,
+        keys_to_show,
+        int(sell_quantity),
+        horizon_days,
+    )
 
-def fetch_prices(
+def select_rows(
     data: pd.DataFrame,
     display: st.empty,
     keys_to_show: st.multiselect,
     sort_by_column: st.selectbox,
     sort_ascending: st.selectbox,
+    worlds: st.multiselect = (),
 ) -> None:
-    ids = data["id"].values.tolist()
-    col_map = {
-        "currentAveragePriceNQ": "current_average_price",
-        "nqSaleVelocity": "sale_velocity",
-        # "minPriceNQ": "min_price",
-        "averageRecentHistoryStackSize": "average_recent_stack_size",
-        "averageRecentPrice": "average_recent_price",
-    }
-    # data[col_map.values()] = np.nan
-    for new_col in col_map.values():
-        data[new_col] = np.nan
-
-    price_results = lookup_prices(ids)
-    for price_data in price_results:
-        item_id = price_data["item_id"]
-        idx = data.loc[data["id"] == item_id].index[0]
-        for price_col, data_col in col_map.items():
-            data[data_col][idx] = price_data[price_col]
-
-    for col, normalized_col in zip(COLS_TO_NORMALIZE, NORMALIZED_COLS):
-        data[normalized_col] = data[col] / data["currency_cost"]
-
     display.write(
         data.sort_values(
             by=[sort_by_column],
             ascending=str(sort_ascending).lower() == "true",
         )[keys_to_show]
     )
+    show_world_comparison(data, worlds, "item_name")
+
+def show_best_use(
+    data: pd.DataFrame,
+    available_currencies: List[str],
+    keys_to_show: List[str],
+    sell_quantity: int,
+    horizon_days: float,
+) -> None:
+    st.subheader("Best use of the currencies you hold")
+    held = st.multiselect(
+        label="Currencies you hold",
+        options=available_currencies,
+    )
+    if not held:
+        return
+    holdings: Dict[str, float] = {
+        currency: st.number_input(
+            label=f"Amount of {currency}",
+            min_value=0,
+            value=1000,
+            key=f"holding_{currency}",
+        )
+        for currency in held
+    }
+    # only the currencies held are priced
+    index, _ = load_ranking_index(data, held, sell_quantity, horizon_days)
+    st.write(
+        index.best_use(k=25, holdings=holdings)[
+            ["currency_type", *keys_to_show, "total_spend_value"]
+        ]
+    )
 
 if __name__ == "__main__":
     main()
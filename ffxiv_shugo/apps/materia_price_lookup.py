@@ -2,16 +2,25 @@
 Find the going market rates for materia.
 """
 
-import numpy as np
-import os
 import pandas as pd
 import streamlit as st
+from typing import List, Optional, Tuple
 
-from ffxiv_shugo.constants import (
-    DATA_DIR,
-    MATERIA_GRADES,
+from ffxiv_shugo.app_cache import (
+    lookup_prices_cached,
+    refresh_control,
+    show_as_of,
 )
-from ffxiv_shugo.utilities import lookup_prices
+from ffxiv_shugo.app_components import (
+    show_live_listings,
+    show_price_history,
+    show_world_comparison,
+    world_selector,
+)
+from ffxiv_shugo.constants import MATERIA_GRADES
+from ffxiv_shugo.data_store import read_table, table_modified_at
+from ffxiv_shugo.market_stats import STAT_COLUMNS
+from ffxiv_shugo.utilities import merge_prices
 
 ALL_KEYS = [
     # from materia.csv
@@ -27,6 +36,7 @@ ALL_KEYS = [
     "average_recent_price",
     "sale_velocity",
     "average_recent_stack_size",
+    *STAT_COLUMNS,
 ]
 DEFAULT_COLS_TO_SHOW = [
     "materia_name",
@@ -41,23 +51,32 @@ SORT_OPTIONS = [
     "sale_velocity",
     "current_average_price",
     "average_recent_stack_size",
+    *STAT_COLUMNS,
 ]
 
 def load_data() -> pd.DataFrame:
-    data_path = os.path.join(DATA_DIR, "materia.csv")
-    data = pd.read_csv(data_path)
-    return data
+    return read_table("materia")
 
-def main():
+@st.cache_data(show_spinner=False)
+def _load_catalog(
+        modified_at: Optional[float],
+    ) -> Tuple[pd.DataFrame, List[str], List[str]]:
+    # modified_at is only here so that a regenerated table invalidates the cache
     data = load_data()
-
     available_grades = [
         name for idx, name in enumerate(MATERIA_GRADES)
         if idx in data["grade_idx"].unique()
     ]
+    available_types = data["materia_type"].unique().tolist()
+    return data, available_grades, available_types
+
+def load_catalog() -> Tuple[pd.DataFrame, List[str], List[str]]:
+    return _load_catalog(table_modified_at("materia"))
+
+def main():
+    data, available_grades, available_types = load_catalog()
     default_grade = available_grades
 
-    available_types = data["materia_type"].unique().tolist()
     if "combat" in available_types:
         default_type = ["combat"]
     else:
@@ -65,6 +84,8 @@ def main():
 
     st.title("FFXIV: Materia Price Lookup")
     st.info("This app looks up the going market rates for various materia.")
+    show_as_of("Materia data", table_modified_at("materia"))
+    refresh_control([_load_catalog])
 
     with st.form("Options", clear_on_submit=False):
         keys_to_show = st.multiselect(
@@ -90,19 +111,24 @@ def main():
             options=available_grades,
             default=default_grade,
         )
+        worlds = world_selector()
         submit = st.form_submit_button(label="Submit")
     display = st.empty()
+    selected = data.loc[
+        data["materia_type"].isin(materia_types) &
+        data["grade_name"].isin(materia_grades)
+    ]
     if submit:
         fetch_prices(
-            data.loc[
-                data["materia_type"].isin(materia_types) &
-                data["grade_name"].isin(materia_grades)
-            ],
+            selected,
             display,
             keys_to_show,
             sort_by_column,
             sort_ascending,
+            worlds,
         )
+    show_price_history(selected, "materia_name")
+    show_live_listings(selected, "materia_name")
 
 def fetch_prices(
     data: pd.DataFrame,
@@ -110,24 +136,10 @@ def fetch_prices(
     keys_to_show: st.multiselect,
     sort_by_column: st.selectbox,
     sort_ascending: st.selectbox,
+    worlds: st.multiselect = (),
 ):
-    ids = data["id"].values.tolist()
-    col_map = {
-        "currentAveragePriceNQ": "current_average_price",
-        "nqSaleVelocity": "sale_velocity",
-        # "minPriceNQ": "min_price",
-        "averageRecentHistoryStackSize": "average_recent_stack_size",
-        "averageRecentPrice": "average_recent_price",
-    }
-    for new_col in col_map.values():
-        data[new_col] = np.nan
-
-    price_results = lookup_prices(ids)
-    for price_data in price_results:
-        item_id = price_data["item_id"]
-        idx = data.loc[data["id"] == item_id].index[0]
-        for price_col, data_col in col_map.items():
-            data[data_col][idx] = price_data[price_col]
+    price_results, prices_as_of = lookup_prices_cached(data["id"].values.tolist())
+    data = merge_prices(data, price_results)
 
     display.write(
         data.sort_values(
@@ -135,6 +147,8 @@ def fetch_prices(
             ascending=str(sort_ascending).lower() == "true",
         )[keys_to_show]
     )
+    show_as_of("Prices", prices_as_of)
+    show_world_comparison(data, worlds, "materia_name")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""
+Append-only JSON lines files that long running scripts write their results to
+as they go, so that a failed run can pick up where it left off.
+"""
+
+import json
+import os
+from typing import Any, Dict, List
+
+from ffxiv_shugo.constants import DATA_DIR
+
+CHECKPOINT_DIR = os.path.join(DATA_DIR, "checkpoints")
+
+class Checkpoint:
+    def __init__(self, path: str):
+        self.path = path
+
+    @classmethod
+    def for_run(cls, run_name: str, part: str) -> "Checkpoint":
+        return cls(os.path.join(CHECKPOINT_DIR, run_name, f"{part}.jsonl"))
+
+    def load(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # a run died halfway through writing this record
+                    continue
+        return records
+
+    def _is_torn(self) -> bool:
+        # whether the last record was cut off before its newline
+        with open(self.path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return False
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def append(self, record: Dict[str, Any]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        # start on a line of its own, leaving any torn record for load to skip
+        prefix = "\n" if os.path.exists(self.path) and self._is_torn() else ""
+        with open(self.path, "a") as f:
+            f.write(prefix + json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
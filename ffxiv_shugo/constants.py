@@ -28,7 +28,147 @@ class Currency(Enum):
 # https://xivapi.com/World
 PRIMAL_DATACENTER_ID = 0
 EXODUS_WORLD_ID = 53
+PRIMAL_WORLDS = {
+    78: "Behemoth",
+    93: "Excalibur",
+    53: "Exodus",
+    35: "Famfrit",
+    95: "Hyperion",
+    55: "Lamia",
+    64: "Leviathan",
+    77: "Ultros",
+}
+# datacenter name -> the ids of its worlds
+DATACENTER_WORLDS = {
+    "Primal": list(PRIMAL_WORLDS),
+}
+WORLD_NAMES = {**PRIMAL_WORLDS}
+DEFAULT_WORLD = EXODUS_WORLD_ID
 XIVAPI_KEY = SECRETS["ffxivapi"]["api_key"]
+XIVAPI_BASE_URL = os.environ.get("XIVAPI_BASE_URL", "https://xivapi.com")
+# keep comfortably under xivapi's 20 requests/second/key limit
+XIVAPI_MAX_CONCURRENCY = int(os.environ.get("XIVAPI_MAX_CONCURRENCY", 8))
+
+# https://docs.universalis.app/#market-board-current-data
+UNIVERSALIS_API_URL = os.environ.get(
+    "UNIVERSALIS_API_URL", "https://universalis.app/api/v2"
+)
+# the API rejects requests for more than 100 items at a time
+UNIVERSALIS_MAX_ITEMS_PER_REQUEST = 100
+UNIVERSALIS_MAX_CONCURRENCY = int(
+    os.environ.get("UNIVERSALIS_MAX_CONCURRENCY", 8)
+)
+UNIVERSALIS_TIMEOUT = 30
+# only ask for as many sales per item as the stats make use of. listings are
+# all fetched by default, since selling estimates walk the whole ladder
+UNIVERSALIS_LISTINGS = (
+    int(os.environ["UNIVERSALIS_LISTINGS"])
+    if os.environ.get("UNIVERSALIS_LISTINGS") else None
+)
+UNIVERSALIS_HISTORY_ENTRIES = int(
+    os.environ.get("UNIVERSALIS_HISTORY_ENTRIES", 50)
+)
+# https://docs.universalis.app/#websocket-api
+UNIVERSALIS_WS_URL = os.environ.get(
+    "UNIVERSALIS_WS_URL", "wss://universalis.app/api/ws"
+)
+# universalis speaks bson; a local stand-in can speak json instead
+UNIVERSALIS_WS_ENCODING = os.environ.get("UNIVERSALIS_WS_ENCODING", "bson")
+LIVE_LISTINGS_ENABLED = (
+    os.environ.get("LIVE_LISTINGS_ENABLED", "false").lower() == "true"
+)
+
+# requests per second, burst size and most concurrent requests allowed per
+# host. the concurrency limit shrinks when a host pushes back with 429s or
+# 5xxs and grows back as requests succeed again
+# https://docs.universalis.app/#rate-limits
+HTTP_HOST_LIMITS = {
+    "universalis.app": (25.0, 50, 8),
+    "xivapi.com": (20.0, 20, 8),
+    "ffxiv.consolegameswiki.com": (5.0, 10, 4),
+    "raw.githubusercontent.com": (5.0, 10, 4),
+}
+# for every other host, e.g. local stand-ins and the price service
+HTTP_DEFAULT_LIMITS = (
+    float(os.environ.get("HTTP_DEFAULT_RATE", 20)),
+    int(os.environ.get("HTTP_DEFAULT_BURST", 40)),
+    int(os.environ.get("HTTP_DEFAULT_MAX_CONCURRENCY", 8)),
+)
+HTTP_RETRY_ATTEMPTS = int(os.environ.get("HTTP_RETRY_ATTEMPTS", 5))
+# a request gives up rather than wait past this many seconds in total
+HTTP_RETRY_BUDGET = float(os.environ.get("HTTP_RETRY_BUDGET", 60))
+
+# on-disk cache of lookup_prices results, keyed by (world, item_id)
+PRICE_CACHE_PATH = os.environ.get(
+    "PRICE_CACHE_PATH", os.path.join(DATA_DIR, "price_cache.sqlite3")
+)
+PRICE_CACHE_TTL = float(os.environ.get("PRICE_CACHE_TTL", 300))
+PRICE_CACHE_MAX_ROWS = int(os.environ.get("PRICE_CACHE_MAX_ROWS", 100_000))
+PRICE_CACHE_STALE_WHILE_REVALIDATE = (
+    os.environ.get("PRICE_CACHE_STALE_WHILE_REVALIDATE", "true").lower() == "true"
+)
+# when a price_refresher is keeping the cache warm, the apps only read from it
+PRICES_FROM_STORE_ONLY = (
+    os.environ.get("PRICES_FROM_STORE_ONLY", "false").lower() == "true"
+)
+# when set, lookups go through the price service at this url instead of
+# calling universalis directly, e.g. http://127.0.0.1:8750
+PRICE_SERVICE_URL = os.environ.get("PRICE_SERVICE_URL") or None
+PRICE_SERVICE_HOST = os.environ.get("PRICE_SERVICE_HOST", "127.0.0.1")
+PRICE_SERVICE_PORT = int(os.environ.get("PRICE_SERVICE_PORT", 8750))
+# how long the service waits for other requests to join a batch, in seconds
+PRICE_SERVICE_BATCH_WINDOW = float(
+    os.environ.get("PRICE_SERVICE_BATCH_WINDOW", 0.05)
+)
+# the refresher's request budget, shared by every world it refreshes
+REFRESHER_REQUESTS_PER_SECOND = float(
+    os.environ.get("REFRESHER_REQUESTS_PER_SECOND", 2)
+)
+# an item is refreshed after about this many of its sales are expected...
+REFRESHER_SALES_PER_REFRESH = float(
+    os.environ.get("REFRESHER_SALES_PER_REFRESH", 1)
+)
+# ...but never more often or less often than these many seconds
+REFRESHER_MIN_INTERVAL = 60
+REFRESHER_MAX_INTERVAL = 6 * 60 * 60
+
+# every fetched price snapshot is appended here, one directory per day
+PRICE_HISTORY_DIR = os.environ.get(
+    "PRICE_HISTORY_DIR", os.path.join(DATA_DIR, "price_history")
+)
+PRICE_HISTORY_ENABLED = (
+    os.environ.get("PRICE_HISTORY_ENABLED", "true").lower() == "true"
+)
+# snapshots are kept as-is for this many days, then as hourly averages until
+# they are this many days old, then as daily averages
+PRICE_HISTORY_RAW_DAYS = int(os.environ.get("PRICE_HISTORY_RAW_DAYS", 7))
+PRICE_HISTORY_HOURLY_DAYS = int(os.environ.get("PRICE_HISTORY_HOURLY_DAYS", 90))
+# a day's snapshot files are merged into one once there are this many of them
+PRICE_HISTORY_COMPACT_FILES = int(os.environ.get("PRICE_HISTORY_COMPACT_FILES", 32))
+
+# game data sheets as csv, https://github.com/xivapi/ffxiv-datamining
+DATAMINING_CSV_URL = os.environ.get(
+    "DATAMINING_CSV_URL",
+    "https://raw.githubusercontent.com/xivapi/ffxiv-datamining/master/csv",
+)
+# CraftType ids, in order
+CRAFT_TYPES = [
+    "Carpenter",
+    "Blacksmith",
+    "Armorer",
+    "Goldsmith",
+    "Leatherworker",
+    "Weaver",
+    "Alchemist",
+    "Culinarian",
+]
+
+WIKI_BASE_URL = os.environ.get(
+    "WIKI_BASE_URL", "https://ffxiv.consolegameswiki.com/wiki"
+)
+PAGE_FETCH_MAX_CONCURRENCY = int(os.environ.get("PAGE_FETCH_MAX_CONCURRENCY", 8))
+PAGE_FETCH_TIMEOUT = 60
+WEBDRIVER_POOL_SIZE = int(os.environ.get("WEBDRIVER_POOL_SIZE", 2))
 
 # TODO: generate a lookup from this page?
 # https://ffxiv.consolegameswiki.com/wiki/Materia
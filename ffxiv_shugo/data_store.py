@@ -0,0 +1,181 @@
+"""
+Typed Parquet storage for the tables the scripts generate into DATA_DIR.
+
+Each table is written with one row group per value of its partition column,
+so a filter on that column only has to read the matching row groups.
+"""
+
+import argparse
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Any, List, Optional, Tuple
+
+from ffxiv_shugo.constants import DATA_DIR
+
+# table name -> column dtypes
+SCHEMAS = {
+    "items_by_currency": {
+        "id": "int32",
+        "item_name": "string",
+        "currency_cost": "int32",
+        "currency_type": "category",
+        "is_untradable": "bool",
+    },
+    "materia": {
+        "id": "int32",
+        "grade_idx": "int8",
+        "grade_name": "category",
+        "materia_type": "category",
+        "materia_name": "string",
+        "stat_boosted": "category",
+    },
+    # every named item in the game
+    "items": {
+        "id": "int32",
+        "item_name": "string",
+        "is_untradable": "bool",
+        "price_mid": "int32",
+        "price_low": "int32",
+    },
+    # one row per ingredient of each recipe
+    "recipes": {
+        "recipe_id": "int32",
+        "craft_type": "category",
+        "result_id": "int32",
+        "result_name": "string",
+        "result_amount": "int16",
+        "ingredient_id": "int32",
+        "ingredient_name": "string",
+        "ingredient_amount": "int16",
+    },
+}
+# table name -> the column its row groups are split on
+PARTITION_COLUMNS = {
+    "items_by_currency": "currency_type",
+    "materia": "materia_type",
+    "recipes": "craft_type",
+}
+
+# e.g. [("currency_type", "==", "poetics")]
+Filters = List[Tuple[str, str, Any]]
+
+def table_path(name: str, extension: str = "parquet") -> str:
+    return os.path.join(DATA_DIR, f"{name}.{extension}")
+
+def apply_schema(name: str, data: pd.DataFrame) -> pd.DataFrame:
+    schema = SCHEMAS[name]
+    data = data[[col for col in schema if col in data.columns]]
+    return data.astype({col: schema[col] for col in data.columns})
+
+def write_table(name: str, data: pd.DataFrame) -> str:
+    data = apply_schema(name, data.reset_index(drop=True))
+    partition_col = PARTITION_COLUMNS.get(name)
+    if partition_col is None:
+        groups = [data]
+    else:
+        groups = [
+            group
+            for _, group in data.groupby(partition_col, observed=True, sort=True)
+        ]
+
+    path = table_path(name)
+    if not os.path.exists(DATA_DIR):
+        os.makedirs(DATA_DIR, exist_ok=True)
+    schema = pa.Schema.from_pandas(data, preserve_index=False)
+    # write then rename so readers never see a half written file
+    tmp_path = f"{path}.tmp"
+    with pq.ParquetWriter(tmp_path, schema) as writer:
+        for group in groups or [data]:
+            writer.write_table(
+                pa.Table.from_pandas(group, schema=schema, preserve_index=False)
+            )
+    os.replace(tmp_path, path)
+    return path
+
+def read_table(
+        name: str,
+        filters: Optional[Filters] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+    """
+    Load a table with its dtypes applied. The file is memory-mapped and only
+    the row groups that can match filters are read.
+
+    Falls back on the table's csv for data generated before the Parquet store
+    existed.
+    """
+    path = table_path(name)
+    if not os.path.exists(path):
+        return _read_legacy_csv(name, filters, columns)
+    table = pq.read_table(
+        path,
+        columns=columns,
+        filters=filters or None,
+        memory_map=True,
+    )
+    return apply_schema(name, table.to_pandas())
+
+def _read_legacy_csv(
+        name: str,
+        filters: Optional[Filters],
+        columns: Optional[List[str]],
+    ) -> pd.DataFrame:
+    data = pd.read_csv(table_path(name, "csv"))
+    data = data.drop(
+        columns=[col for col in data.columns if col.startswith("Unnamed:")],
+    ).dropna(subset=["id"])
+    data = apply_schema(name, data)
+    for col, op, value in filters or []:
+        if op in ("=", "=="):
+            data = data.loc[data[col] == value]
+        elif op == "!=":
+            data = data.loc[data[col] != value]
+        elif op == "in":
+            data = data.loc[data[col].isin(value)]
+        elif op == "not in":
+            data = data.loc[~data[col].isin(value)]
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+    if columns is not None:
+        data = data[columns]
+    return data.reset_index(drop=True)
+
+def table_exists(name: str) -> bool:
+    return os.path.exists(table_path(name)) or os.path.exists(
+        table_path(name, "csv")
+    )
+
+def table_modified_at(name: str) -> Optional[float]:
+    """
+    When the table was last written, or None if it doesn't exist.
+    """
+    for path in (table_path(name), table_path(name, "csv")):
+        if os.path.exists(path):
+            return os.path.getmtime(path)
+    return None
+
+def export_csv(name: str, path: Optional[str] = None) -> str:
+    path = path or table_path(name, "csv")
+    read_table(name).to_csv(path, index=False)
+    return path
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Export tables from the data store to csv.",
+    )
+    parser.add_argument(
+        "tables",
+        nargs="*",
+        help=f"Tables to export, out of {', '.join(SCHEMAS)}. Defaults to all.",
+    )
+    args = parser.parse_args(args)
+    unknown = set(args.tables) - set(SCHEMAS)
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(sorted(unknown))}")
+    for name in args.tables or SCHEMAS:
+        print(export_csv(name))
+
+if __name__ == "__main__":
+    main()
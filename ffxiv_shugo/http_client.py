@@ -0,0 +1,389 @@
+"""
+The one way this package talks to other hosts, so that every request to a
+host shares the same limits no matter which script, thread or event loop
+makes it.
+
+Each host gets a token bucket for its request rate and a concurrency limit
+that halves whenever the host answers with a 429 or a 5xx and creeps back up
+with each success. A 429 or a Retry-After pauses the whole host, not just
+the request that got it. Failed requests are retried with jittered backoff
+until they succeed, run out of attempts or would wait past HTTP_RETRY_BUDGET.
+"""
+
+import asyncio
+import contextlib
+import email.utils
+import threading
+import time
+import aiohttp
+import pyxivapi
+import requests
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    Optional,
+    Tuple,
+)
+from urllib.parse import urlsplit
+
+from ffxiv_shugo.constants import (
+    HTTP_DEFAULT_LIMITS,
+    HTTP_HOST_LIMITS,
+    HTTP_RETRY_ATTEMPTS,
+    HTTP_RETRY_BUDGET,
+    XIVAPI_BASE_URL,
+    XIVAPI_KEY,
+)
+from ffxiv_shugo.retry import backoff_delay
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+XIVAPI_HOST = urlsplit(XIVAPI_BASE_URL).netloc
+# pyxivapi raises these for 500s and 503s, and returns None for any status
+# it has no exception for, 429s and 502s among them
+XIVAPI_RETRY_ERRORS = (
+    pyxivapi.exceptions.XIVAPIError,
+    pyxivapi.exceptions.XIVAPIServiceUnavailable,
+    aiohttp.ClientConnectionError,
+    asyncio.TimeoutError,
+)
+
+# (requests per second, burst, max concurrency)
+HostLimits = Tuple[float, int, int]
+
+def _host(url: str) -> str:
+    return urlsplit(url).netloc or url
+
+def _retry_after(headers: Any) -> Optional[float]:
+    # seconds, or an http date
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+class HostLimiter:
+    """
+    Rate and concurrency limits for one host, shared by threads and event
+    loops alike.
+    """
+    def __init__(self, rate: float, burst: int, max_concurrency: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        # the adaptive concurrency limit, between 1 and max_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self._async_waiters = []
+
+    def _has_slot(self) -> bool:
+        return self.in_flight < max(1, int(self.limit))
+
+    def _take_slot(self) -> float:
+        # takes a slot and a token, returning how long to wait before sending
+        now = time.monotonic()
+        self.in_flight += 1
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated) * self.rate,
+        )
+        self._updated = now
+        # tokens may go negative, which queues the request behind the others
+        self._tokens -= 1
+        wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        return max(wait, self._paused_until - now)
+
+    def acquire(self) -> None:
+        with self._lock:
+            while not self._has_slot():
+                self._slot_freed.wait()
+            delay = self._take_slot()
+        if delay > 0:
+            try:
+                time.sleep(delay)
+            except BaseException:
+                self.release(None)
+                raise
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._has_slot():
+                    delay = self._take_slot()
+                    break
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+        if delay > 0:
+            try:
+                await asyncio.sleep(delay)
+            except BaseException:
+                self.release(None)
+                raise
+
+    def release(self, ok: Optional[bool], pause: float = 0.0) -> None:
+        """
+        Give back a slot. ok is False when the host pushed back or couldn't
+        be reached, and None when the request never got an answer either
+        way; pause holds off every request to the host for that long.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if ok:
+                # about one more slot for every limit's worth of successes
+                self.limit = min(
+                    self.max_concurrency, self.limit + 1 / self.limit,
+                )
+            elif ok is not None:
+                self.limit = max(1.0, self.limit / 2)
+            if pause > 0:
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + pause,
+                )
+            self._slot_freed.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+class HttpClient:
+    """
+    Per-host limiters and pooled sessions, and requests that go through
+    them.
+    """
+    def __init__(
+            self,
+            host_limits: Dict[str, HostLimits] = HTTP_HOST_LIMITS,
+            default_limits: HostLimits = HTTP_DEFAULT_LIMITS,
+            attempts: int = HTTP_RETRY_ATTEMPTS,
+            retry_budget: float = HTTP_RETRY_BUDGET,
+        ):
+        self.host_limits = host_limits
+        self.default_limits = default_limits
+        self.attempts = attempts
+        self.retry_budget = retry_budget
+        self._limiters: Dict[str, HostLimiter] = {}
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def _limits(self, host: str) -> HostLimits:
+        return self.host_limits.get(host.split(":")[0], self.default_limits)
+
+    def limiter(self, url: str) -> HostLimiter:
+        host = _host(url)
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = HostLimiter(*self._limits(host))
+            return self._limiters[host]
+
+    def session(self, url: str) -> requests.Session:
+        # one pool per host, as big as the host's concurrency limit
+        host = _host(url)
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=1, pool_maxsize=self._limits(host)[2],
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+            return self._sessions[host]
+
+    def _backoff(
+            self, attempt: int, status: Optional[int], headers: Any,
+        ) -> Tuple[float, float]:
+        # (delay before retrying, how long to pause the whole host)
+        retry_after = None if headers is None else _retry_after(headers)
+        delay = (
+            retry_after if retry_after is not None
+            else backoff_delay(attempt, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+        )
+        pause = delay if status == 429 or retry_after is not None else 0.0
+        return delay, pause
+
+    def _gives_up(self, attempt: int, delay: float, deadline: float) -> bool:
+        return (
+            attempt == self.attempts - 1
+            or time.monotonic() + delay > deadline
+        )
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        requests.Session.request within the host's limits, retrying
+        connection errors, timeouts and RETRY_STATUSES. When retries run
+        out, the last response is returned for the caller to
+        raise_for_status on, or the last exception is raised.
+        """
+        with self.stream(method, url, **kwargs) as response:
+            # the body is downloaded while the host's slot is still held
+            response.content
+            return response
+
+    @contextlib.contextmanager
+    def stream(
+            self, method: str, url: str, **kwargs,
+        ) -> Iterator[requests.Response]:
+        """
+        request with stream=True, as a context manager around the response.
+        The host's slot is held until the block exits, so that reading the
+        body counts against the host's concurrency limit too.
+        """
+        limiter = self.limiter(url)
+        session = self.session(url)
+        deadline = time.monotonic() + self.retry_budget
+        for attempt in range(self.attempts):
+            limiter.acquire()
+            try:
+                response = session.request(method, url, stream=True, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                delay, _ = self._backoff(attempt, None, None)
+                limiter.release(ok=False)
+                if self._gives_up(attempt, delay, deadline):
+                    raise
+            except BaseException:
+                limiter.release(ok=None)
+                raise
+            else:
+                status = response.status_code
+                retryable = status in RETRY_STATUSES
+                delay, pause = 0.0, 0.0
+                if retryable:
+                    delay, pause = self._backoff(
+                        attempt, status, response.headers,
+                    )
+                if not retryable or self._gives_up(attempt, delay, deadline):
+                    try:
+                        yield response
+                    finally:
+                        response.close()
+                        limiter.release(ok=not retryable, pause=pause)
+                    return
+                response.close()
+                limiter.release(ok=False, pause=pause)
+            time.sleep(delay)
+
+    @contextlib.asynccontextmanager
+    async def request_async(
+            self,
+            session: aiohttp.ClientSession,
+            method: str,
+            url: str,
+            **kwargs,
+        ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        stream for aiohttp sessions, holding the host's slot until the block
+        exits in the same way.
+        """
+        limiter = self.limiter(url)
+        deadline = time.monotonic() + self.retry_budget
+        for attempt in range(self.attempts):
+            await limiter.acquire_async()
+            try:
+                response = await session.request(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                delay, _ = self._backoff(attempt, None, None)
+                limiter.release(ok=False)
+                if self._gives_up(attempt, delay, deadline):
+                    raise
+            except BaseException:
+                limiter.release(ok=None)
+                raise
+            else:
+                status = response.status
+                retryable = status in RETRY_STATUSES
+                delay, pause = 0.0, 0.0
+                if retryable:
+                    delay, pause = self._backoff(
+                        attempt, status, response.headers,
+                    )
+                if not retryable or self._gives_up(attempt, delay, deadline):
+                    try:
+                        yield response
+                    finally:
+                        response.release()
+                        limiter.release(ok=not retryable, pause=pause)
+                    return
+                response.release()
+                limiter.release(ok=False, pause=pause)
+            await asyncio.sleep(delay)
+
+    async def xivapi_call(
+            self, fn: Callable[..., Awaitable[Any]], *args, **kwargs,
+        ) -> Any:
+        """
+        Await one pyxivapi client method within XIVAPI's limits, retrying
+        server errors and the statuses it returns None for. Which status
+        that was isn't known, so the host isn't paused as for a 429.
+        """
+        limiter = self.limiter(XIVAPI_HOST)
+        deadline = time.monotonic() + self.retry_budget
+        for attempt in range(self.attempts):
+            await limiter.acquire_async()
+            try:
+                result = await fn(*args, **kwargs)
+            except XIVAPI_RETRY_ERRORS:
+                delay, _ = self._backoff(attempt, None, None)
+                limiter.release(ok=False)
+                if self._gives_up(attempt, delay, deadline):
+                    raise
+            except BaseException:
+                limiter.release(ok=None)
+                raise
+            else:
+                if result is not None:
+                    limiter.release(ok=True)
+                    return result
+                delay, _ = self._backoff(attempt, None, None)
+                limiter.release(ok=False)
+                if self._gives_up(attempt, delay, deadline):
+                    raise pyxivapi.exceptions.XIVAPIError(
+                        "XIVAPI still had no answer after retrying."
+                    )
+            await asyncio.sleep(delay)
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+def make_xivapi_client() -> pyxivapi.XIVAPIClient:
+    """
+    A pyxivapi client for XIVAPI_BASE_URL, whose calls should go through
+    xivapi_call.
+    """
+    client = pyxivapi.XIVAPIClient(api_key=XIVAPI_KEY)
+    client.base_url = XIVAPI_BASE_URL
+    return client
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+def get_http_client() -> HttpClient:
+    # one per process, so that every caller shares each host's limits
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = HttpClient()
+        return _http_client
@@ -0,0 +1,149 @@
+"""
+Every item in the game, from the datamining Item sheet, indexed by name so
+that names resolve to ids in-process instead of with an XIVAPI search each.
+
+Names are looked up exactly first, then by a normalized form that ignores
+case, accents, punctuation and spacing, and only then fuzzily. Catch-all
+names like "Combat Materia VII" are expanded into the items they stand for
+by expand_aliases.
+"""
+
+import difflib
+import io
+import re
+import unicodedata
+import pandas as pd
+from typing import Any, Dict, List, Optional
+
+from ffxiv_shugo.constants import (
+    DATAMINING_CSV_URL,
+    MATERIA_MAP,
+    PAGE_FETCH_TIMEOUT,
+)
+from ffxiv_shugo.data_store import read_table, table_exists, table_modified_at
+from ffxiv_shugo.http_client import get_http_client
+
+CATALOG_TABLE = "items"
+# how close a name has to be to be taken as a misspelling, between 0 and 1
+FUZZY_CUTOFF = 0.9
+# the wiki and the game don't always agree on which apostrophe to use
+PUNCTUATION_REGEX = re.compile(r"[^\w\s]")
+WHITESPACE_REGEX = re.compile(r"\s+")
+
+ItemRecord = Dict[str, Any]
+
+def read_sheet(name: str, base_url: str = DATAMINING_CSV_URL) -> pd.DataFrame:
+    """
+    One of the game's data sheets. The first line of each csv holds column
+    indexes and the third their types, so only the second is kept as header.
+    base_url may also be a local checkout of the sheets.
+    """
+    path = f"{base_url}/{name}.csv"
+    if path.startswith(("http://", "https://")):
+        response = get_http_client().request(
+            "GET", path, timeout=PAGE_FETCH_TIMEOUT,
+        )
+        response.raise_for_status()
+        path = io.StringIO(response.text)
+    return pd.read_csv(path, skiprows=[0, 2], low_memory=False)
+
+def build_items(item: pd.DataFrame) -> pd.DataFrame:
+    """
+    The items table out of the Item sheet, leaving out unnamed rows.
+    """
+    items = item.rename(columns={
+        "#": "id",
+        "Name": "item_name",
+        "IsUntradable": "is_untradable",
+        "Price{Mid}": "price_mid",
+        "Price{Low}": "price_low",
+    })
+    items = items.loc[items["item_name"].fillna("").str.strip() != ""]
+    items = items.assign(
+        is_untradable=items["is_untradable"].astype(str).str.lower() == "true",
+    )
+    return items.sort_values("id")
+
+def normalize_name(name: str) -> str:
+    """
+    name without case, accents, punctuation or repeated spaces.
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    name = PUNCTUATION_REGEX.sub("", name.casefold())
+    return WHITESPACE_REGEX.sub(" ", name).strip()
+
+# Sometimes they get lazy with the name
+# e.g. they use "Combat materia VII" as a catch-all
+def expand_aliases(item_name: str) -> List[str]:
+    """
+    The names of the items that item_name stands for, usually just itself.
+    """
+    if item_name.lower().startswith("combat materia"):
+        grade = item_name.split()[-1]
+        return [
+            f"{materia} Materia {grade}"
+            for materia, _ in MATERIA_MAP["combat"]
+        ]
+    return [item_name]
+
+class ItemCatalog:
+    """
+    Name indexes over items (as from read_table("items")). Where several
+    items share a name, the one with the lowest id wins.
+    """
+    def __init__(self, items: pd.DataFrame):
+        items = items.sort_values("id")
+        records = items.to_dict("records")
+        self.by_id: Dict[int, ItemRecord] = {}
+        self._by_name: Dict[str, ItemRecord] = {}
+        self._by_key: Dict[str, ItemRecord] = {}
+        for record in records:
+            record["id"] = int(record["id"])
+            self.by_id[record["id"]] = record
+            self._by_name.setdefault(record["item_name"], record)
+            self._by_key.setdefault(normalize_name(record["item_name"]), record)
+        self._keys = list(self._by_key)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    @classmethod
+    def load(cls) -> "ItemCatalog":
+        return cls(read_table(CATALOG_TABLE))
+
+    def find(self, item_name: str, fuzzy: bool = True) -> Optional[ItemRecord]:
+        """
+        The item called item_name, or None if nothing matches closely enough.
+        """
+        record = self._by_name.get(item_name)
+        if record is not None:
+            return record
+        key = normalize_name(item_name)
+        record = self._by_key.get(key)
+        if record is not None or not fuzzy:
+            return record
+        # names that differ in their last word are usually different grades
+        # of the same thing, e.g. "... Materia IX" and "... Materia X"
+        last_word = key.rsplit(" ", 1)[-1]
+        for match in difflib.get_close_matches(key, self._keys, 3, FUZZY_CUTOFF):
+            if match.rsplit(" ", 1)[-1] == last_word:
+                return self._by_key[match]
+        return None
+
+_catalog = None
+_catalog_modified_at = None
+
+def get_catalog() -> Optional[ItemCatalog]:
+    """
+    The catalog, loaded once per process and again whenever the table is
+    rebuilt, or None if it hasn't been built yet.
+    """
+    global _catalog, _catalog_modified_at
+    if not table_exists(CATALOG_TABLE):
+        return None
+    modified_at = table_modified_at(CATALOG_TABLE)
+    if _catalog is None or modified_at != _catalog_modified_at:
+        _catalog = ItemCatalog.load()
+        _catalog_modified_at = modified_at
+    return _catalog
@@ -0,0 +1,366 @@
+"""
+Live market board listings from the universalis websocket, kept as an
+in-memory order book per (world, item) so that minimum prices and depth can
+be read at any time without another request.
+
+On every (re)connect the books of watched items are backfilled from the REST
+API. Events that arrive during the backfill are held back and replayed on
+top of it, so nothing is lost in between.
+"""
+
+import asyncio
+import bisect
+import functools
+import json
+import logging
+import threading
+import aiohttp
+import pandas as pd
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ffxiv_shugo.constants import (
+    UNIVERSALIS_API_URL,
+    UNIVERSALIS_TIMEOUT,
+    UNIVERSALIS_WS_ENCODING,
+    UNIVERSALIS_WS_URL,
+)
+from ffxiv_shugo.http_client import get_http_client
+from ffxiv_shugo.retry import backoff_delay
+from ffxiv_shugo.utilities import World, chunk_item_ids
+
+logger = logging.getLogger(__name__)
+
+Listing = Dict[str, Any]
+EVENTS = ["listings/add", "listings/remove"]
+# the parts of each listing that the books use
+LISTING_FIELDS = ["listingID", "pricePerUnit", "quantity", "hq"]
+
+class OrderBook:
+    """
+    The listings of one item on one world, ordered by price.
+    """
+    def __init__(self, listings: Iterable[Listing] = ()):
+        self._listings = {}
+        # (pricePerUnit, listingID), kept sorted
+        self._keys = []
+        self.add(listings)
+
+    def __len__(self) -> int:
+        return len(self._listings)
+
+    def _key(self, listing: Listing) -> Tuple[float, str]:
+        return float(listing["pricePerUnit"]), str(listing["listingID"])
+
+    def add(self, listings: Iterable[Listing]) -> None:
+        for listing in listings:
+            listing_id = str(listing["listingID"])
+            if listing_id in self._listings:
+                # a relisting at a new price replaces the old one
+                self.remove([self._listings[listing_id]])
+            self._listings[listing_id] = listing
+            bisect.insort(self._keys, self._key(listing))
+
+    def remove(self, listings: Iterable[Listing]) -> None:
+        for listing in listings:
+            existing = self._listings.pop(str(listing["listingID"]), None)
+            if existing is None:
+                continue
+            idx = bisect.bisect_left(self._keys, self._key(existing))
+            del self._keys[idx]
+
+    def min_price(self) -> Optional[float]:
+        return self._keys[0][0] if self._keys else None
+
+    def listings(self) -> List[Listing]:
+        """
+        Every listing, cheapest first.
+        """
+        return [self._listings[listing_id] for _, listing_id in self._keys]
+
+    def depth(self) -> pd.DataFrame:
+        """
+        One row per price level, with the quantity listed at that price and
+        the quantity listed at or below it.
+        """
+        listings = pd.DataFrame(
+            self.listings(), columns=LISTING_FIELDS,
+        ).astype({"pricePerUnit": float, "quantity": int})
+        levels = listings.groupby("pricePerUnit", sort=True).agg(
+            quantity=("quantity", "sum"), listings=("listingID", "size"),
+        )
+        levels["cumulative_quantity"] = levels["quantity"].cumsum()
+        return levels.reset_index().rename(columns={"pricePerUnit": "price"})
+
+def fetch_listings(
+        world: World, item_ids: List[int],
+    ) -> Dict[int, List[Listing]]:
+    """
+    Every current listing of item_ids on world, from the REST API.
+    """
+    listings = {}
+    for chunk in chunk_item_ids(item_ids):
+        prefix = "" if len(chunk) == 1 else "items."
+        response = get_http_client().request(
+            "GET",
+            f"{UNIVERSALIS_API_URL}/{world}/{','.join(map(str, chunk))}",
+            params={
+                "entries": 0,
+                "fields": ",".join(
+                    f"{prefix}listings.{field}" for field in LISTING_FIELDS
+                ),
+            },
+            timeout=UNIVERSALIS_TIMEOUT,
+        )
+        response.raise_for_status()
+        data = response.json()
+        items = {chunk[0]: data} if len(chunk) == 1 else data["items"]
+        for item_id, item_data in items.items():
+            listings[int(item_id)] = item_data.get("listings") or []
+    return listings
+
+def _encode(message: Dict[str, Any], encoding: str) -> Tuple[bool, Any]:
+    # (is binary, payload)
+    if encoding == "bson":
+        # imported here so that json stand-ins work without pymongo
+        import bson
+        return True, bson.encode(message)
+    return False, json.dumps(message)
+
+def _decode(data: Any, encoding: str) -> Dict[str, Any]:
+    if encoding == "bson":
+        import bson
+        return bson.decode(data)
+    return json.loads(data)
+
+class LiveListings:
+    """
+    Subscribes to listing events for worlds and keeps an OrderBook for each
+    watched item. Runs on its own thread and event loop once started; every
+    method is safe to call from other threads.
+    """
+    def __init__(
+            self,
+            worlds: Iterable[World],
+            url: str = UNIVERSALIS_WS_URL,
+            encoding: str = UNIVERSALIS_WS_ENCODING,
+        ):
+        self.worlds = list(worlds)
+        self.url = url
+        self.encoding = encoding
+        self.connected = threading.Event()
+        # why the last connection was lost, until the next one goes live
+        self.last_error: Optional[str] = None
+        self._books = {}
+        self._watched = set()
+        self._backfilled = set()
+        # item_id -> events that arrived while its backfill was in flight
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._stopping = False
+
+    def watch(self, item_ids: Iterable[int]) -> None:
+        """
+        Start keeping books for item_ids, backfilling them right away when
+        connected.
+        """
+        with self._lock:
+            new_ids = [
+                int(item_id) for item_id in item_ids
+                if int(item_id) not in self._watched
+            ]
+            self._watched.update(new_ids)
+        if new_ids:
+            self._backfill_soon(new_ids)
+
+    def _backfill_soon(self, item_ids: List[int], attempt: int = 0) -> None:
+        # backfill from any thread, retrying with backoff until it works
+        with self._lock:
+            if not self.connected.is_set():
+                # the catch up after (re)connecting covers every watched item
+                return
+            item_ids = [
+                item_id for item_id in item_ids
+                if item_id not in self._backfilled
+            ]
+        if not item_ids:
+            return
+        future = asyncio.run_coroutine_threadsafe(
+            self._backfill(item_ids), self._loop,
+        )
+        future.add_done_callback(
+            functools.partial(self._backfill_done, item_ids, attempt),
+        )
+
+    def _backfill_done(self, item_ids: List[int], attempt: int, future) -> None:
+        if future.cancelled() or future.exception() is None or self._stopping:
+            return
+        delay = backoff_delay(attempt, 1.0, 60.0)
+        logger.warning(
+            "Backfilling %d items on worlds %s failed (%s: %s), retrying in %.1fs",
+            len(item_ids),
+            self.worlds,
+            type(future.exception()).__name__,
+            future.exception(),
+            delay,
+        )
+        self._loop.call_soon_threadsafe(
+            self._loop.call_later,
+            delay,
+            self._backfill_soon,
+            item_ids,
+            attempt + 1,
+        )
+
+    def book(self, world: World, item_id: int) -> Optional[OrderBook]:
+        """
+        A copy of the current book, or None until it has been backfilled.
+        """
+        with self._lock:
+            book = self._books.get((str(world), int(item_id)))
+            return None if book is None else OrderBook(book.listings())
+
+    def min_prices(self, world: World) -> Dict[int, Optional[float]]:
+        with self._lock:
+            return {
+                item_id: book.min_price()
+                for (book_world, item_id), book in self._books.items()
+                if book_world == str(world)
+            }
+
+    def _apply(self, event: Dict[str, Any]) -> None:
+        item_id = int(event["item"])
+        if item_id in self._pending:
+            self._pending[item_id].append(event)
+            return
+        key = (str(event["world"]), item_id)
+        book = self._books.setdefault(key, OrderBook())
+        if event["event"] == "listings/add":
+            book.add(event["listings"])
+        elif event["event"] == "listings/remove":
+            book.remove(event["listings"])
+
+    def apply(self, event: Dict[str, Any]) -> None:
+        """
+        Update the books with one listings/add or listings/remove event.
+        """
+        with self._lock:
+            if int(event["item"]) in self._watched:
+                self._apply(event)
+
+    async def _backfill(self, item_ids: List[int]) -> None:
+        with self._lock:
+            for item_id in item_ids:
+                self._pending.setdefault(item_id, [])
+        loop = asyncio.get_running_loop()
+        try:
+            listings = {
+                world: await loop.run_in_executor(
+                    None, fetch_listings, world, item_ids,
+                )
+                for world in self.worlds
+            }
+        except BaseException:
+            with self._lock:
+                for item_id in item_ids:
+                    self._pending.pop(item_id, None)
+            raise
+        with self._lock:
+            for world, world_listings in listings.items():
+                for item_id in item_ids:
+                    self._books[(str(world), item_id)] = OrderBook(
+                        world_listings.get(item_id, []),
+                    )
+            for item_id in item_ids:
+                for event in self._pending.pop(item_id, []):
+                    self._apply(event)
+            self._backfilled.update(item_ids)
+
+    async def _catch_up(self) -> None:
+        # backfill until every watched item is covered, then go live
+        while True:
+            with self._lock:
+                todo = list(self._watched - self._backfilled)
+                if not todo:
+                    self.connected.set()
+                    self.last_error = None
+                    return
+            await self._backfill(todo)
+
+    async def _send(self, ws: aiohttp.ClientWebSocketResponse, message) -> None:
+        binary, payload = _encode(message, self.encoding)
+        if binary:
+            await ws.send_bytes(payload)
+        else:
+            await ws.send_str(payload)
+
+    async def _session(self, session: aiohttp.ClientSession) -> None:
+        async with session.ws_connect(self.url, heartbeat=30) as ws:
+            for event in EVENTS:
+                for world in self.worlds:
+                    await self._send(ws, {
+                        "event": "subscribe",
+                        "channel": f"{event}{{world={world}}}",
+                    })
+            # every book is rebuilt, since events were missed while away
+            with self._lock:
+                self._backfilled = set()
+            catch_up = asyncio.ensure_future(self._catch_up())
+            try:
+                async for message in ws:
+                    if catch_up.done() and catch_up.exception() is not None:
+                        raise catch_up.exception()
+                    if message.type not in (
+                            aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY,
+                        ):
+                        break
+                    self.apply(_decode(message.data, self.encoding))
+            finally:
+                catch_up.cancel()
+                self.connected.clear()
+
+    async def run(self) -> None:
+        """
+        Stay subscribed until stop(), reconnecting with backoff.
+        """
+        attempt = 0
+        async with aiohttp.ClientSession() as session:
+            while not self._stopping:
+                try:
+                    await self._session(session)
+                    attempt = 0
+                except Exception as e:
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    attempt += 1
+                if not self._stopping:
+                    delay = backoff_delay(attempt, 1.0, 60.0)
+                    if attempt:
+                        logger.warning(
+                            "Live listings for worlds %s lost their connection "
+                            "to %s (%s), reconnecting in %.1fs",
+                            self.worlds,
+                            self.url,
+                            self.last_error,
+                            delay,
+                        )
+                    await asyncio.sleep(delay)
+
+    def start(self) -> "LiveListings":
+        self._loop = asyncio.new_event_loop()
+
+        def run_forever():
+            try:
+                self._loop.run_until_complete(self.run())
+            except asyncio.CancelledError:
+                pass
+
+        self._thread = threading.Thread(target=run_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopping = True
+        if self._loop is not None:
+            for task in asyncio.all_tasks(self._loop):
+                self._loop.call_soon_threadsafe(task.cancel)
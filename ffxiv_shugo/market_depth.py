@@ -0,0 +1,117 @@
+"""
+What selling some number of units would actually bring in, given the
+listings already on the market board.
+
+Buyers take the cheapest units first and an item only moves so many units a
+day. For N units to sell within a horizon, no more than (demand - N) of the
+units already listed can be cheaper than them, so they have to undercut the
+listing at that depth of the ladder. When demand is below N, undercutting
+everything only sells as many units as there is demand for.
+
+Every item is handled at once, with cumsums over the flattened ladders.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# how long we're willing to wait for units to sell
+SELL_HORIZON_DAYS = 7.0
+# gil knocked off the price being undercut
+UNDERCUT = 1.0
+
+def listing_ladder(
+        listings: Iterable[Dict[str, Any]],
+    ) -> Tuple[List[float], List[int]]:
+    """
+    (prices, quantities) of listings, cheapest first.
+    """
+    ladder = sorted(
+        (float(listing["pricePerUnit"]), int(listing["quantity"]))
+        for listing in listings
+    )
+    return [price for price, _ in ladder], [quantity for _, quantity in ladder]
+
+def sell_estimates(
+        ladder_prices: Sequence[Sequence[float]],
+        ladder_quantities: Sequence[Sequence[int]],
+        units_per_day: Sequence[float],
+        quantity: Union[int, Sequence[int]],
+        horizon_days: float = SELL_HORIZON_DAYS,
+        ceiling: Optional[Sequence[float]] = None,
+        undercut: float = UNDERCUT,
+    ) -> pd.DataFrame:
+    """
+    For each item's ladder (as from listing_ladder), the price that quantity
+    units would have to be listed at to sell within horizon_days, how many
+    of them would sell and the gil they would bring in. Prices are capped at
+    ceiling (e.g. the median sale price) where given, which also stands in
+    for the price when the ladder runs out.
+    """
+    n_items = len(ladder_prices)
+    counts = np.fromiter(map(len, ladder_prices), dtype=np.int64, count=n_items)
+    prices = np.concatenate(
+        [np.asarray(ladder, dtype=float) for ladder in ladder_prices] or [[]]
+    )
+    cumulative = np.cumsum(np.concatenate(
+        [np.asarray(ladder, dtype=float) for ladder in ladder_quantities] or [[]]
+    ))
+    starts = np.cumsum(counts) - counts
+    stops = starts + counts
+    # cumulative quantity listed before each item's ladder begins
+    offsets = np.concatenate([[0.0], cumulative])[starts]
+
+    quantity = np.broadcast_to(np.asarray(quantity, dtype=float), n_items)
+    demand = np.nan_to_num(np.asarray(units_per_day, dtype=float), nan=0.0)
+    demand = demand.clip(min=0.0) * horizon_days
+    ceiling = (
+        np.full(n_items, np.nan) if ceiling is None
+        else np.asarray(ceiling, dtype=float)
+    )
+    # when the ladder runs out, the most expensive listing is the fallback
+    last_price = np.full(n_items, np.nan)
+    has_listings = counts > 0
+    last_price[has_listings] = prices[stops[has_listings] - 1]
+    beyond_ladder = np.where(np.isnan(ceiling), last_price, ceiling)
+
+    # the existing units that may be cheaper than ours
+    ahead = (demand - quantity).clip(min=0.0)
+    idx = np.searchsorted(cumulative, offsets + ahead, side="right")
+    in_ladder = idx < stops
+    marginal = beyond_ladder.copy()
+    marginal[in_ladder] = prices[idx[in_ladder]] - undercut
+    marginal = np.fmin(marginal, ceiling).clip(min=1.0)
+
+    sold = np.minimum(quantity, demand)
+    proceeds = sold * marginal
+    return pd.DataFrame({
+        "expected_units_sold": sold,
+        "marginal_price": marginal,
+        "expected_proceeds": proceeds,
+        "proceeds_per_unit": proceeds / quantity,
+    })
+
+def sell_estimates_for(
+        prices: pd.DataFrame,
+        quantity: Union[int, Sequence[int]],
+        horizon_days: float = SELL_HORIZON_DAYS,
+    ) -> pd.DataFrame:
+    """
+    sell_estimates for merge_prices output, capped at each item's median
+    sale price and indexed like prices.
+    """
+    # items that weren't priced have no ladder at all
+    ladders = [
+        [ladder if isinstance(ladder, list) else [] for ladder in prices[col]]
+        for col in ("listing_prices", "listing_quantities")
+    ]
+    estimates = sell_estimates(
+        ladders[0],
+        ladders[1],
+        prices["units_per_day"].to_numpy(dtype=float),
+        quantity,
+        horizon_days,
+        ceiling=prices["median_price"].to_numpy(dtype=float),
+    )
+    estimates.index = prices.index
+    return estimates
@@ -0,0 +1,140 @@
+"""
+Per-item market statistics computed over the recent sales and current listings
+of many items at once.
+
+The entries of every item are flattened into one columnar frame and the
+aggregates are computed with groupbys over it, rather than item by item.
+"""
+
+import numpy as np
+import pandas as pd
+import time
+from typing import Any, Dict, Optional, Sequence
+
+# key in the universalis item -> (field -> dtype) to pull out of each entry
+HISTORY_FIELDS = {
+    "pricePerUnit": np.float64,
+    "quantity": np.int64,
+    "hq": bool,
+    "timestamp": np.int64,
+}
+LISTING_FIELDS = {
+    "pricePerUnit": np.float64,
+    "quantity": np.int64,
+    "hq": bool,
+}
+PERCENTILES = (0.1, 0.25, 0.75, 0.9)
+# share of the cheapest and most expensive sales ignored by the trimmed mean
+TRIM = 0.1
+# shortest span, in days, the sales are spread over, so that a sale made just
+# now doesn't divide by zero. universalis only keeps the last few dozen sales,
+# which for busy items all happened within the hour
+MIN_SPAN_DAYS = 60 / 86400
+
+STAT_COLUMNS = [
+    "median_price",
+    "volume_weighted_price",
+    *[f"price_p{int(q * 100)}" for q in PERCENTILES],
+    "trimmed_mean_price",
+    "sales_per_day",
+    "units_per_day",
+    "nq_median_price",
+    "hq_median_price",
+    "hq_sale_share",
+    "listing_count",
+    "listed_quantity",
+    "min_listing_price",
+]
+
+def flatten_entries(
+        items: Dict[int, Dict[str, Any]],
+        key: str,
+        fields: Dict[str, Any],
+    ) -> pd.DataFrame:
+    """
+    One row per entry of items[*][key], with an item_id column.
+    """
+    entry_lists = [item.get(key) or [] for item in items.values()]
+    counts = np.fromiter(map(len, entry_lists), dtype=np.int64, count=len(items))
+    n_entries = int(counts.sum())
+    item_ids = np.fromiter(items.keys(), dtype=np.int64, count=len(items))
+    entries = [entry for entry_list in entry_lists for entry in entry_list]
+    columns = {"item_id": np.repeat(item_ids, counts)}
+    for field, dtype in fields.items():
+        columns[field] = np.fromiter(
+            (entry.get(field, 0) for entry in entries), dtype=dtype, count=n_entries,
+        )
+    return pd.DataFrame(columns)
+
+def _trimmed_mean(history: pd.DataFrame, trim: float) -> pd.Series:
+    history = history.sort_values(["item_id", "pricePerUnit"], kind="mergesort")
+    by_item = history.groupby("item_id")["pricePerUnit"]
+    position = by_item.cumcount()
+    size = by_item.transform("size")
+    cut = np.floor(size * trim)
+    kept = history.loc[(position >= cut) & (position < size - cut)]
+    return kept.groupby("item_id")["pricePerUnit"].mean()
+
+def summarize_history(
+        history: pd.DataFrame,
+        now: Optional[float] = None,
+        percentiles: Sequence[float] = PERCENTILES,
+        trim: float = TRIM,
+    ) -> pd.DataFrame:
+    """
+    Aggregates of flattened recentHistory, indexed by item_id.
+    """
+    now = time.time() if now is None else now
+    history = history.assign(
+        value=history["pricePerUnit"] * history["quantity"],
+    )
+    by_item = history.groupby("item_id")
+    prices = by_item["pricePerUnit"]
+    stats = pd.DataFrame({
+        "averageRecentPrice": prices.mean(),
+        "averageRecentHistoryStackSize": by_item["quantity"].mean(),
+        "median_price": prices.median(),
+        "volume_weighted_price": (
+            by_item["value"].sum() / by_item["quantity"].sum()
+        ),
+    })
+    for q in percentiles:
+        stats[f"price_p{int(q * 100)}"] = prices.quantile(q)
+    stats["trimmed_mean_price"] = _trimmed_mean(history, trim)
+
+    # the history covers from the oldest sale until now
+    days = ((now - by_item["timestamp"].min()) / 86400).clip(lower=MIN_SPAN_DAYS)
+    stats["sales_per_day"] = prices.size() / days
+    stats["units_per_day"] = by_item["quantity"].sum() / days
+
+    by_quality = history.groupby(["item_id", "hq"])["pricePerUnit"].median()
+    by_quality = by_quality.unstack("hq").reindex(columns=[False, True])
+    stats["nq_median_price"] = by_quality[False]
+    stats["hq_median_price"] = by_quality[True]
+    stats["hq_sale_share"] = by_item["hq"].mean()
+    return stats
+
+def summarize_listings(listings: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregates of flattened listings, indexed by item_id.
+    """
+    by_item = listings.groupby("item_id")
+    return pd.DataFrame({
+        "listing_count": by_item.size(),
+        "listed_quantity": by_item["quantity"].sum(),
+        "min_listing_price": by_item["pricePerUnit"].min(),
+    })
+
+def market_stats(
+        items: Dict[int, Dict[str, Any]], now: Optional[float] = None,
+    ) -> pd.DataFrame:
+    """
+    Every statistic for every one of items (item_id -> universalis item),
+    indexed by item_id. Items without sales or listings get NaNs.
+    """
+    history = flatten_entries(items, "recentHistory", HISTORY_FIELDS)
+    listings = flatten_entries(items, "listings", LISTING_FIELDS)
+    stats = summarize_history(history, now).join(
+        summarize_listings(listings), how="outer",
+    )
+    return stats.reindex(pd.Index(list(items), name="item_id"))
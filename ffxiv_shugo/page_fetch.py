@@ -0,0 +1,230 @@
+"""
+Backends for downloading web pages, either over plain pooled HTTP or through
+a small pool of long-lived headless browsers for pages that need JS.
+"""
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from ffxiv_shugo.constants import (
+    PAGE_FETCH_MAX_CONCURRENCY,
+    PAGE_FETCH_TIMEOUT,
+    WEBDRIVER_POOL_SIZE,
+)
+from ffxiv_shugo.http_client import get_http_client
+from ffxiv_shugo.retry import retry_call
+
+class FetchBackend(Enum):
+    HTTP = "http"
+    WEBDRIVER = "webdriver"
+
+class Page(NamedTuple):
+    # text is None when the server says the page hasn't changed
+    text: Optional[str]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.text is None
+
+# url -> (etag, last_modified) from the last time the page was fetched
+Validators = Dict[str, Tuple[Optional[str], Optional[str]]]
+# url -> the exception that was raised by its last attempt
+FetchErrors = Dict[str, BaseException]
+
+def _fetch_all(
+        fetch: Callable[..., Page],
+        urls: List[str],
+        max_workers: int,
+        validators: Validators,
+        errors: Optional[FetchErrors],
+        attempts: int = 4,
+    ) -> Dict[str, Page]:
+    """
+    Fetch urls on a thread pool, trying each one up to attempts times with
+    backoff. Urls that still fail are recorded in errors when it is given,
+    otherwise the first failure is raised.
+    """
+    def fetch_one(url: str) -> Optional[Page]:
+        try:
+            return retry_call(
+                fetch, url, *validators.get(url, (None, None)),
+                attempts=attempts,
+            )
+        except Exception as e:
+            if errors is None:
+                raise
+            errors[url] = e
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pages = dict(zip(urls, executor.map(fetch_one, urls)))
+    return {url: page for url, page in pages.items() if page is not None}
+
+class HttpPageFetcher:
+    """
+    Fetches statically rendered pages through the shared http client, which
+    pools connections and retries on its own.
+    """
+    def __init__(self, max_concurrency: int = PAGE_FETCH_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+
+    def fetch(
+            self,
+            url: str,
+            etag: Optional[str] = None,
+            last_modified: Optional[str] = None,
+        ) -> Page:
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        response = get_http_client().request(
+            "GET", url, headers=headers, timeout=PAGE_FETCH_TIMEOUT,
+        )
+        if response.status_code == 304:
+            return Page(None, etag, last_modified)
+        response.raise_for_status()
+        return Page(
+            response.text,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
+    def fetch_many(
+            self,
+            urls: Iterable[str],
+            validators: Optional[Validators] = None,
+            errors: Optional[FetchErrors] = None,
+        ) -> Dict[str, Page]:
+        return _fetch_all(
+            self.fetch,
+            list(dict.fromkeys(urls)),
+            self.max_concurrency,
+            validators or {},
+            errors,
+            attempts=1,
+        )
+
+    def close(self) -> None:
+        # the http client's pools outlive any one fetcher
+        pass
+
+class WebDriverPageFetcher:
+    """
+    Renders pages with a pool of headless Chrome instances that are started
+    lazily and reused for every url until close() is called.
+    """
+    def __init__(self, pool_size: int = WEBDRIVER_POOL_SIZE):
+        self.pool_size = pool_size
+        self._drivers = []
+        self._idle = queue.Queue()
+        # drivers started or starting, which never goes past pool_size
+        self._reserved = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _new_driver():
+        # imported here so that the http backend works without selenium
+        from selenium import webdriver
+
+        options = webdriver.ChromeOptions()
+        options.add_argument("--log-level=3")
+        options.add_argument("--ignore-certificate-errors")
+        options.add_argument("--incognito")
+        options.add_argument("--headless")
+        driver = webdriver.Chrome(options)
+        driver.set_page_load_timeout(PAGE_FETCH_TIMEOUT)
+        return driver
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            start_new = self._reserved < self.pool_size
+            if start_new:
+                self._reserved += 1
+        if not start_new:
+            return self._idle.get()
+        # started outside the lock, since chrome takes a while to come up
+        try:
+            driver = self._new_driver()
+        except BaseException:
+            with self._lock:
+                self._reserved -= 1
+            raise
+        with self._lock:
+            self._drivers.append(driver)
+        return driver
+
+    def fetch(self, url: str, *_) -> Page:
+        driver = self._acquire()
+        try:
+            driver.get(url)
+            return Page(driver.page_source)
+        finally:
+            self._idle.put(driver)
+
+    def fetch_many(
+            self,
+            urls: Iterable[str],
+            validators: Optional[Validators] = None,
+            errors: Optional[FetchErrors] = None,
+        ) -> Dict[str, Page]:
+        # a browser can't make conditional requests, so validators are ignored
+        return _fetch_all(
+            self.fetch, list(dict.fromkeys(urls)), self.pool_size, {}, errors,
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+            self._reserved = 0
+        for driver in drivers:
+            driver.quit()
+        self._idle = queue.Queue()
+
+def get_page_fetcher(backend: FetchBackend):
+    if backend == FetchBackend.HTTP:
+        return HttpPageFetcher()
+    return WebDriverPageFetcher()
+
+def fetch_pages(
+        urls_by_backend: Dict[FetchBackend, List[str]],
+        validators: Optional[Validators] = None,
+        errors: Optional[FetchErrors] = None,
+    ) -> Dict[str, Page]:
+    """
+    Download every url with its backend, running all of the backends at once.
+    Backends that support it only download pages that changed since validators
+    were recorded. Pass errors to collect failed urls instead of raising.
+    """
+    fetchers = {
+        backend: get_page_fetcher(backend)
+        for backend, urls in urls_by_backend.items() if urls
+    }
+    pages = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(len(fetchers), 1)) as executor:
+            futures = [
+                executor.submit(
+                    fetcher.fetch_many,
+                    urls_by_backend[backend],
+                    validators,
+                    errors,
+                )
+                for backend, fetcher in fetchers.items()
+            ]
+            for future in futures:
+                pages.update(future.result())
+    finally:
+        for fetcher in fetchers.values():
+            fetcher.close()
+    return pages
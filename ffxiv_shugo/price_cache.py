@@ -0,0 +1,155 @@
+"""
+A small SQLite backed cache for market board prices, keyed by (world, item_id).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ffxiv_shugo.constants import (
+    PRICE_CACHE_MAX_ROWS,
+    PRICE_CACHE_PATH,
+    PRICE_CACHE_STALE_WHILE_REVALIDATE,
+    PRICE_CACHE_TTL,
+)
+
+CachedRows = Dict[int, Dict[str, Any]]
+
+class PriceCache:
+    def __init__(
+            self,
+            path: str = PRICE_CACHE_PATH,
+            ttl: float = PRICE_CACHE_TTL,
+            max_rows: int = PRICE_CACHE_MAX_ROWS,
+            stale_while_revalidate: bool = PRICE_CACHE_STALE_WHILE_REVALIDATE,
+        ):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.stale_while_revalidate = stale_while_revalidate
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS prices ("
+                "world TEXT NOT NULL, "
+                "item_id INTEGER NOT NULL, "
+                "fetched_at REAL NOT NULL, "
+                "payload TEXT NOT NULL, "
+                "PRIMARY KEY (world, item_id))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS prices_fetched_at "
+                "ON prices (fetched_at)"
+            )
+
+    def get_entries(
+            self, world: Any, item_ids: Iterable[int],
+        ) -> Dict[int, Tuple[float, Dict[str, Any]]]:
+        """
+        (fetched_at, result) for whichever of item_ids are cached, however old.
+        """
+        item_ids = list(item_ids)
+        entries = {}
+        with self._lock:
+            # stay well under SQLite's bound variable limit
+            for idx in range(0, len(item_ids), 500):
+                chunk = item_ids[idx:idx + 500]
+                rows = self._conn.execute(
+                    "SELECT item_id, fetched_at, payload FROM prices "
+                    f"WHERE world = ? AND item_id IN ({','.join('?' * len(chunk))})",
+                    [str(world), *chunk],
+                ).fetchall()
+                for item_id, fetched_at, payload in rows:
+                    entries[item_id] = (fetched_at, json.loads(payload))
+        return entries
+
+    def get_many(
+            self, world: Any, item_ids: Iterable[int],
+        ) -> Tuple[CachedRows, CachedRows]:
+        """
+        Returns (fresh, stale) rows for whichever of item_ids are cached.
+        """
+        fresh, stale = {}, {}
+        cutoff = time.time() - self.ttl
+        for item_id, (fetched_at, result) in self.get_entries(
+            world, item_ids,
+        ).items():
+            target = fresh if fetched_at >= cutoff else stale
+            target[item_id] = result
+        return fresh, stale
+
+    def put_many(self, world: Any, results: List[Dict[str, Any]]) -> None:
+        if not results:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO prices (world, item_id, fetched_at, payload) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (str(world), int(result["item_id"]), now, json.dumps(result))
+                    for result in results
+                ],
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        # drop the least recently fetched rows once we're over the size bound
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM prices").fetchone()
+        excess = count - self.max_rows
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM prices WHERE rowid IN ("
+                "SELECT rowid FROM prices ORDER BY fetched_at LIMIT ?)",
+                (excess,),
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM prices")
+
+    def refresh_in_background(
+            self,
+            world: Any,
+            item_ids: Iterable[int],
+            fetch: Callable[[List[int]], List[Dict[str, Any]]],
+        ) -> Optional[threading.Thread]:
+        """
+        Re-fetch item_ids on a daemon thread, skipping any that are already
+        being refreshed.
+        """
+        with self._lock:
+            keys = [(str(world), item_id) for item_id in item_ids]
+            keys = [key for key in keys if key not in self._refreshing]
+            self._refreshing.update(keys)
+        if not keys:
+            return None
+
+        def refresh():
+            try:
+                self.put_many(world, fetch([item_id for _, item_id in keys]))
+            finally:
+                with self._lock:
+                    self._refreshing.difference_update(keys)
+
+        thread = threading.Thread(target=refresh, daemon=True)
+        thread.start()
+        return thread
+
+_price_cache = None
+
+def get_price_cache() -> PriceCache:
+    global _price_cache
+    if _price_cache is None:
+        _price_cache = PriceCache()
+    return _price_cache
@@ -0,0 +1,293 @@
+"""
+An append-only store of every price snapshot that gets fetched, for looking
+at trends without going back to universalis.
+
+Snapshots land in raw/date=YYYY-MM-DD/, one small Parquet file per append,
+and a day's files are merged into one whenever PRICE_HISTORY_COMPACT_FILES
+of them pile up. rollup() later averages old days down to hourly/ and then
+daily/ files, so each day lives in exactly one of the three tiers. Files are
+sorted by item_id, which lets range queries for a few items skip most row
+groups.
+"""
+
+import argparse
+import datetime
+import glob
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from typing import Iterable, List, Optional
+
+from ffxiv_shugo.constants import (
+    PRICE_HISTORY_COMPACT_FILES,
+    PRICE_HISTORY_DIR,
+    PRICE_HISTORY_HOURLY_DAYS,
+    PRICE_HISTORY_RAW_DAYS,
+)
+
+# the price columns (as named by the apps) kept for every snapshot
+HISTORY_COLUMNS = [
+    "current_average_price",
+    "min_price",
+    "average_recent_price",
+    "median_price",
+    "volume_weighted_price",
+    "sale_velocity",
+    "units_per_day",
+    "listing_count",
+    "listed_quantity",
+]
+SCHEMA = pa.schema([
+    ("timestamp", pa.int64()),
+    ("world", pa.string()),
+    ("item_id", pa.int32()),
+    # how many snapshots were averaged into this row
+    ("samples", pa.int32()),
+    *[(col, pa.float64()) for col in HISTORY_COLUMNS],
+])
+# tier -> seconds covered by each of its rows, finest first
+TIERS = {"raw": None, "hourly": 3600, "daily": 86400}
+ROW_GROUP_SIZE = 10_000
+# suffix of raw files taken by a compaction that hasn't finished yet
+CLAIM_SUFFIX = ".compacting"
+
+def _day(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(
+        timestamp, datetime.timezone.utc,
+    ).strftime("%Y-%m-%d")
+
+def _partitions(tier: str, root: str) -> List[str]:
+    # the days that tier holds, oldest first
+    paths = glob.glob(os.path.join(root, tier, "date=*"))
+    return sorted(
+        os.path.basename(path)[len("date="):].split(".")[0] for path in paths
+    )
+
+def _partition_files(tier: str, day: str, root: str) -> List[str]:
+    if tier == "raw":
+        return sorted(glob.glob(
+            os.path.join(root, tier, f"date={day}", "*.parquet")
+        ))
+    path = os.path.join(root, tier, f"date={day}.parquet")
+    return [path] if os.path.exists(path) else []
+
+def _write(frame: pd.DataFrame, path: str) -> None:
+    directory = os.path.dirname(path)
+    if not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    frame = frame.sort_values(["item_id", "timestamp"], kind="mergesort")
+    table = pa.Table.from_pandas(
+        frame[SCHEMA.names], schema=SCHEMA, preserve_index=False,
+    )
+    # write then rename so readers never see a half written file
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, path)
+
+def append_snapshot(
+        world: object,
+        prices: pd.DataFrame,
+        timestamp: Optional[float] = None,
+        root: str = PRICE_HISTORY_DIR,
+    ) -> Optional[str]:
+    """
+    Store prices (one row per item_id, with any of HISTORY_COLUMNS) as they
+    were on world at timestamp.
+    """
+    if prices.empty:
+        return None
+    timestamp = time.time() if timestamp is None else timestamp
+    frame = prices.reindex(columns=["item_id", *HISTORY_COLUMNS]).assign(
+        timestamp=int(timestamp), world=str(world), samples=1,
+    )
+    # a unique name per append, so that writers never contend for a file
+    day = _day(timestamp)
+    path = os.path.join(
+        root,
+        "raw",
+        f"date={day}",
+        f"part-{int(timestamp * 1000)}-{uuid.uuid4().hex[:8]}.parquet",
+    )
+    _write(frame, path)
+    if len(_partition_files("raw", day, root)) >= PRICE_HISTORY_COMPACT_FILES:
+        compact(day, root)
+    return path
+
+def compact(day: str, root: str = PRICE_HISTORY_DIR) -> Optional[str]:
+    """
+    Merge the raw files of day into one. Each file is claimed by renaming it
+    first, so that writers compacting at the same time never both merge it.
+    """
+    claims = {}
+    for path in _partition_files("raw", day, root):
+        claim = f"{path}.{uuid.uuid4().hex[:8]}{CLAIM_SUFFIX}"
+        try:
+            os.rename(path, claim)
+        except FileNotFoundError:
+            # someone else got to it first
+            continue
+        claims[claim] = path
+    if len(claims) < 2:
+        for claim, path in claims.items():
+            os.rename(claim, path)
+        return None
+    path = os.path.join(
+        root,
+        "raw",
+        f"date={day}",
+        f"part-compacted-{uuid.uuid4().hex[:8]}.parquet",
+    )
+    _write(_read_files(list(claims)), path)
+    for claim in claims:
+        os.remove(claim)
+    return path
+
+def _release_claims(day: str, root: str) -> None:
+    # claims left behind by a compaction that died, put back as they were
+    pattern = os.path.join(root, "raw", f"date={day}", f"*{CLAIM_SUFFIX}")
+    for claim in glob.glob(pattern):
+        os.rename(claim, claim.rsplit(".", 2)[0])
+
+def downsample(frame: pd.DataFrame, seconds: int) -> pd.DataFrame:
+    """
+    Average frame into buckets of seconds per (world, item_id), weighting
+    every row by the snapshots it already stands for.
+    """
+    frame = frame.assign(timestamp=frame["timestamp"] // seconds * seconds)
+    keys = ["world", "item_id", "timestamp"]
+    weights = frame["samples"].to_numpy(dtype=float)
+    weighted = {"samples": frame["samples"]}
+    for col in HISTORY_COLUMNS:
+        values = frame[col].to_numpy(dtype=float)
+        present = ~np.isnan(values)
+        weighted[col] = np.where(present, values * weights, 0.0)
+        weighted[f"{col}_weight"] = np.where(present, weights, 0.0)
+    sums = pd.DataFrame(weighted).assign(
+        **{key: frame[key].to_numpy() for key in keys}
+    ).groupby(keys, sort=False).sum()
+    result = pd.DataFrame({"samples": sums["samples"]}, index=sums.index)
+    for col in HISTORY_COLUMNS:
+        # buckets where a column was always missing stay missing
+        result[col] = sums[col] / sums[f"{col}_weight"].replace(0.0, np.nan)
+    return result.reset_index()
+
+def _read_files(paths: List[str], expression=None) -> pd.DataFrame:
+    if not paths:
+        return pd.DataFrame(columns=SCHEMA.names)
+    dataset = ds.dataset(paths, schema=SCHEMA, format="parquet")
+    return dataset.to_table(filter=expression).to_pandas()
+
+def rollup(now: Optional[float] = None, root: str = PRICE_HISTORY_DIR) -> None:
+    """
+    Merge the files of each raw day into one, and average days older than
+    PRICE_HISTORY_RAW_DAYS and PRICE_HISTORY_HOURLY_DAYS down a tier.
+    """
+    now = time.time() if now is None else now
+    today = _day(now)
+    cutoffs = {
+        "raw": _day(now - PRICE_HISTORY_RAW_DAYS * 86400),
+        "hourly": _day(now - PRICE_HISTORY_HOURLY_DAYS * 86400),
+    }
+    for tier, next_tier in (("raw", "hourly"), ("hourly", "daily")):
+        for day in _partitions(tier, root):
+            if tier == "raw" and day != today:
+                _release_claims(day, root)
+            paths = _partition_files(tier, day, root)
+            if day < cutoffs[tier]:
+                frame = downsample(_read_files(paths), TIERS[next_tier])
+                _write(
+                    frame,
+                    os.path.join(root, next_tier, f"date={day}.parquet"),
+                )
+                if tier == "raw":
+                    shutil.rmtree(os.path.join(root, tier, f"date={day}"))
+                else:
+                    os.remove(paths[0])
+            elif tier == "raw" and day != today and len(paths) > 1:
+                # days that are done being appended to are kept as one file
+                compact(day, root)
+
+def read_history(
+        item_ids: Iterable[int],
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        world: Optional[object] = None,
+        root: str = PRICE_HISTORY_DIR,
+    ) -> pd.DataFrame:
+    """
+    Every stored row for item_ids between the start and end timestamps,
+    at whichever resolution each day is kept in, sorted by time. A time
+    column holds the timestamps as datetimes.
+    """
+    item_ids = [int(item_id) for item_id in item_ids]
+    start_day = None if start is None else _day(start)
+    end_day = None if end is None else _day(end)
+    paths, seen_days = [], set()
+    for tier in TIERS:
+        for day in _partitions(tier, root):
+            if day in seen_days:
+                # an interrupted rollup; the finer copy is the complete one
+                continue
+            if start_day is not None and day < start_day:
+                continue
+            if end_day is not None and day > end_day:
+                continue
+            seen_days.add(day)
+            paths.extend(_partition_files(tier, day, root))
+
+    expression = ds.field("item_id").isin(item_ids)
+    if start is not None:
+        expression &= ds.field("timestamp") >= int(start)
+    if end is not None:
+        expression &= ds.field("timestamp") <= int(end)
+    if world is not None:
+        expression &= ds.field("world") == str(world)
+    history = _read_files(paths, expression)
+    history = history.sort_values(["item_id", "timestamp"], kind="mergesort")
+    history["time"] = pd.to_datetime(history["timestamp"], unit="s")
+    return history.reset_index(drop=True)
+
+def compare_to_rolling(
+        history: pd.DataFrame, column: str, window: str = "7D",
+    ) -> pd.DataFrame:
+    """
+    Per item in read_history output, the latest value of column next to its
+    average over the trailing window (a pandas offset like "7D").
+    """
+    history = history.dropna(subset=[column])
+    if history.empty:
+        return pd.DataFrame(
+            columns=["item_id", "current", "rolling_average", "pct_change"],
+        )
+    rolling = (
+        history.set_index("time")
+        .groupby("item_id")[column]
+        .rolling(window)
+        .mean()
+    )
+    latest = history.groupby("item_id").tail(1).set_index("item_id")
+    comparison = pd.DataFrame({
+        "current": latest[column],
+        "rolling_average": rolling.groupby(level="item_id").last(),
+    })
+    comparison["pct_change"] = (
+        comparison["current"] / comparison["rolling_average"] - 1
+    ) * 100
+    return comparison.reset_index()
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Compact and downsample the stored price history.",
+    )
+    parser.add_argument("--root", default=PRICE_HISTORY_DIR)
+    args = parser.parse_args(args)
+    rollup(root=args.root)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+A local price service that every app process and script can share, so that
+upstream requests scale with the number of distinct items asked for rather
+than with the number of users.
+
+Requests for an item that is already being fetched wait on that fetch
+instead of starting another one. Items that do need fetching are held for
+PRICE_SERVICE_BATCH_WINDOW so that concurrent requests go out together, in
+as few universalis requests as their ids fit in.
+
+Run with `python -m ffxiv_shugo.price_service` and point the apps at it with
+PRICE_SERVICE_URL.
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from ffxiv_shugo.constants import (
+    PRICE_SERVICE_BATCH_WINDOW,
+    PRICE_SERVICE_HOST,
+    PRICE_SERVICE_PORT,
+    UNIVERSALIS_MAX_CONCURRENCY,
+)
+from ffxiv_shugo.utilities import (
+    PriceResult,
+    World,
+    WorldFetcher,
+    fetch_world_prices_from_api,
+    lookup_world_prices_local,
+)
+
+class PriceBroker:
+    """
+    Single-flight, batching front for fetch_world_prices_from_api.
+    """
+    def __init__(
+            self,
+            batch_window: float = PRICE_SERVICE_BATCH_WINDOW,
+            fetch: WorldFetcher = fetch_world_prices_from_api,
+        ):
+        self.batch_window = batch_window
+        self.fetch = fetch
+        self.stats = {"lookups": 0, "batches": 0, "items_fetched": 0}
+        self._lock = threading.Lock()
+        self._has_work = threading.Condition(self._lock)
+        # (world, item_id) -> the fetch that will produce its result
+        self._in_flight: Dict[Tuple[World, int], Future] = {}
+        # world -> item ids waiting for the next batch
+        self._queued: Dict[World, List[int]] = {}
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def fetch_coalesced(
+            self,
+            item_ids_by_world: Dict[World, List[int]],
+            max_concurrency: int = UNIVERSALIS_MAX_CONCURRENCY,
+        ) -> Dict[World, List[PriceResult]]:
+        """
+        Same contract as fetch_world_prices_from_api, sharing the upstream
+        requests with every other caller asking for the same items.
+        """
+        waiting = []
+        with self._lock:
+            for world, item_ids in item_ids_by_world.items():
+                for item_id in item_ids:
+                    future = self._in_flight.get((world, item_id))
+                    if future is None:
+                        future = Future()
+                        self._in_flight[(world, item_id)] = future
+                        self._queued.setdefault(world, []).append(item_id)
+                    waiting.append((world, future))
+            if self._queued:
+                self._has_work.notify()
+        results = {world: [] for world in item_ids_by_world}
+        for world, future in waiting:
+            result = future.result()
+            if result is not None:
+                results[world].append(result)
+        return results
+
+    def _run(self) -> None:
+        while True:
+            with self._has_work:
+                while not self._queued:
+                    self._has_work.wait()
+            # give concurrent requests a moment to join the batch
+            time.sleep(self.batch_window)
+            with self._lock:
+                batch, self._queued = self._queued, {}
+                self.stats["batches"] += 1
+                self.stats["items_fetched"] += sum(map(len, batch.values()))
+            try:
+                fetched = self.fetch(batch, UNIVERSALIS_MAX_CONCURRENCY)
+            except Exception as e:
+                self._settle(batch, {}, e)
+            else:
+                self._settle(batch, fetched, None)
+
+    def _settle(
+            self,
+            batch: Dict[World, List[int]],
+            fetched: Dict[World, List[PriceResult]],
+            error: Optional[BaseException],
+        ) -> None:
+        with self._lock:
+            for world, item_ids in batch.items():
+                by_id = {
+                    result["item_id"]: result
+                    for result in fetched.get(world, [])
+                }
+                for item_id in item_ids:
+                    future = self._in_flight.pop((world, item_id))
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        # items universalis doesn't know about come back empty
+                        future.set_result(by_id.get(item_id))
+
+    def snapshot_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
+
+    def lookup(
+            self,
+            item_ids: List[int],
+            worlds: List[World],
+            refresh: bool = False,
+        ) -> Dict[World, List[PriceResult]]:
+        with self._lock:
+            self.stats["lookups"] += 1
+        return lookup_world_prices_local(
+            item_ids, worlds, refresh=refresh, fetch=self.fetch_coalesced,
+        )
+
+class PriceServiceHandler(BaseHTTPRequestHandler):
+    """
+    POST /prices {"item_ids": [...], "worlds": [...], "refresh": false}
+        -> {"prices": [[results of worlds[0]], ...]}
+    GET /stats -> the broker's counters
+    """
+    def _respond(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path != "/stats":
+            return self._respond(404, {"error": "not found"})
+        self._respond(200, self.server.broker.snapshot_stats())
+
+    def do_POST(self):
+        if self.path != "/prices":
+            return self._respond(404, {"error": "not found"})
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        try:
+            results = self.server.broker.lookup(
+                request.get("item_ids", []),
+                request.get("worlds", []),
+                bool(request.get("refresh", False)),
+            )
+        except Exception as e:
+            return self._respond(502, {"error": str(e)})
+        self._respond(200, {"prices": list(results.values())})
+
+    def log_message(self, format, *args):
+        # one line per lookup would drown out everything else
+        pass
+
+def make_server(
+        host: str = PRICE_SERVICE_HOST,
+        port: int = PRICE_SERVICE_PORT,
+        broker: Optional[PriceBroker] = None,
+    ) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), PriceServiceHandler)
+    server.daemon_threads = True
+    server.broker = broker or PriceBroker()
+    return server
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Serve cached, coalesced market prices to local apps.",
+    )
+    parser.add_argument("--host", default=PRICE_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=PRICE_SERVICE_PORT)
+    parser.add_argument(
+        "--batch-window",
+        type=float,
+        default=PRICE_SERVICE_BATCH_WINDOW,
+        help="Seconds to wait for concurrent requests to join a batch.",
+    )
+    args = parser.parse_args(args)
+    server = make_server(
+        args.host, args.port, PriceBroker(batch_window=args.batch_window),
+    )
+    print(f"Serving prices on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+An index over priced items for answering "what should I spend this currency
+on" without re-sorting everything on each question.
+
+Each item's value is its gil per currency unit, discounted by how quickly it
+actually sells, and is computed once per price refresh. Queries then only
+select the top k of the matching items.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Optional
+
+from ffxiv_shugo.market_depth import SELL_HORIZON_DAYS, sell_estimates_for
+from ffxiv_shugo.utilities import PriceResult, merge_prices
+
+DEFAULT_VALUE_COL = "normalized_median_price"
+# units sold per day at which an item keeps half of its value; slower items
+# are worth less since the gil takes longer to realize
+LIQUIDITY_HALF_UNITS = 10.0
+
+def liquidity_weight(
+        sale_velocity: np.ndarray, stack_size: np.ndarray,
+    ) -> np.ndarray:
+    """
+    Between 0 (never sells) and 1 (sells instantly) for each item, based on
+    the units it moves per day.
+    """
+    stack_size = np.nan_to_num(stack_size, nan=1.0).clip(min=1.0)
+    sale_velocity = np.nan_to_num(sale_velocity, nan=0.0).clip(min=0.0)
+    units_per_day = sale_velocity * stack_size
+    return units_per_day / (units_per_day + LIQUIDITY_HALF_UNITS)
+
+class RankingIndex:
+    """
+    Best spend values of every item in data (one row per item and currency,
+    with currency_type, sale_velocity, average_recent_stack_size and
+    value_col), grouped by currency. Set adjust_for_liquidity to False when
+    value_col already accounts for how fast items sell.
+    """
+    def __init__(
+            self,
+            data: pd.DataFrame,
+            value_col: str = DEFAULT_VALUE_COL,
+            adjust_for_liquidity: bool = True,
+        ):
+        data = data.reset_index(drop=True)
+        self._velocity = np.nan_to_num(
+            data["sale_velocity"].to_numpy(dtype=float), nan=0.0,
+        )
+        values = data[value_col].to_numpy(dtype=float)
+        if adjust_for_liquidity:
+            stack_size = data["average_recent_stack_size"].to_numpy(dtype=float)
+            values = values * liquidity_weight(self._velocity, stack_size)
+        # items without a price can't be ranked at all
+        self._values = np.where(np.isnan(values), -np.inf, values)
+        self.data = data.assign(best_spend_value=values)
+        # other columns items are selected by, as float arrays
+        self._columns: Dict[str, np.ndarray] = {}
+        self._positions = data.groupby(
+            "currency_type", observed=True, sort=True,
+        ).indices
+
+    @property
+    def currencies(self) -> List[str]:
+        return list(self._positions)
+
+    def _scores(self, sort_by: Optional[str], ascending: bool) -> np.ndarray:
+        """
+        sort_by as scores for _select, where higher is better and nan can't
+        be ranked.
+        """
+        if sort_by is None or sort_by == "best_spend_value":
+            values = self._values
+        else:
+            if sort_by not in self._columns:
+                column = self.data[sort_by]
+                if not pd.api.types.is_numeric_dtype(column):
+                    # ranks keep the order of anything sortable, like names
+                    column = column.rank(method="first")
+                self._columns[sort_by] = column.to_numpy(dtype=float)
+            values = self._columns[sort_by]
+        return -values if ascending else values
+
+    def _select(
+            self,
+            positions: np.ndarray,
+            scores: np.ndarray,
+            k: int,
+            min_velocity: float,
+        ) -> np.ndarray:
+        """
+        Indices into positions/scores of the k best scores, best first.
+        """
+        candidates = np.flatnonzero(
+            (self._velocity[positions] >= min_velocity) & np.isfinite(scores)
+        )
+        if k < len(candidates):
+            top = np.argpartition(-scores[candidates], k - 1)[:k]
+            candidates = candidates[top]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def top_k(
+            self,
+            currency: str,
+            k: int = 10,
+            min_velocity: float = 0.0,
+            sort_by: Optional[str] = None,
+            ascending: bool = False,
+        ) -> pd.DataFrame:
+        """
+        The k items worth the most per unit of currency, out of those selling
+        at least min_velocity times per day. With sort_by, the k items that
+        come first when sorted by that column instead, leaving out the ones
+        without a value for it.
+        """
+        positions = self._positions.get(currency, np.empty(0, dtype=np.int64))
+        scores = self._scores(sort_by, ascending)[positions]
+        top = self._select(positions, scores, k, min_velocity)
+        return self.data.iloc[positions[top]]
+
+    def best_use(
+            self,
+            k: int = 10,
+            min_velocity: float = 0.0,
+            holdings: Optional[Dict[str, float]] = None,
+        ) -> pd.DataFrame:
+        """
+        The top k items across every currency. With holdings (currency ->
+        amount held), only those currencies are considered and items are
+        ranked by the total value of spending all of the currency on them,
+        given in a total_spend_value column.
+        """
+        currencies = self.currencies if holdings is None else [
+            currency for currency in holdings if currency in self._positions
+        ]
+        if not currencies:
+            return self.data.iloc[[]].assign(total_spend_value=[])
+        positions = np.concatenate([
+            self._positions[currency] for currency in currencies
+        ])
+        scores = self._values[positions]
+        if holdings is not None:
+            amounts = np.concatenate([
+                np.full(len(self._positions[currency]), float(holdings[currency]))
+                for currency in currencies
+            ])
+            scores = scores * amounts
+        top = self._select(positions, scores, k, min_velocity)
+        return self.data.iloc[positions[top]].assign(
+            total_spend_value=scores[top],
+        )
+
+def build_ranking_index(
+        data: pd.DataFrame,
+        price_results: List[PriceResult],
+        cols_to_normalize: Iterable[str],
+        value_col: str = DEFAULT_VALUE_COL,
+        sell_quantity: Optional[int] = None,
+        horizon_days: float = SELL_HORIZON_DAYS,
+    ) -> RankingIndex:
+    """
+    Merge lookup_prices output onto items_by_currency rows and index them.
+
+    With sell_quantity, items are ranked by normalized_expected_proceeds
+    instead: the gil per currency unit that selling that many units within
+    horizon_days is expected to bring in, given the listings in the way.
+    """
+    data = merge_prices(
+        data,
+        price_results,
+        normalize_by="currency_cost",
+        cols_to_normalize=cols_to_normalize,
+    )
+    if sell_quantity is None:
+        return RankingIndex(data, value_col)
+    data = data.join(sell_estimates_for(data, sell_quantity, horizon_days))
+    data["normalized_expected_proceeds"] = (
+        data["proceeds_per_unit"] / data["currency_cost"].astype(float)
+    )
+    return RankingIndex(
+        data, "normalized_expected_proceeds", adjust_for_liquidity=False,
+    )
@@ -0,0 +1,282 @@
+"""
+Recipe trees, expanded into the raw materials a whole order needs.
+
+The recipes table is loaded once into a graph keyed by item id. What each
+item's tree reaches, and how deep it goes, is worked out the first time the
+item is asked about and remembered, so intermediates shared between items
+(or between orders) are only ever resolved once.
+
+An order is then expanded with a single pass over everything it reaches,
+deepest results first: by the time an intermediate is crafted, every recipe
+that uses it has added to its demand, so its crafts are rounded up once for
+the whole order instead of once per item that needs it.
+
+Whether to buy or craft each intermediate is decided the other way round,
+shallowest first, so that every ingredient's cheapest unit cost is known
+before the recipes that use it are costed.
+"""
+
+import itertools
+import math
+import pandas as pd
+import numpy as np
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from ffxiv_shugo.data_store import read_table
+
+class Recipe(NamedTuple):
+    recipe_id: int
+    craft_type: str
+    amount: int
+    # (ingredient id, amount per craft)
+    ingredients: Tuple[Tuple[int, int], ...]
+
+class Expansion(NamedTuple):
+    # item_id, item_name, quantity
+    raw_materials: pd.DataFrame
+    # item_id, item_name, craft_type, needed, crafts, crafted, leftover
+    crafted: pd.DataFrame
+
+class Plan(NamedTuple):
+    # item_id, item_name, quantity, unit_price, cost
+    purchases: pd.DataFrame
+    # as in Expansion
+    crafted: pd.DataFrame
+    # item_id, item_name, buy_price, craft_cost, decision for every craftable
+    # item the order reaches, per unit
+    decisions: pd.DataFrame
+    # gil spent on purchases, leaving out anything without a price
+    total: float
+
+class RecipeGraph:
+    """
+    Every recipe in recipes (as from read_table("recipes")), keyed by the id
+    of the item it makes. Items with more than one recipe use the one with
+    the lowest recipe_id.
+    """
+    def __init__(self, recipes: pd.DataFrame):
+        self.names: Dict[int, str] = {}
+        self.recipes: Dict[int, Recipe] = {}
+        recipes = recipes.sort_values(["recipe_id", "ingredient_id"])
+        self.names.update(zip(
+            recipes["ingredient_id"].astype(int).tolist(),
+            recipes["ingredient_name"].tolist(),
+        ))
+        self.names.update(zip(
+            recipes["result_id"].astype(int).tolist(),
+            recipes["result_name"].tolist(),
+        ))
+        # plain lists, since going row by row through a frame is far slower
+        rows = zip(*(
+            recipes[col].astype(dtype).tolist() for col, dtype in [
+                ("recipe_id", int),
+                ("craft_type", str),
+                ("result_id", int),
+                ("result_amount", int),
+                ("ingredient_id", int),
+                ("ingredient_amount", int),
+            ]
+        ))
+        for (recipe_id, craft_type, result_id, amount), group in itertools.groupby(
+                rows, key=lambda row: row[:4],
+            ):
+            if result_id in self.recipes:
+                continue
+            self.recipes[result_id] = Recipe(
+                recipe_id,
+                craft_type,
+                amount,
+                tuple((row[4], row[5]) for row in group),
+            )
+        # item id -> length of the longest chain of crafts below it
+        self._heights: Dict[int, int] = {}
+        # item id -> every craftable item its tree reaches, itself included
+        self._reaches: Dict[int, frozenset] = {}
+
+    @classmethod
+    def load(cls) -> "RecipeGraph":
+        return cls(read_table("recipes"))
+
+    def craftable(self) -> pd.DataFrame:
+        """
+        item_id and item_name of everything with a recipe, by name.
+        """
+        return pd.DataFrame(
+            [(item_id, self.names[item_id]) for item_id in self.recipes],
+            columns=["item_id", "item_name"],
+        ).sort_values("item_name", ignore_index=True)
+
+    def _resolve(self, item_id: int) -> None:
+        # depth first without recursion, since trees can run deep
+        stack = [(item_id, False)]
+        in_progress = set()
+        while stack:
+            current, children_done = stack.pop()
+            if current in self._heights:
+                continue
+            recipe = self.recipes.get(current)
+            if recipe is None:
+                self._heights[current] = 0
+                self._reaches[current] = frozenset()
+                continue
+            if not children_done:
+                in_progress.add(current)
+                stack.append((current, True))
+                for ingredient_id, _ in recipe.ingredients:
+                    if ingredient_id in in_progress:
+                        # an item that goes into its own tree can't be
+                        # planned, so it's bought instead
+                        del self.recipes[current]
+                        break
+                    if ingredient_id not in self._heights:
+                        stack.append((ingredient_id, False))
+                continue
+            in_progress.discard(current)
+            if current not in self.recipes:
+                stack.append((current, False))
+                continue
+            ingredient_ids = [
+                ingredient_id for ingredient_id, _ in recipe.ingredients
+            ]
+            self._heights[current] = 1 + max(
+                self._heights[ingredient_id] for ingredient_id in ingredient_ids
+            )
+            self._reaches[current] = frozenset([current]).union(
+                *(self._reaches[ingredient_id] for ingredient_id in ingredient_ids)
+            )
+
+    def height(self, item_id: int) -> int:
+        if item_id not in self._heights:
+            self._resolve(item_id)
+        return self._heights[item_id]
+
+    def reaches(self, item_id: int) -> frozenset:
+        if item_id not in self._reaches:
+            self._resolve(item_id)
+        return self._reaches[item_id]
+
+    def plan_order(self, order: Dict[int, int]) -> List[int]:
+        """
+        Every craftable item that order reaches, each listed after all of the
+        items whose recipes use it.
+        """
+        reached = set()
+        for item_id in order:
+            reached.update(self.reaches(item_id))
+        return sorted(reached, key=lambda item_id: -self.height(item_id))
+
+    def components(self, order: Dict[int, int]) -> List[int]:
+        """
+        Every item that order could take, crafted or not, itself included.
+        """
+        item_ids = set(map(int, order))
+        for item_id in self.plan_order(order):
+            item_ids.update(
+                ingredient_id
+                for ingredient_id, _ in self.recipes[item_id].ingredients
+            )
+        return sorted(item_ids)
+
+    def expand(
+            self, order: Dict[int, int], buy: Iterable[int] = (),
+        ) -> Expansion:
+        """
+        The raw materials that crafting order ({item_id: quantity}) takes,
+        and every craft along the way. Items in buy are bought rather than
+        crafted, so they end up with the raw materials.
+        """
+        needed = {int(item_id): int(quantity) for item_id, quantity in order.items()}
+        buy = set(buy)
+        steps = []
+        for item_id in self.plan_order(needed):
+            quantity = needed.get(item_id, 0)
+            if quantity == 0 or item_id in buy:
+                continue
+            del needed[item_id]
+            recipe = self.recipes[item_id]
+            crafts = math.ceil(quantity / recipe.amount)
+            for ingredient_id, amount in recipe.ingredients:
+                needed[ingredient_id] = needed.get(ingredient_id, 0) + crafts * amount
+            steps.append((
+                item_id,
+                self.names.get(item_id),
+                recipe.craft_type,
+                quantity,
+                crafts,
+                crafts * recipe.amount,
+                crafts * recipe.amount - quantity,
+            ))
+        # anything left over has no recipe of its own
+        raw_materials = pd.DataFrame(
+            [
+                (item_id, self.names.get(item_id), quantity)
+                for item_id, quantity in needed.items() if quantity > 0
+            ],
+            columns=["item_id", "item_name", "quantity"],
+        ).sort_values("item_name", ignore_index=True)
+        crafted = pd.DataFrame(steps, columns=[
+            "item_id",
+            "item_name",
+            "craft_type",
+            "needed",
+            "crafts",
+            "crafted",
+            "leftover",
+        ])
+        return Expansion(raw_materials, crafted)
+
+    def optimize(
+            self, order: Dict[int, int], unit_prices: Dict[int, float],
+        ) -> Plan:
+        """
+        The cheapest way to fill order, buying each item at unit_prices
+        (e.g. for every item in components(order)) or crafting it out of
+        its cheapest ingredients, whichever costs less per unit. Items
+        without a price can't be bought, and neither can anything made
+        from them.
+        """
+        def buy_price(item_id: int) -> float:
+            price = unit_prices.get(item_id)
+            return math.inf if price is None or np.isnan(price) else float(price)
+
+        order = {int(item_id): int(quantity) for item_id, quantity in order.items()}
+        # item id -> cheapest unit cost found so far
+        best = {}
+        buy = set()
+        decisions = []
+        for item_id in reversed(self.plan_order(order)):
+            recipe = self.recipes[item_id]
+            craft_cost = sum(
+                amount * best.get(ingredient_id, buy_price(ingredient_id))
+                for ingredient_id, amount in recipe.ingredients
+            ) / recipe.amount
+            price = buy_price(item_id)
+            # ties go to buying, which saves the crafting time
+            if price <= craft_cost and not math.isinf(price):
+                buy.add(item_id)
+                best[item_id] = price
+            else:
+                best[item_id] = craft_cost
+            decisions.append((
+                item_id,
+                self.names.get(item_id),
+                price,
+                craft_cost,
+                "buy" if item_id in buy else "craft",
+            ))
+
+        expansion = self.expand(order, buy)
+        purchases = expansion.raw_materials
+        unit_price = purchases["item_id"].map(unit_prices).astype(float)
+        purchases = purchases.assign(
+            unit_price=unit_price, cost=purchases["quantity"] * unit_price,
+        )
+        decisions = pd.DataFrame(decisions, columns=[
+            "item_id", "item_name", "buy_price", "craft_cost", "decision",
+        ]).replace([math.inf], np.nan)
+        return Plan(
+            purchases,
+            expansion.crafted,
+            decisions.iloc[::-1].reset_index(drop=True),
+            float(purchases["cost"].sum()),
+        )
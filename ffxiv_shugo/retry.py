@@ -0,0 +1,42 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Tuple, Type
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    # exponential backoff with full jitter
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+def retry_call(
+        fn: Callable[..., Any],
+        *args,
+        attempts: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        exceptions: Tuple[Type[BaseException], ...] = (Exception,),
+        **kwargs,
+    ) -> Any:
+    for attempt in range(attempts):
+        try:
+            return fn(*args, **kwargs)
+        except exceptions:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(backoff_delay(attempt, base_delay, max_delay))
+
+async def retry_async(
+        fn: Callable[..., Awaitable[Any]],
+        *args,
+        attempts: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        exceptions: Tuple[Type[BaseException], ...] = (Exception,),
+        **kwargs,
+    ) -> Any:
+    for attempt in range(attempts):
+        try:
+            return await fn(*args, **kwargs)
+        except exceptions:
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(backoff_delay(attempt, base_delay, max_delay))
@@ -0,0 +1,73 @@
+"""
+Remembers what each scraped page looked like last time, along with the rows
+that were parsed from it, so that unchanged pages can be skipped.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from ffxiv_shugo.constants import DATA_DIR
+from ffxiv_shugo.page_fetch import Page, Validators
+
+SCRAPE_MANIFEST_PATH = os.path.join(DATA_DIR, "scrape_manifest.json")
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class ScrapeManifest:
+    def __init__(self, path: str = SCRAPE_MANIFEST_PATH):
+        self.path = path
+        self.pages = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.pages = json.load(f)
+
+    def validators(self) -> Validators:
+        return {
+            url: (entry.get("etag"), entry.get("last_modified"))
+            for url, entry in self.pages.items()
+        }
+
+    def is_unchanged(self, url: str, page: Page) -> bool:
+        entry = self.pages.get(url)
+        if entry is None:
+            return False
+        if page.not_modified:
+            return True
+        return entry["sha256"] == content_hash(page.text)
+
+    def rows(self, url: str) -> Optional[List[Dict[str, Any]]]:
+        entry = self.pages.get(url)
+        return None if entry is None else entry["rows"]
+
+    def update(
+            self,
+            url: str,
+            page: Page,
+            rows: List[Dict[str, Any]],
+            sha256: Optional[str] = None,
+        ) -> None:
+        """
+        Record rows as the result of parsing page. sha256 is only needed when
+        the page's text is no longer at hand.
+        """
+        entry = self.pages.setdefault(url, {})
+        if not page.not_modified:
+            entry["sha256"] = content_hash(page.text)
+        elif sha256 is not None:
+            entry["sha256"] = sha256
+        entry["etag"] = page.etag
+        entry["last_modified"] = page.last_modified
+        entry["rows"] = rows
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        # write then rename so an interrupted run can't corrupt the manifest
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.pages, f)
+        os.replace(tmp_path, self.path)
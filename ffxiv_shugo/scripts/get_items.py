@@ -0,0 +1,23 @@
+import argparse
+from typing import List, Optional
+
+from ffxiv_shugo.constants import DATAMINING_CSV_URL
+from ffxiv_shugo.data_store import write_table
+from ffxiv_shugo.item_catalog import CATALOG_TABLE, build_items, read_sheet
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Build the local item catalog from the game's Item sheet.",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=DATAMINING_CSV_URL,
+        help="Where to read Item.csv from.",
+    )
+    args = parser.parse_args(args)
+
+    items = build_items(read_sheet("Item", args.base_url))
+    print(f"{len(items)} items -> {write_table(CATALOG_TABLE, items)}")
+
+if __name__ == "__main__":
+    main()
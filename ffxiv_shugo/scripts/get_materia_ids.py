@@ -1,42 +1,144 @@
+import argparse
 import asyncio
 import os
 import pandas as pd
 import pyxivapi
+from typing import Any, Dict, List, Optional
 
+from ffxiv_shugo.checkpoint import Checkpoint
 from ffxiv_shugo.constants import (
     DATA_DIR,
     MATERIA_GRADES,
     MATERIA_MAP,
-    XIVAPI_KEY,
+    XIVAPI_MAX_CONCURRENCY,
 )
+from ffxiv_shugo.data_store import write_table
+from ffxiv_shugo.http_client import get_http_client, make_xivapi_client
+from ffxiv_shugo.item_catalog import get_catalog
 
-data = []
-client = pyxivapi.XIVAPIClient(api_key=XIVAPI_KEY)
-for grade_idx, grade_name in enumerate(MATERIA_GRADES):
-    for materia_type, materia_list in MATERIA_MAP.items():
-        for name, stat_boosted in materia_list:
-            full_name = f"{name} Materia {grade_name}"
-            row = {
-                "grade_idx": grade_idx,
-                "grade_name": grade_name,
-                "materia_type": materia_type,
-                "materia_name": full_name,
-                "stat_boosted": stat_boosted,
-            }
-
-            async def get_xivapi_data():
-                response = await client.index_search(
+UNRESOLVED_REPORT_PATH = os.path.join(DATA_DIR, "unresolved_materia.csv")
+
+def build_rows() -> List[Dict[str, Any]]:
+    data = []
+    for grade_idx, grade_name in enumerate(MATERIA_GRADES):
+        for materia_type, materia_list in MATERIA_MAP.items():
+            for name, stat_boosted in materia_list:
+                data.append({
+                    "grade_idx": grade_idx,
+                    "grade_name": grade_name,
+                    "materia_type": materia_type,
+                    "materia_name": f"{name} Materia {grade_name}",
+                    "stat_boosted": stat_boosted,
+                })
+    return data
+
+def resolve_ids_from_catalog(data: List[Dict[str, Any]]) -> None:
+    """
+    Fill in the id of every row whose materia is in the local item catalog,
+    leaving the rest with an id of None.
+    """
+    catalog = get_catalog()
+    for row in data:
+        record = None if catalog is None else catalog.find(row["materia_name"])
+        row["id"] = None if record is None else record["id"]
+
+async def resolve_ids(
+    data: List[Dict[str, Any]],
+    client: pyxivapi.XIVAPIClient,
+    checkpoint: Checkpoint,
+) -> Dict[str, str]:
+    """
+    Fill in the id of every row, skipping names that are already in the
+    checkpoint. Returns {materia_name: reason} for names that didn't resolve.
+    """
+    ids = {
+        record["materia_name"]: record["id"] for record in checkpoint.load()
+    }
+    failures = {}
+    semaphore = asyncio.Semaphore(XIVAPI_MAX_CONCURRENCY)
+
+    async def get_xivapi_data(materia_name: str) -> None:
+        try:
+            async with semaphore:
+                response = await get_http_client().xivapi_call(
+                    client.index_search,
                     indexes=["item"],
-                    name=row["materia_name"],
+                    name=materia_name,
                     string_algo="match",
                     columns=["ID"],
                 )
-                row["id"] = response["Results"][0]["ID"]
-            
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(get_xivapi_data())
+        except Exception as e:
+            failures[materia_name] = repr(e)
+            return
+        if not response["Results"]:
+            failures[materia_name] = "no search results"
+            return
+        ids[materia_name] = response["Results"][0]["ID"]
+        checkpoint.append({"materia_name": materia_name, "id": ids[materia_name]})
+
+    await asyncio.gather(*(
+        get_xivapi_data(row["materia_name"]) for row in data
+        if row["materia_name"] not in ids
+    ))
+    for row in data:
+        row["id"] = ids.get(row["materia_name"])
+    return failures
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Look up the item ids of every materia.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Only look up the materia that a previous run didn't get to.",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only use the local item catalog, never searching XIVAPI.",
+    )
+    args = parser.parse_args(args)
+
+    checkpoint = Checkpoint.for_run("materia", "ids")
+    if not args.resume:
+        checkpoint.clear()
+
+    data = build_rows()
+    resolve_ids_from_catalog(data)
+    # only what the catalog doesn't have is searched for on XIVAPI
+    missing = [row for row in data if row["id"] is None]
+    failures = {}
+    if missing and args.offline:
+        failures = {
+            row["materia_name"]: "not in the item catalog" for row in missing
+        }
+    elif missing:
+        client = make_xivapi_client()
+        async def resolve():
+            try:
+                return await resolve_ids(missing, client, checkpoint)
+            finally:
+                await client.session.close()
+
+        loop = asyncio.get_event_loop()
+        failures = loop.run_until_complete(resolve())
+
+    if failures:
+        pd.DataFrame([
+            {"materia_name": name, "reason": reason}
+            for name, reason in failures.items()
+        ]).to_csv(UNRESOLVED_REPORT_PATH, index=False)
+        print(
+            f"{len(failures)} materia couldn't be looked up, see "
+            f"{UNRESOLVED_REPORT_PATH}; rerun with --resume to retry them."
+        )
+        return
 
-            data.append(row)
+    if os.path.exists(UNRESOLVED_REPORT_PATH):
+        os.remove(UNRESOLVED_REPORT_PATH)
+    write_table("materia", pd.DataFrame(data))
+    checkpoint.clear()
 
-df = pd.DataFrame(data)
-df.to_csv(os.path.join(DATA_DIR, "materia.csv"))
+if __name__ == "__main__":
+    main()
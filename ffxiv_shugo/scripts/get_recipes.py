@@ -0,0 +1,67 @@
+import argparse
+import pandas as pd
+from typing import List, Optional
+
+from ffxiv_shugo.constants import CRAFT_TYPES, DATAMINING_CSV_URL
+from ffxiv_shugo.data_store import write_table
+from ffxiv_shugo.item_catalog import read_sheet
+
+def build_recipes(recipe: pd.DataFrame, item: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per ingredient of each recipe, out of the Recipe and Item
+    sheets.
+    """
+    slots = sorted(
+        int(col[len("Item{Ingredient}["):-1]) for col in recipe.columns
+        if col.startswith("Item{Ingredient}[")
+    )
+    recipe = recipe.rename(columns={
+        "#": "recipe_id",
+        "Item{Result}": "result_id",
+        "Amount{Result}": "result_amount",
+    })
+    recipe = recipe.loc[
+        (recipe["result_id"] > 0) &
+        recipe["CraftType"].between(0, len(CRAFT_TYPES) - 1)
+    ]
+    recipe = recipe.assign(
+        craft_type=recipe["CraftType"].map(dict(enumerate(CRAFT_TYPES))),
+    )
+    data = pd.concat([
+        recipe[["recipe_id", "craft_type", "result_id", "result_amount"]].assign(
+            ingredient_id=recipe[f"Item{{Ingredient}}[{slot}]"],
+            ingredient_amount=recipe[f"Amount{{Ingredient}}[{slot}]"],
+        )
+        for slot in slots
+    ], ignore_index=True)
+    data = data.loc[(data["ingredient_id"] > 0) & (data["ingredient_amount"] > 0)]
+
+    names = item.set_index("#")["Name"]
+    data = data.assign(
+        result_name=data["result_id"].map(names),
+        ingredient_name=data["ingredient_id"].map(names),
+    )
+    return data.sort_values(["recipe_id", "ingredient_id"])
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Build the recipes table from the game's data sheets.",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=DATAMINING_CSV_URL,
+        help="Where to read Recipe.csv and Item.csv from.",
+    )
+    args = parser.parse_args(args)
+
+    data = build_recipes(
+        read_sheet("Recipe", args.base_url),
+        read_sheet("Item", args.base_url),
+    )
+    print(
+        f"{data['recipe_id'].nunique()} recipes, "
+        f"{len(data)} ingredients -> {write_table('recipes', data)}"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Keep the price cache warm for every item the apps can show, so that they can
+run with PRICES_FROM_STORE_ONLY and never wait on universalis.
+
+Items are refreshed roughly every REFRESHER_SALES_PER_REFRESH expected sales,
+so fast movers are refreshed often and slow ones rarely, while the requests
+made stay inside REFRESHER_REQUESTS_PER_SECOND.
+"""
+
+import argparse
+import heapq
+import math
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from ffxiv_shugo.constants import (
+    DEFAULT_WORLD,
+    REFRESHER_MAX_INTERVAL,
+    REFRESHER_MIN_INTERVAL,
+    REFRESHER_REQUESTS_PER_SECOND,
+    REFRESHER_SALES_PER_REFRESH,
+    UNIVERSALIS_MAX_ITEMS_PER_REQUEST,
+)
+from ffxiv_shugo.data_store import read_table, table_exists, table_modified_at
+from ffxiv_shugo.price_cache import PriceCache, get_price_cache
+from ffxiv_shugo.price_history import rollup
+from ffxiv_shugo.utilities import (
+    PriceResult,
+    World,
+    fetch_prices_from_api,
+    world_id,
+)
+
+CATALOG_TABLES = ["items_by_currency", "materia"]
+
+def load_item_ids() -> List[int]:
+    item_ids = []
+    for name in CATALOG_TABLES:
+        if not table_exists(name):
+            continue
+        filters = None
+        if name == "items_by_currency":
+            filters = [("is_untradable", "==", False)]
+        item_ids.extend(read_table(name, filters=filters, columns=["id"])["id"])
+    return list(dict.fromkeys(int(item_id) for item_id in item_ids))
+
+def refresh_interval(sale_velocity: Optional[float]) -> float:
+    """
+    Seconds until an item selling sale_velocity times a day is refreshed.
+    """
+    if not sale_velocity or math.isnan(sale_velocity):
+        return REFRESHER_MAX_INTERVAL
+    interval = REFRESHER_SALES_PER_REFRESH / sale_velocity * 86400
+    return min(max(interval, REFRESHER_MIN_INTERVAL), REFRESHER_MAX_INTERVAL)
+
+class RefreshScheduler:
+    """
+    A heap of items to refresh, per world. Whatever is due soonest comes out
+    first, with faster selling items first among ties.
+    """
+    def __init__(self):
+        self._heap = []
+        self._scheduled = set()
+
+    def schedule(
+            self,
+            world: World,
+            item_id: int,
+            due: float,
+            sale_velocity: Optional[float] = None,
+        ) -> None:
+        if (world, item_id) in self._scheduled:
+            return
+        self._scheduled.add((world, item_id))
+        # str(world) keeps int and str worlds comparable for the heap
+        heapq.heappush(
+            self._heap,
+            (due, -(sale_velocity or 0.0), str(world), item_id, world),
+        )
+
+    def seed(
+            self,
+            cache: PriceCache,
+            worlds: Iterable[World],
+            item_ids: List[int],
+            now: float,
+        ) -> None:
+        """
+        Schedule item_ids on every world, picking up where the cache left off
+        so that a restart doesn't refetch everything at once.
+        """
+        for world in worlds:
+            entries = cache.get_entries(world, item_ids)
+            for item_id in item_ids:
+                if item_id not in entries:
+                    self.schedule(world, item_id, now)
+                    continue
+                fetched_at, result = entries[item_id]
+                velocity = result.get("nqSaleVelocity")
+                due = fetched_at + refresh_interval(velocity)
+                self.schedule(world, item_id, due, velocity)
+
+    def seconds_until_due(self, now: float) -> Optional[float]:
+        if not self._heap:
+            return None
+        return max(self._heap[0][0] - now, 0.0)
+
+    def pop_due(
+            self, now: float, limit: int = UNIVERSALIS_MAX_ITEMS_PER_REQUEST,
+        ) -> Tuple[Optional[World], List[int]]:
+        """
+        Up to limit due item ids, all for the same world so that they can go
+        out in one request.
+        """
+        world, item_ids, other_worlds = None, [], []
+        while self._heap and self._heap[0][0] <= now and len(item_ids) < limit:
+            entry = heapq.heappop(self._heap)
+            if world is None:
+                world = entry[4]
+            if entry[4] != world:
+                other_worlds.append(entry)
+                continue
+            self._scheduled.discard((world, entry[3]))
+            item_ids.append(entry[3])
+        for entry in other_worlds:
+            heapq.heappush(self._heap, entry)
+        return world, item_ids
+
+    def reschedule(
+            self,
+            world: World,
+            item_ids: List[int],
+            results: List[PriceResult],
+            now: float,
+        ) -> None:
+        velocities = {
+            result["item_id"]: result.get("nqSaleVelocity") for result in results
+        }
+        for item_id in item_ids:
+            # items universalis doesn't know about are checked on rarely
+            velocity = velocities.get(item_id)
+            due = now + refresh_interval(velocity)
+            self.schedule(world, item_id, due, velocity)
+
+def run(
+        worlds: List[World],
+        requests_per_second: float = REFRESHER_REQUESTS_PER_SECOND,
+        once: bool = False,
+    ) -> None:
+    """
+    Refresh prices forever, or until nothing is due when once is set. The
+    catalog is reloaded whenever one of its tables is rewritten, and the
+    price history is rolled up once a day.
+    """
+    cache = get_price_cache()
+    scheduler, catalog_version = None, None
+    rollup_day = None
+    spacing = 1.0 / requests_per_second
+    last_request = 0.0
+    while True:
+        version = [table_modified_at(name) for name in CATALOG_TABLES]
+        if version != catalog_version:
+            catalog_version = version
+            item_ids = load_item_ids()
+            # rescheduling from scratch drops items that left the catalog
+            scheduler = RefreshScheduler()
+            scheduler.seed(cache, worlds, item_ids, time.time())
+            print(f"Scheduled {len(item_ids)} items on {len(worlds)} worlds.")
+        day = time.strftime("%Y-%m-%d", time.gmtime())
+        if day != rollup_day:
+            rollup_day = day
+            rollup()
+
+        wait = scheduler.seconds_until_due(time.time())
+        if once and (wait is None or wait > 0):
+            return
+        if wait is None:
+            # nothing to refresh until the catalog is written
+            wait = REFRESHER_MAX_INTERVAL
+        # don't oversleep a catalog change
+        time.sleep(min(wait, REFRESHER_MIN_INTERVAL))
+        if wait > REFRESHER_MIN_INTERVAL:
+            continue
+
+        time.sleep(max(last_request + spacing - time.time(), 0.0))
+        world, item_ids = scheduler.pop_due(time.time())
+        if not item_ids:
+            continue
+        last_request = time.time()
+        try:
+            results = fetch_prices_from_api(
+                item_ids, max_concurrency=1, world=world,
+            )
+        except Exception as e:
+            print(f"Refreshing {len(item_ids)} items on {world} failed: {e}")
+            retry_at = time.time() + REFRESHER_MIN_INTERVAL
+            for item_id in item_ids:
+                scheduler.schedule(world, item_id, retry_at)
+            continue
+        cache.put_many(world, results)
+        scheduler.reschedule(world, item_ids, results, time.time())
+
+def main(args: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Keep the price cache up to date in the background.",
+    )
+    parser.add_argument(
+        "--worlds",
+        nargs="+",
+        default=[str(DEFAULT_WORLD)],
+        help="World ids or names to keep prices for.",
+    )
+    parser.add_argument(
+        "--requests-per-second",
+        type=float,
+        default=REFRESHER_REQUESTS_PER_SECOND,
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Exit once everything that's due has been refreshed.",
+    )
+    args = parser.parse_args(args)
+    # prices are cached under world ids, which is what the apps read them by
+    try:
+        worlds = [world_id(world) for world in args.worlds]
+    except ValueError as e:
+        parser.error(str(e))
+    run(worlds, args.requests_per_second, args.once)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Rank what every currency is best spent on, without going through the app.
+
+All tradable items of every currency are priced in one deduplicated batch and
+the top items per currency are written out as csv, json and/or markdown.
+"""
+
+import argparse
+import datetime
+import os
+import pandas as pd
+from typing import List, Optional
+
+from ffxiv_shugo.constants import DATA_DIR, DEFAULT_WORLD
+from ffxiv_shugo.data_store import read_table
+from ffxiv_shugo.utilities import lookup_prices, merge_prices, world_id
+
+PRICE_COLS = [
+    "current_average_price",
+    "average_recent_price",
+    "median_price",
+    "volume_weighted_price",
+    "trimmed_mean_price",
+]
+NORMALIZED_COLS = [f"normalized_{col}" for col in PRICE_COLS]
+REPORT_COLS = [
+    "currency_type",
+    "rank",
+    "id",
+    "item_name",
+    "currency_cost",
+    "median_price",
+    "sale_velocity",
+    "sales_per_day",
+    *NORMALIZED_COLS,
+]
+FORMATS = ["csv", "json", "md"]
+REPORT_DIR = os.path.join(DATA_DIR, "reports")
+
+def build_report(
+        data: pd.DataFrame, rank_by: str, top_n: int, world=DEFAULT_WORLD,
+    ) -> pd.DataFrame:
+    """
+    Price every item in data at once and keep the top_n of each currency by
+    rank_by.
+    """
+    price_results = lookup_prices(
+        data["id"].unique().tolist(), world=world,
+    )
+    data = merge_prices(
+        data,
+        price_results,
+        normalize_by="currency_cost",
+        cols_to_normalize=PRICE_COLS,
+    )
+    data = data.dropna(subset=[rank_by]).sort_values(
+        ["currency_type", rank_by], ascending=[True, False],
+    )
+    report = data.groupby("currency_type", observed=True).head(top_n).copy()
+    report["rank"] = report.groupby("currency_type", observed=True).cumcount() + 1
+    return report[REPORT_COLS].reset_index(drop=True)
+
+def to_markdown(report: pd.DataFrame) -> str:
+    # one table per currency; DataFrame.to_markdown would need tabulate
+    sections = []
+    for currency, group in report.groupby("currency_type", observed=True):
+        cols = [col for col in group.columns if col != "currency_type"]
+        lines = [
+            f"## {currency}",
+            "",
+            "| " + " | ".join(cols) + " |",
+            "| " + " | ".join("---" for _ in cols) + " |",
+        ]
+        for row in group[cols].itertuples(index=False):
+            lines.append("| " + " | ".join(
+                f"{value:,.2f}" if isinstance(value, float) else str(value)
+                for value in row
+            ) + " |")
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections) + "\n"
+
+def write_report(
+        report: pd.DataFrame, output_dir: str, formats: List[str],
+    ) -> List[str]:
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    paths = []
+    for fmt in formats:
+        path = os.path.join(output_dir, f"roi_report_{stamp}.{fmt}")
+        if fmt == "csv":
+            report.to_csv(path, index=False)
+        elif fmt == "json":
+            report.to_json(path, orient="records", indent=2)
+        else:
+            with open(path, "w") as f:
+                f.write(to_markdown(report))
+        paths.append(path)
+    return paths
+
+def parse_args(args: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Write the best gil per currency unit for every currency.",
+    )
+    parser.add_argument(
+        "--top-n", type=int, default=10, help="Items to keep per currency.",
+    )
+    parser.add_argument(
+        "--rank-by",
+        choices=NORMALIZED_COLS,
+        default="normalized_median_price",
+    )
+    parser.add_argument(
+        "--currencies",
+        nargs="+",
+        default=None,
+        help="Only report on these currency types.",
+    )
+    parser.add_argument(
+        "--formats", nargs="+", choices=FORMATS, default=FORMATS,
+    )
+    parser.add_argument("--output-dir", default=REPORT_DIR)
+    parser.add_argument(
+        "--world",
+        default=DEFAULT_WORLD,
+        help="World id or name to price items on.",
+    )
+    args = parser.parse_args(args)
+    try:
+        args.world = world_id(args.world)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+def main(args: Optional[List[str]] = None):
+    args = parse_args(args)
+    filters = [("is_untradable", "==", False)]
+    if args.currencies:
+        filters.append(("currency_type", "in", args.currencies))
+    data = read_table("items_by_currency", filters=filters)
+
+    report = build_report(data, args.rank_by, args.top_n, args.world)
+    for path in write_report(report, args.output_dir, args.formats):
+        print(path)
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,64 @@
+import argparse
 import asyncio
 import os
 import pandas as pd
 import pyxivapi
 import re
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from typing import Any, Dict, List
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
 
 from ffxiv_shugo.constants import (
     Currency,
     DATA_DIR,
-    MATERIA_MAP,
-    XIVAPI_KEY,
+    WIKI_BASE_URL,
+    XIVAPI_MAX_CONCURRENCY,
 )
+from ffxiv_shugo.checkpoint import Checkpoint
+from ffxiv_shugo.data_store import read_table, table_exists, write_table
+from ffxiv_shugo.http_client import get_http_client, make_xivapi_client
+from ffxiv_shugo.item_catalog import ItemCatalog, expand_aliases, get_catalog
+from ffxiv_shugo.page_fetch import FetchBackend, Page, fetch_pages
+from ffxiv_shugo.scrape_manifest import ScrapeManifest, content_hash
 
 VENDOR_ID_REGEX = re.compile(r"^vendor\d+$")
+OUTPUT_TABLE = "items_by_currency"
+CHECKPOINT_RUN_NAME = "items_by_currency"
+UNRESOLVED_REPORT_PATH = os.path.join(DATA_DIR, "unresolved_items.csv")
 
-# Sometimes they get lazy with the name
-# e.g. they use "Combat materia VII" as a catch-all
-def map_item_name(item_name: str) -> List[str]:
-   if item_name.lower().startswith("combat materia"):
-      grade = item_name.split()[-1]
-      return [
-         f"{materia} Materia {grade}"
-         for materia, _ in MATERIA_MAP["combat"]
-      ]
-   else:
-      return [item_name]
+Pages = Dict[str, str]
+Rows = List[Dict[str, Any]]
+
+# every loader only ever looks at tables, so don't build a tree for the rest
+TABLES_ONLY = SoupStrainer("table")
+
+POETICS_URL = f"{WIKI_BASE_URL}/Allagan_Tomestone_of_Poetics"
+GC_SEALS_URL = f"{WIKI_BASE_URL}/Flame_Quartermaster"
+BICOLOR_GEMS_URL = f"{WIKI_BASE_URL}/Bicolor_Gemstone"
+MINOR_TOMESTONES_URL = f"{WIKI_BASE_URL}/Allagan_Tomestone_of_Causality"
+WOLF_MARKS_URL = (
+   f"{WIKI_BASE_URL}/Mark_Quartermaster/Wolf_Marks_(Other)#Miscellaneous"
+)
+CRAFTING_URLS = (
+   f"{WIKI_BASE_URL}/Scrip_Exchange_(Radz-at-Han)/Crafters%27_Scrip_(Gear)",
+   f"{WIKI_BASE_URL}/Scrip_Exchange_(Radz-at-Han)/Crafters%27_Scrip_(Materia)",
+   (
+      f"{WIKI_BASE_URL}/Scrip_Exchange_(Radz-at-Han)/"
+      "Crafters%27_Scrip_(Gear)_-_Purple_Scrip_Exchange"
+   ),
+)
+GATHERING_URLS = (
+   f"{WIKI_BASE_URL}/Scrip_Exchange_(Radz-at-Han)/Gatherers%27_Scrip_(Gear)",
+   (
+      f"{WIKI_BASE_URL}/Scrip_Exchange_(Radz-at-Han)/"
+      "Gatherers%27_Scrip_(Materials/Misc.)"
+   ),
+   f"{WIKI_BASE_URL}/Scrip_Exchange_(Radz-at-Han)/Gatherers%27_Scrip_(Materia)",
+)
 
 def extract_item_names(html_text: str) -> List[str]:
    # row.text looks like "\xa0\xa0{item_name}"
-   return map_item_name(html_text.rsplit("\xa0", 1)[-1])
+   return expand_aliases(html_text.rsplit("\xa0", 1)[-1])
 
 def extract_item_cost(html_text: str) -> int:
    # row.text looks like "\xa0{item_cost}\n"
@@ -39,7 +67,6 @@ def extract_item_cost(html_text: str) -> int:
 
 def add_rows(
    data: List[Dict[str, Any]],
-   client: pyxivapi.XIVAPIClient,
    name_col: BeautifulSoup,
    cost_col: BeautifulSoup,
    currency: Currency,
@@ -47,34 +74,113 @@ def add_rows(
    item_names = extract_item_names(name_col.text)
    item_cost = extract_item_cost(cost_col.text)
    for item_name in item_names:
-      row = {
+      data.append({
          "item_name": item_name,
          "currency_cost": item_cost,
          "currency_type": currency.value,
-      }
-      async def get_xivapi_data():
-         response = await client.index_search(
-            indexes=["item"],
-            name=row["item_name"],
-            string_algo="match",
-            columns=["ID", "IsUntradable"],
-         )
-         try:
-            results = response["Results"][0]
-         except IndexError:
-            row["id"] = None
-            row["is_untradable"] = None
-         else:
-            row["id"] = results["ID"]
-            row["is_untradable"] = results["IsUntradable"]
+      })
 
-      loop = asyncio.get_event_loop()
-      loop.run_until_complete(get_xivapi_data())
-      data.append(row)
+def resolve_from_catalog(
+   data: List[Dict[str, Any]], catalog: ItemCatalog,
+) -> None:
+   """
+   Fill in the id and is_untradable columns of every row whose item is in the
+   catalog, leaving the rest with an id of None.
+   """
+   resolved = {}
+   for item_name in dict.fromkeys(row["item_name"] for row in data):
+      record = catalog.find(item_name)
+      if record is not None:
+         resolved[item_name] = {
+            "id": record["id"], "is_untradable": record["is_untradable"],
+         }
+   for row in data:
+      row.update(resolved.get(
+         row["item_name"], {"id": None, "is_untradable": None},
+      ))
+
+async def lookup_item(
+   client: pyxivapi.XIVAPIClient,
+   semaphore: asyncio.Semaphore,
+   item_name: str,
+) -> Dict[str, Any]:
+   async with semaphore:
+      response = await get_http_client().xivapi_call(
+         client.index_search,
+         indexes=["item"],
+         name=item_name,
+         string_algo="match",
+         columns=["ID", "IsUntradable"],
+      )
+   try:
+      results = response["Results"][0]
+   except IndexError:
+      return {"id": None, "is_untradable": None}
+   return {"id": results["ID"], "is_untradable": results["IsUntradable"]}
+
+async def resolve_item_ids(
+   data: List[Dict[str, Any]],
+   client: pyxivapi.XIVAPIClient,
+   max_concurrency: int = XIVAPI_MAX_CONCURRENCY,
+   checkpoint: Optional[Checkpoint] = None,
+) -> Dict[str, str]:
+   """
+   Look up every unique item name once, concurrently, and fill in the id and
+   is_untradable columns of each row. Names already in checkpoint aren't
+   looked up again and new results are appended to it as they come in.
+
+   Returns {item_name: error} for names whose lookups kept failing; their rows
+   are left with an id of None.
+   """
+   resolved = {}
+   if checkpoint is not None:
+      for record in checkpoint.load():
+         resolved[record.pop("item_name")] = record
+   failures = {}
+   semaphore = asyncio.Semaphore(max_concurrency)
+
+   async def resolve(item_name: str) -> None:
+      try:
+         result = await lookup_item(client, semaphore, item_name)
+      except Exception as e:
+         failures[item_name] = repr(e)
+         return
+      resolved[item_name] = result
+      if checkpoint is not None:
+         checkpoint.append({"item_name": item_name, **result})
+
+   item_names = dict.fromkeys(row["item_name"] for row in data)
+   await asyncio.gather(*(
+      resolve(item_name) for item_name in item_names
+      if item_name not in resolved
+   ))
+   for row in data:
+      row.update(resolved.get(
+         row["item_name"], {"id": None, "is_untradable": None},
+      ))
+   return failures
+
+def write_unresolved_report(
+   data: List[Dict[str, Any]], failures: Dict[str, str], path: str,
+) -> int:
+   """
+   Write every row that didn't get an id to path, with the reason why.
+   Returns how many rows that was.
+   """
+   unresolved = pd.DataFrame([
+      {**row, "reason": failures.get(row["item_name"], "no search results")}
+      for row in data if row["id"] is None
+   ])
+   if unresolved.empty:
+      if os.path.exists(path):
+         os.remove(path)
+      return 0
+   unresolved.to_csv(path, index=False)
+   return len(unresolved)
 
 def handle_sortable_tables(
       data: List[Dict[str, Any]],
-      client: pyxivapi.XIVAPIClient,
+      pages: Pages,
       url: str,
       currency: Currency,
       is_craft: bool=False,
@@ -83,7 +189,7 @@ def handle_sortable_tables(
    """
    A lot of the pages on the site are pretty cookie cutter thankfully.
    """
-   soup = init_soup(url)
+   soup = init_soup(pages, url)
    if is_craft and is_gather:
       raise Exception("is_craft and is_gather are mutually exclusive args")
    if is_craft:
@@ -102,27 +208,16 @@ def handle_sortable_tables(
                currency = major
             else:
                currency = minor
-         add_rows(data, client, name_col, cost_col, currency)
-
-def init_soup(url: str) -> BeautifulSoup:
-   options = webdriver.ChromeOptions()
-   options.add_argument("--log-level=3")
-   options.add_argument("--ignore-certificate-errors")
-   options.add_argument("--incognito")
-   options.add_argument("--headless")
-
-   driver = webdriver.Chrome(options)
-   driver.get(url)
-   page_source = driver.page_source
-   driver.close()
-   soup = BeautifulSoup(page_source, "lxml")
-   return soup
+         add_rows(data, name_col, cost_col, currency)
+
+def init_soup(pages: Pages, url: str) -> BeautifulSoup:
+   # pages are downloaded up front by fetch_pages
+   return BeautifulSoup(pages[url], "lxml", parse_only=TABLES_ONLY)
 
 # TOMES OF POETICS
-def add_poetics(data: List[Dict[str, Any]], client: pyxivapi.XIVAPIClient):
-   soup = init_soup(
-      "https://ffxiv.consolegameswiki.com/wiki/Allagan_Tomestone_of_Poetics"
-   )
+def add_poetics(pages: Pages) -> Rows:
+   data = []
+   soup = init_soup(pages, POETICS_URL)
    item_tables = soup.find_all(class_="item table")
    for table in item_tables:
       # row[0] is is the name of the expansion to which the item table belongs
@@ -136,24 +231,19 @@ def add_poetics(data: List[Dict[str, Any]], client: pyxivapi.XIVAPIClient):
                pass
          else:
                cost_col = row
-               add_rows(data, client, name_col, cost_col, Currency.POETICS)
+               add_rows(data, name_col, cost_col, Currency.POETICS)
+   return data
 
 # GC Seals
-def add_gc_seals(data: List[Dict[str, Any]], client: pyxivapi.XIVAPIClient):
-   handle_sortable_tables(
-      data,
-      client,
-      "https://ffxiv.consolegameswiki.com/wiki/Flame_Quartermaster",
-      Currency.GC_SEALS,
-   )
+def add_gc_seals(pages: Pages) -> Rows:
+   data = []
+   handle_sortable_tables(data, pages, GC_SEALS_URL, Currency.GC_SEALS)
+   return data
 
 # Bicolor gems
-def add_bicolor_gems(
-   data: List[Dict[str, Any]], client: pyxivapi.XIVAPIClient,
-):
-   soup = init_soup(
-      "https://ffxiv.consolegameswiki.com/wiki/Bicolor_Gemstone"
-   )
+def add_bicolor_gems(pages: Pages) -> Rows:
+   data = []
+   soup = init_soup(pages, BICOLOR_GEMS_URL)
    for table in soup.find_all("table", "pve", "sortable"):
       if "jquery-tablesorter" in table.get("class"):
          continue
@@ -164,95 +254,334 @@ def add_bicolor_gems(
          if len(cols) < 3:
             continue
          name_col, cost_col = cols[0], cols[1]
-         add_rows(data, client, name_col, cost_col, Currency.BICOLOR_GEMSTONES)
+         add_rows(data, name_col, cost_col, Currency.BICOLOR_GEMSTONES)
+   return data
 
 # Minor tomestones
-def add_minor_tomestones(
-   data: List[Dict[str, Any]], client: pyxivapi.XIVAPIClient,
-):
-   soup = init_soup(
-      "https://ffxiv.consolegameswiki.com/wiki/Allagan_Tomestone_of_Causality"
-   )
+def add_minor_tomestones(pages: Pages) -> Rows:
+   data = []
+   soup = init_soup(pages, MINOR_TOMESTONES_URL)
    for table in soup.find_all("table", "item", "sortable"):
       for row in table.find_all("tr")[1:]:
          cols = row.find_all("td")
          name_col, cost_col = cols[0], cols[-1]
-         add_rows(data, client, name_col, cost_col, Currency.MINOR_TOMESTONE)
+         add_rows(data, name_col, cost_col, Currency.MINOR_TOMESTONE)
+   return data
 
 # Wolf marks
-def add_wolf_marks(
-   data: List[Dict[str, Any]], client: pyxivapi.XIVAPIClient,
-):
-   soup = init_soup(
-      "https://ffxiv.consolegameswiki.com/wiki/"
-      "Mark_Quartermaster/Wolf_Marks_(Other)#Miscellaneous"
-   )
+def add_wolf_marks(pages: Pages) -> Rows:
+   data = []
+   soup = init_soup(pages, WOLF_MARKS_URL)
    for table in soup.find_all("table", "npc", "sortable"):
       for row in table.find_all("tr")[1:]:
          cols = row.find_all("td")
          name_col, cost_col = cols[0], cols[-1]
-         add_rows(data, client, name_col, cost_col, Currency.WOLF_MARKS)
-   
+         add_rows(data, name_col, cost_col, Currency.WOLF_MARKS)
+   return data
+
 # Major/minor craft
-def add_crafting(
-   data: List[Dict[str, Any]], client: pyxivapi.XIVAPIClient,
-):
-   for url in (
-      (
-         "https://ffxiv.consolegameswiki.com/wiki/Scrip_Exchange_(Radz-at-Han)"
-         "/Crafters%27_Scrip_(Gear)"
-      ),
-      (
-         "https://ffxiv.consolegameswiki.com/wiki/Scrip_Exchange_(Radz-at-Han)/"
-         "Crafters%27_Scrip_(Materia)"
-      ),
-      (
-         "https://ffxiv.consolegameswiki.com/wiki/Scrip_Exchange_(Radz-at-Han)/"
-         "Crafters%27_Scrip_(Gear)_-_Purple_Scrip_Exchange"
-      ),
-   ):
-      handle_sortable_tables(data, client, url, currency=None, is_craft=True)
+def add_crafting(pages: Pages) -> Rows:
+   data = []
+   # pages holds whichever of CRAFTING_URLS need to be parsed this run
+   for url in pages:
+      handle_sortable_tables(data, pages, url, currency=None, is_craft=True)
+   return data
 
 # Major/minor gathering
-def add_gathering(data: List[Dict[str, Any]], client: pyxivapi.XIVAPIClient):
-   for url in (
-      (
-         "https://ffxiv.consolegameswiki.com/wiki/Scrip_Exchange_(Radz-at-Han)/"
-         "Gatherers%27_Scrip_(Gear)"
-      ),
-      (
-         "https://ffxiv.consolegameswiki.com/wiki/Scrip_Exchange_(Radz-at-Han)/"
-         "Gatherers%27_Scrip_(Materials/Misc.)"
-      ),
-      (
-         "https://ffxiv.consolegameswiki.com/wiki/Scrip_Exchange_(Radz-at-Han)/"
-         "Gatherers%27_Scrip_(Materia)"
-      )
-   ):
-      handle_sortable_tables(data, client, url, currency=None, is_gather=True)
-
-def main():
-   client = pyxivapi.XIVAPIClient(api_key=XIVAPI_KEY)
+def add_gathering(pages: Pages) -> Rows:
    data = []
-   data_loaders = [
+   # pages holds whichever of GATHERING_URLS need to be parsed this run
+   for url in pages:
+      handle_sortable_tables(data, pages, url, currency=None, is_gather=True)
+   return data
+
+# loader name -> (loader, the pages it reads, how to fetch them, the
+# currencies it produces)
+# The bicolor gem page is parsed after tablesorter has run, so it still needs
+# a browser; everything else is rendered server side.
+DATA_LOADERS = {
+   "bicolor_gems": (
       add_bicolor_gems,
+      (BICOLOR_GEMS_URL,),
+      FetchBackend.WEBDRIVER,
+      (Currency.BICOLOR_GEMSTONES,),
+   ),
+   "crafting": (
       add_crafting,
+      CRAFTING_URLS,
+      FetchBackend.HTTP,
+      (Currency.MAJOR_CRAFT, Currency.MINOR_CRAFT),
+   ),
+   "gathering": (
       add_gathering,
+      GATHERING_URLS,
+      FetchBackend.HTTP,
+      (Currency.MAJOR_GATHER, Currency.MINOR_GATHER),
+   ),
+   "gc_seals": (
       add_gc_seals,
+      (GC_SEALS_URL,),
+      FetchBackend.HTTP,
+      (Currency.GC_SEALS,),
+   ),
+   "minor_tomestones": (
       add_minor_tomestones,
+      (MINOR_TOMESTONES_URL,),
+      FetchBackend.HTTP,
+      (Currency.MINOR_TOMESTONE,),
+   ),
+   "poetics": (
       add_poetics,
+      (POETICS_URL,),
+      FetchBackend.HTTP,
+      (Currency.POETICS,),
+   ),
+   "wolf_marks": (
       add_wolf_marks,
-   ]
-   for loader in data_loaders:
-      loader(data, client)
+      (WOLF_MARKS_URL,),
+      FetchBackend.HTTP,
+      (Currency.WOLF_MARKS,),
+   ),
+}
+
+def run_loaders(
+   urls_by_loader: Dict[str, List[str]],
+   pages: Pages,
+   max_workers: Optional[int] = None,
+) -> Dict[str, Rows]:
+   """
+   Parse every page in its own process with the loader that reads it, and
+   return the rows found on each url. Only the page being parsed is sent over
+   to its worker.
+   """
+   with ProcessPoolExecutor(max_workers=max_workers) as executor:
+      futures = {
+         url: executor.submit(DATA_LOADERS[name][0], {url: pages[url]})
+         for name, urls in urls_by_loader.items()
+         for url in urls
+      }
+      return {url: future.result() for url, future in futures.items()}
+
+def loader_currencies(loader_names: Iterable[str]) -> List[str]:
+   return sorted({
+      currency.value
+      for name in loader_names
+      for currency in DATA_LOADERS[name][3]
+   })
+
+def merge_with_existing(
+   df: pd.DataFrame,
+   loader_names: List[str],
+   incomplete_loaders: Iterable[str] = (),
+) -> pd.DataFrame:
+   """
+   When only some loaders were run, keep the rows of every other currency from
+   the last full scrape. The currencies of incomplete_loaders, which have
+   pages that couldn't be scraped and have no rows of their own to fall back
+   on, keep the existing rows that this scrape didn't find again.
+   """
+   if not table_exists(OUTPUT_TABLE):
+      return df
+   existing = read_table(OUTPUT_TABLE)
+   currency_type = existing["currency_type"].astype(str)
+   keep = ~currency_type.isin(loader_currencies(loader_names))
+   incomplete = loader_currencies(incomplete_loaders)
+   if incomplete:
+      found = set() if df.empty else set(
+         zip(df["item_name"], df["currency_type"].astype(str))
+      )
+      not_found = pd.Series(
+         [key not in found for key in zip(existing["item_name"], currency_type)],
+         index=existing.index,
+         dtype=bool,
+      )
+      keep |= currency_type.isin(incomplete) & not_found
+   return pd.concat([existing.loc[keep], df], ignore_index=True)
+
+def parse_args(args: Optional[List[str]] = None) -> argparse.Namespace:
+   parser = argparse.ArgumentParser(
+      description="Scrape the wiki for items that can be bought with currencies.",
+   )
+   parser.add_argument(
+      "--loaders",
+      nargs="+",
+      choices=list(DATA_LOADERS),
+      default=list(DATA_LOADERS),
+      help="Only refresh these loaders; rows for the others are kept as is.",
+   )
+   parser.add_argument(
+      "--resume",
+      action="store_true",
+      help=(
+         "Pick up from the checkpoints of a failed run, only redoing the pages "
+         "and lookups that didn't finish."
+      ),
+   )
+   parser.add_argument(
+      "--force",
+      action="store_true",
+      help="Re-parse every page even if it hasn't changed since the last run.",
+   )
+   parser.add_argument(
+      "--workers",
+      type=int,
+      default=None,
+      help="Number of processes used to parse pages.",
+   )
+   parser.add_argument(
+      "--offline",
+      action="store_true",
+      help=(
+         "Only match names against the local item catalog, never searching "
+         "XIVAPI for the ones it doesn't have."
+      ),
+   )
+   return parser.parse_args(args)
 
-   loop = asyncio.get_event_loop()
-   loop.run_until_complete(client.session.close())
+def main(args: Optional[List[str]] = None):
+   args = parse_args(args)
+   loader_names = args.loaders
+   manifest = ScrapeManifest()
 
-   df = pd.DataFrame(data)
-   if not os.path.exists(DATA_DIR):
-      os.mkdir(DATA_DIR)
-   df.to_csv(os.path.join(DATA_DIR, "items_by_currency.csv"))
+   # every page a loader parses is checkpointed as soon as it's parsed, and
+   # every name lookup as soon as it comes back
+   checkpoints = {
+      name: Checkpoint.for_run(CHECKPOINT_RUN_NAME, name)
+      for name in loader_names
+   }
+   names_checkpoint = Checkpoint.for_run(CHECKPOINT_RUN_NAME, "item_names")
+   if not args.resume:
+      for checkpoint in [*checkpoints.values(), names_checkpoint]:
+         checkpoint.clear()
+   parsed_pages = {
+      record["url"]: record
+      for checkpoint in checkpoints.values()
+      for record in checkpoint.load()
+   }
+
+   urls_by_loader = {name: list(DATA_LOADERS[name][1]) for name in loader_names}
+   urls_by_backend = {}
+   for name in loader_names:
+      _, urls, backend, _ = DATA_LOADERS[name]
+      urls_by_backend.setdefault(backend, []).extend(
+         url for url in urls if url not in parsed_pages
+      )
+   fetch_errors = {}
+   fetched = fetch_pages(
+      urls_by_backend,
+      None if args.force else manifest.validators(),
+      fetch_errors,
+   )
+   for url, e in fetch_errors.items():
+      print(f"Failed to fetch {url}: {e!r}")
+
+   changed_urls_by_loader = {}
+   for name, urls in urls_by_loader.items():
+      changed = [
+         url for url in urls
+         if url in fetched
+         and (args.force or not manifest.is_unchanged(url, fetched[url]))
+      ]
+      if changed:
+         changed_urls_by_loader[name] = changed
+   if (
+      not changed_urls_by_loader
+      and not parsed_pages
+      and not fetch_errors
+      and table_exists(OUTPUT_TABLE)
+   ):
+      print("No pages have changed since the last scrape.")
+      return
+
+   rows_by_url = run_loaders(
+      changed_urls_by_loader,
+      {url: page.text for url, page in fetched.items() if page.text is not None},
+      args.workers,
+   )
+   for name, urls in changed_urls_by_loader.items():
+      for url in urls:
+         page = fetched[url]
+         checkpoints[name].append({
+            "url": url,
+            "sha256": content_hash(page.text),
+            "etag": page.etag,
+            "last_modified": page.last_modified,
+            "rows": rows_by_url[url],
+         })
+   for url, record in parsed_pages.items():
+      rows_by_url[url] = record["rows"]
+      fetched[url] = Page(None, record["etag"], record["last_modified"])
+   new_rows = [row for rows in rows_by_url.values() for row in rows]
+
+   # names are matched against the local catalog, and only the ones it
+   # doesn't know about are searched for on XIVAPI
+   catalog = get_catalog()
+   if catalog is not None:
+      resolve_from_catalog(new_rows, catalog)
+   else:
+      for row in new_rows:
+         row.update({"id": None, "is_untradable": None})
+   missing = [row for row in new_rows if row["id"] is None]
+   failures = {}
+   if missing and not args.offline:
+      client = make_xivapi_client()
+      async def resolve():
+         try:
+            return await resolve_item_ids(
+               missing, client, checkpoint=names_checkpoint,
+            )
+         finally:
+            await client.session.close()
+
+      loop = asyncio.get_event_loop()
+      failures = loop.run_until_complete(resolve())
+
+   for url, page in fetched.items():
+      if url not in rows_by_url:
+         # unchanged, but the server may have handed out new validators
+         manifest.update(url, page, manifest.rows(url))
+      elif not any(row["item_name"] in failures for row in rows_by_url[url]):
+         sha256 = parsed_pages[url]["sha256"] if url in parsed_pages else None
+         manifest.update(url, page, rows_by_url[url], sha256)
+   manifest.save()
+
+   # pages that couldn't be fetched fall back on their rows from the last
+   # successful scrape, if there was one. Partly resolved pages keep the rows
+   # that did resolve, and stay checkpointed so --resume retries the rest.
+   # Pages with neither keep their currencies' rows in the existing table
+   data = []
+   incomplete_loaders = []
+   for name in loader_names:
+      for url in urls_by_loader[name]:
+         if url in rows_by_url:
+            data.extend(rows_by_url[url])
+         elif manifest.rows(url) is not None:
+            data.extend(manifest.rows(url))
+         else:
+            print(f"No rows to fall back on for {url}, keeping the existing ones.")
+            incomplete_loaders.append(name)
+   n_unresolved = write_unresolved_report(
+      data, failures, UNRESOLVED_REPORT_PATH,
+   )
+   if n_unresolved:
+      print(
+         f"{n_unresolved} rows couldn't be matched to an item, "
+         f"see {UNRESOLVED_REPORT_PATH}"
+      )
+
+   df = pd.DataFrame([row for row in data if row["id"] is not None])
+   if set(loader_names) != set(DATA_LOADERS) or incomplete_loaders:
+      df = merge_with_existing(df, loader_names, incomplete_loaders)
+   if df.empty and table_exists(OUTPUT_TABLE) and len(read_table(OUTPUT_TABLE)):
+      print(f"No rows were scraped, so {OUTPUT_TABLE} is left as it was.")
+   else:
+      write_table(OUTPUT_TABLE, df)
+
+   if fetch_errors or failures:
+      print("Some pages or lookups failed; rerun with --resume to retry them.")
+   else:
+      for checkpoint in [*checkpoints.values(), names_checkpoint]:
+         checkpoint.clear()
 
 if __name__ == "__main__":
    main()
\ No newline at end of file
@@ -1,41 +1,567 @@
-import numpy as np
+import aiohttp
+import asyncio
+import functools
+import numbers
+import pandas as pd
 import pyxivapi
-import requests
-from typing import Dict, List, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    # optional, lets large responses be parsed as they stream in
+    import ijson
+except ImportError:
+    ijson = None
 
 from ffxiv_shugo.constants import (
-    EXODUS_WORLD_ID,
+    DATACENTER_WORLDS,
+    DEFAULT_WORLD,
+    PRICE_HISTORY_ENABLED,
+    PRICE_SERVICE_URL,
+    PRICES_FROM_STORE_ONLY,
+    WORLD_NAMES,
+    UNIVERSALIS_API_URL,
+    UNIVERSALIS_HISTORY_ENTRIES,
+    UNIVERSALIS_LISTINGS,
+    UNIVERSALIS_MAX_CONCURRENCY,
+    UNIVERSALIS_MAX_ITEMS_PER_REQUEST,
+    UNIVERSALIS_TIMEOUT,
+)
+from ffxiv_shugo.http_client import get_http_client
+from ffxiv_shugo.item_catalog import get_catalog
+from ffxiv_shugo.market_depth import listing_ladder
+from ffxiv_shugo.market_stats import (
+    HISTORY_FIELDS,
+    LISTING_FIELDS,
+    STAT_COLUMNS,
+    market_stats,
 )
+from ffxiv_shugo.price_cache import PriceCache, get_price_cache
+from ffxiv_shugo.price_history import append_snapshot
 
-def lookup_prices(item_ids: List[int]) -> List[Dict[str, Union[float, int]]]:
-    # https://docs.universalis.app/#market-board-current-data
+PriceResult = Dict[str, Union[float, int]]
+# a world id, or anything else universalis accepts in its place
+World = Union[int, str]
+# fetches {world: item_ids} -> {world: results}, like fetch_world_prices_from_api
+WorldFetcher = Callable[
+    [Dict[World, List[int]], int], Dict[World, List[PriceResult]]
+]
+
+# lookup_prices keys -> the column names used by the apps
+PRICE_COL_MAP = {
+    "currentAveragePriceNQ": "current_average_price",
+    "nqSaleVelocity": "sale_velocity",
+    "minPriceNQ": "min_price",
+    "averageRecentHistoryStackSize": "average_recent_stack_size",
+    "averageRecentPrice": "average_recent_price",
+    # these are already named the way the apps use them
+    **{col: col for col in STAT_COLUMNS},
+    "listing_prices": "listing_prices",
+    "listing_quantities": "listing_quantities",
+}
+
+# the only parts of each universalis item that we read
+ITEM_FIELDS = [
+    "itemID",
+    "currentAveragePriceNQ",
+    "nqSaleVelocity",
+    "minPriceNQ",
+    *[f"recentHistory.{field}" for field in HISTORY_FIELDS],
+    *[f"listings.{field}" for field in LISTING_FIELDS],
+]
+
+def chunk_item_ids(
+        item_ids: Iterable[int],
+        chunk_size: int = UNIVERSALIS_MAX_ITEMS_PER_REQUEST,
+    ) -> List[List[int]]:
+    # drop duplicates but keep the caller's order
+    unique_ids = list(dict.fromkeys(int(item_id) for item_id in item_ids))
+    return [
+        unique_ids[idx:idx + chunk_size]
+        for idx in range(0, len(unique_ids), chunk_size)
+    ]
+
+def _prices_url(world: World, item_ids: List[int]) -> str:
     # GET - /api/v2/{worldDcRegion}/{itemIds}
-    item_ids = ",".join(map(str, item_ids))
-    response = requests.get(
-        f"https://universalis.app/api/v2/{EXODUS_WORLD_ID}/{item_ids}"
-    )
-    data = response.json()
+    return f"{UNIVERSALIS_API_URL}/{world}/{','.join(map(str, item_ids))}"
 
-    results = []
+def _prices_params(item_ids: List[int]) -> Dict[str, Union[int, str]]:
+    # multi-item responses nest each item under "items"
+    prefix = "" if len(item_ids) == 1 else "items."
+    params = {
+        "entries": UNIVERSALIS_HISTORY_ENTRIES,
+        "fields": ",".join(f"{prefix}{field}" for field in ITEM_FIELDS),
+    }
+    if UNIVERSALIS_LISTINGS is not None:
+        params["listings"] = UNIVERSALIS_LISTINGS
+    return params
+
+def expand_worlds(worlds: Iterable[Union[World, str]]) -> List[World]:
+    """
+    Replace any datacenter names in worlds with the worlds they contain.
+    """
+    expanded = []
+    for world in worlds:
+        if world in DATACENTER_WORLDS:
+            expanded.extend(DATACENTER_WORLDS[world])
+        else:
+            expanded.append(world)
+    return list(dict.fromkeys(expanded))
+
+def world_id(world: World) -> int:
+    """
+    The id of world, given as an id or as one of WORLD_NAMES. Datacenters and
+    unknown names raise a ValueError.
+    """
+    # numpy ints from pandas columns are Integral but not int
+    if isinstance(world, numbers.Integral):
+        return int(world)
+    world = str(world).strip()
+    if world.isdigit():
+        return int(world)
+    if world in DATACENTER_WORLDS:
+        raise ValueError(f"{world} is a datacenter, not a world.")
+    ids_by_name = {name.casefold(): id_ for id_, name in WORLD_NAMES.items()}
+    if world.casefold() not in ids_by_name:
+        raise ValueError(
+            f"Unknown world {world!r}, expected an id or one of "
+            f"{', '.join(WORLD_NAMES.values())}."
+        )
+    return ids_by_name[world.casefold()]
+
+def _check_single_world(world: World) -> None:
+    # results for a datacenter come back keyed by its member worlds
+    if world in DATACENTER_WORLDS:
+        raise ValueError(
+            f"{world} is a datacenter; use lookup_world_prices or "
+            "lookup_prices_by_world to price each of its worlds."
+        )
+
+def _items_from_response(
+        item_ids: List[int], data: Dict[str, Any],
+    ) -> Dict[int, Dict[str, Any]]:
+    # a request for a single item returns that item rather than {"items": ...}
+    if len(item_ids) == 1 and "items" not in data:
+        return {item_ids[0]: data}
+    return {int(item_id): item_data for item_id, item_data in data["items"].items()}
+
+def _parse_items(items: Dict[int, Dict[str, Any]]) -> List[PriceResult]:
+    # the history based statistics for every item are computed in one go
+    stats = market_stats(items).astype(float).to_dict("index")
     pertinent_keys = ["currentAveragePriceNQ", "nqSaleVelocity", "minPriceNQ"]
-    for item_id, item_data in data["items"].items():
-        this_result = {key: item_data[key] for key in pertinent_keys}
-        this_result["item_id"] = int(item_id)
+    results = []
+    for item_id, item_data in items.items():
+        result = {key: item_data[key] for key in pertinent_keys}
+        result["item_id"] = item_id
+        result.update(stats[item_id])
+        # kept whole for market_depth's selling estimates
+        result["listing_prices"], result["listing_quantities"] = listing_ladder(
+            item_data.get("listings") or []
+        )
+        results.append(result)
+    return results
+
+def _merge_chunks(
+        chunks: List[List[int]], responses: List[Dict[int, Dict[str, Any]]],
+    ) -> List[PriceResult]:
+    items = {}
+    for chunk, chunk_items in zip(chunks, responses):
+        for item_id in chunk:
+            if item_id in chunk_items:
+                items[item_id] = chunk_items[item_id]
+    return _parse_items(items)
 
-        recent_history = item_data["recentHistory"]
-        quantities = np.array([sale["quantity"] for sale in recent_history])
-        prices = np.array([sale["pricePerUnit"] for sale in recent_history])
-        this_result["averageRecentHistoryStackSize"] = np.mean(quantities)
-        this_result["averageRecentPrice"] = np.mean(prices)
+def _fetch_chunk(world: World, item_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    with get_http_client().stream(
+        "GET",
+        _prices_url(world, item_ids),
+        params=_prices_params(item_ids),
+        timeout=UNIVERSALIS_TIMEOUT,
+    ) as response:
+        response.raise_for_status()
+        if ijson is None or len(item_ids) == 1:
+            return _items_from_response(item_ids, response.json())
+        # parse one item at a time straight off the socket
+        response.raw.decode_content = True
+        return {
+            int(item_id): item_data
+            for item_id, item_data
+            in ijson.kvitems(response.raw, "items", use_float=True)
+        }
 
-        results.append(this_result)
+def _record_history(world: World, results: List[PriceResult]) -> None:
+    if PRICE_HISTORY_ENABLED and results:
+        append_snapshot(
+            world,
+            pd.DataFrame.from_records(results).rename(columns=PRICE_COL_MAP),
+        )
+
+def fetch_world_prices_from_api(
+        item_ids_by_world: Dict[World, List[int]],
+        max_concurrency: int = UNIVERSALIS_MAX_CONCURRENCY,
+    ) -> Dict[World, List[PriceResult]]:
+    """
+    Fetch prices for several worlds at once. Every (world, chunk) request
+    shares the same pool, so max_concurrency bounds the total.
+    """
+    jobs = [
+        (world, chunk)
+        for world, item_ids in item_ids_by_world.items()
+        for chunk in chunk_item_ids(item_ids)
+    ]
+    if len(jobs) == 1:
+        responses = [_fetch_chunk(*jobs[0])]
+    elif jobs:
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            responses = list(executor.map(lambda job: _fetch_chunk(*job), jobs))
+    else:
+        responses = []
+    chunks_by_world = {world: ([], []) for world in item_ids_by_world}
+    for (world, chunk), items in zip(jobs, responses):
+        chunks_by_world[world][0].append(chunk)
+        chunks_by_world[world][1].append(items)
+    results = {
+        world: _merge_chunks(chunks, world_responses)
+        for world, (chunks, world_responses) in chunks_by_world.items()
+    }
+    for world, world_results in results.items():
+        _record_history(world, world_results)
     return results
 
+def fetch_prices_from_api(
+        item_ids: List[int],
+        max_concurrency: int = UNIVERSALIS_MAX_CONCURRENCY,
+        world: World = DEFAULT_WORLD,
+    ) -> List[PriceResult]:
+    # https://docs.universalis.app/#market-board-current-data
+    return fetch_world_prices_from_api({world: item_ids}, max_concurrency)[world]
+
+def _revalidate(
+        item_ids: List[int], world: World, fetch: Optional[WorldFetcher] = None,
+    ) -> List[PriceResult]:
+    # refetches go the same way as any other fetch, so that they're shared
+    # with everyone else asking for the same items
+    if fetch is None and PRICE_SERVICE_URL:
+        return lookup_world_prices_from_service(
+            item_ids, [world], refresh=True,
+        )[world]
+    fetch = fetch or fetch_world_prices_from_api
+    return fetch({world: item_ids}, UNIVERSALIS_MAX_CONCURRENCY)[world]
+
+def _check_cache(
+        cache: PriceCache,
+        world: World,
+        item_ids: List[int],
+        fetch: Optional[WorldFetcher] = None,
+    ) -> Tuple[Dict[int, PriceResult], List[int]]:
+    """
+    Returns the usable cached results and the ids that need to be fetched.
+    Stale rows are served as-is and refreshed in the background when the
+    cache allows stale-while-revalidate, with fetch if given and otherwise
+    through the price service when PRICE_SERVICE_URL is set. With
+    PRICES_FROM_STORE_ONLY, the price_refresher owns the cache and nothing is
+    fetched here at all.
+    """
+    fresh, stale = cache.get_many(world, item_ids)
+    if PRICES_FROM_STORE_ONLY:
+        fresh.update(stale)
+        return fresh, []
+    if stale and cache.stale_while_revalidate:
+        cache.refresh_in_background(
+            world,
+            list(stale),
+            functools.partial(_revalidate, world=world, fetch=fetch),
+        )
+        fresh.update(stale)
+    missing = [item_id for item_id in item_ids if item_id not in fresh]
+    return fresh, missing
+
+def _ordered_results(
+        item_ids: List[int], results: Dict[int, PriceResult],
+    ) -> List[PriceResult]:
+    return [results[item_id] for item_id in item_ids if item_id in results]
+
+def lookup_world_prices_local(
+        item_ids: List[int],
+        worlds: Iterable[Union[World, str]],
+        max_concurrency: int = UNIVERSALIS_MAX_CONCURRENCY,
+        use_cache: bool = True,
+        refresh: bool = False,
+        fetch: Optional[WorldFetcher] = None,
+    ) -> Dict[World, List[PriceResult]]:
+    """
+    lookup_world_prices against this process' own cache, fetching whatever
+    is missing with fetch (fetch_world_prices_from_api by default).
+    """
+    fetch = fetch or fetch_world_prices_from_api
+    worlds = expand_worlds(worlds)
+    item_ids = list(dict.fromkeys(int(item_id) for item_id in item_ids))
+    if not use_cache:
+        return fetch({world: item_ids for world in worlds}, max_concurrency)
+
+    cache = get_price_cache()
+    results, missing = {}, {}
+    for world in worlds:
+        if refresh:
+            results[world], missing[world] = {}, item_ids
+        else:
+            results[world], missing[world] = _check_cache(
+                cache, world, item_ids, fetch,
+            )
+    fetched = fetch(
+        {world: ids for world, ids in missing.items() if ids}, max_concurrency,
+    )
+    for world, world_results in fetched.items():
+        cache.put_many(world, world_results)
+        results[world].update(
+            (result["item_id"], result) for result in world_results
+        )
+    return {
+        world: _ordered_results(item_ids, results[world]) for world in worlds
+    }
+
+def lookup_world_prices_from_service(
+        item_ids: List[int],
+        worlds: Iterable[Union[World, str]],
+        refresh: bool = False,
+        url: Optional[str] = PRICE_SERVICE_URL,
+    ) -> Dict[World, List[PriceResult]]:
+    """
+    lookup_world_prices through the price service at url, which shares one
+    cache and one set of upstream requests between every caller.
+    """
+    worlds = expand_worlds(worlds)
+    response = get_http_client().request(
+        "POST",
+        f"{url}/prices",
+        json={
+            "item_ids": [int(item_id) for item_id in item_ids],
+            "worlds": worlds,
+            "refresh": refresh,
+        },
+        # the service may have to wait on universalis itself
+        timeout=UNIVERSALIS_TIMEOUT * 2,
+    )
+    response.raise_for_status()
+    return dict(zip(worlds, response.json()["prices"]))
+
+def lookup_world_prices(
+        item_ids: List[int],
+        worlds: Iterable[Union[World, str]],
+        max_concurrency: int = UNIVERSALIS_MAX_CONCURRENCY,
+        use_cache: bool = True,
+        refresh: bool = False,
+    ) -> Dict[World, List[PriceResult]]:
+    """
+    lookup_prices for every one of worlds (datacenter names are expanded to
+    their worlds). Only the ids missing from each world's cache are fetched,
+    all worlds at once. Goes through the price service when PRICE_SERVICE_URL
+    is set, unless use_cache is False.
+    """
+    if use_cache and PRICE_SERVICE_URL:
+        return lookup_world_prices_from_service(item_ids, worlds, refresh)
+    return lookup_world_prices_local(
+        item_ids, worlds, max_concurrency, use_cache, refresh,
+    )
+
+def lookup_prices(
+        item_ids: List[int],
+        max_concurrency: int = UNIVERSALIS_MAX_CONCURRENCY,
+        use_cache: bool = True,
+        refresh: bool = False,
+        world: World = DEFAULT_WORLD,
+    ) -> List[PriceResult]:
+    """
+    Prices for item_ids on world, in the same order. Cached prices are used
+    unless use_cache is False; refresh fetches everything again but still
+    updates the cache. world must be a single world, not a datacenter.
+    """
+    _check_single_world(world)
+    return lookup_world_prices(
+        item_ids, [world], max_concurrency, use_cache, refresh,
+    )[world]
+
+def lookup_prices_by_world(
+        item_ids: List[int],
+        worlds: Iterable[Union[World, str]],
+        max_concurrency: int = UNIVERSALIS_MAX_CONCURRENCY,
+        use_cache: bool = True,
+        refresh: bool = False,
+    ) -> pd.DataFrame:
+    """
+    lookup_world_prices as one long frame with a row per (world, item_id),
+    using the app column names.
+    """
+    results = lookup_world_prices(
+        item_ids, worlds, max_concurrency, use_cache, refresh,
+    )
+    frames = [
+        pd.DataFrame.from_records(
+            world_results, columns=["item_id", *PRICE_COL_MAP],
+        ).assign(world=world)
+        for world, world_results in results.items()
+    ]
+    if not frames:
+        return pd.DataFrame(columns=["world", "item_id", *PRICE_COL_MAP.values()])
+    prices = pd.concat(frames, ignore_index=True).rename(columns=PRICE_COL_MAP)
+    return prices[["world", "item_id", *PRICE_COL_MAP.values()]]
+
+def compare_worlds(
+        prices: pd.DataFrame, price_col: str = "min_price",
+    ) -> pd.DataFrame:
+    """
+    Summarize lookup_prices_by_world output per item: the cheapest and most
+    expensive world by price_col and the spread between them.
+    """
+    prices = prices.dropna(subset=[price_col])
+    prices = prices.loc[prices[price_col] > 0]
+    by_item = prices.groupby("item_id")[price_col]
+    cheapest = prices.loc[by_item.idxmin(), ["item_id", "world", price_col]]
+    priciest = prices.loc[by_item.idxmax(), ["item_id", "world", price_col]]
+    comparison = cheapest.merge(
+        priciest, on="item_id", suffixes=("_cheapest", "_priciest"),
+    ).rename(columns={
+        "world_cheapest": "cheapest_world",
+        f"{price_col}_cheapest": "cheapest_price",
+        "world_priciest": "priciest_world",
+        f"{price_col}_priciest": "priciest_price",
+    })
+    comparison["price_spread"] = (
+        comparison["priciest_price"] - comparison["cheapest_price"]
+    )
+    comparison["n_worlds"] = comparison["item_id"].map(by_item.size())
+    for col in ("cheapest_world", "priciest_world"):
+        comparison[col] = comparison[col].map(
+            lambda world: WORLD_NAMES.get(world, world)
+        )
+    return comparison
+
+async def _fetch_chunk_async(
+        session: aiohttp.ClientSession,
+        semaphore: asyncio.Semaphore,
+        world: World,
+        item_ids: List[int],
+    ) -> Dict[int, Dict[str, Any]]:
+    async with semaphore:
+        async with get_http_client().request_async(
+            session,
+            "GET",
+            _prices_url(world, item_ids),
+            params=_prices_params(item_ids),
+        ) as response:
+            response.raise_for_status()
+            if ijson is None or len(item_ids) == 1:
+                data = await response.json()
+                return _items_from_response(item_ids, data)
+            return {
+                int(item_id): item_data
+                async for item_id, item_data in ijson.kvitems_async(
+                    response.content, "items", use_float=True,
+                )
+            }
+
+async def fetch_prices_from_api_async(
+        item_ids: List[int],
+        max_concurrency: int = UNIVERSALIS_MAX_CONCURRENCY,
+        session: Optional[aiohttp.ClientSession] = None,
+        world: World = DEFAULT_WORLD,
+    ) -> List[PriceResult]:
+    chunks = chunk_item_ids(item_ids)
+    if not chunks:
+        return []
+    semaphore = asyncio.Semaphore(max_concurrency)
+    owns_session = session is None
+    if owns_session:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_concurrency),
+            timeout=aiohttp.ClientTimeout(total=UNIVERSALIS_TIMEOUT),
+        )
+    try:
+        responses = await asyncio.gather(*(
+            _fetch_chunk_async(session, semaphore, world, chunk)
+            for chunk in chunks
+        ))
+    finally:
+        if owns_session:
+            await session.close()
+    results = _merge_chunks(chunks, list(responses))
+    _record_history(world, results)
+    return results
+
+async def lookup_prices_async(
+        item_ids: List[int],
+        max_concurrency: int = UNIVERSALIS_MAX_CONCURRENCY,
+        session: Optional[aiohttp.ClientSession] = None,
+        use_cache: bool = True,
+        world: World = DEFAULT_WORLD,
+    ) -> List[PriceResult]:
+    """
+    Same as lookup_prices, for callers that are already inside an event loop.
+    """
+    _check_single_world(world)
+    if use_cache and PRICE_SERVICE_URL:
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(
+            None, lookup_world_prices_from_service, item_ids, [world],
+        )
+        return results[world]
+    if not use_cache:
+        return await fetch_prices_from_api_async(
+            item_ids, max_concurrency, session, world,
+        )
+
+    cache = get_price_cache()
+    item_ids = list(dict.fromkeys(int(item_id) for item_id in item_ids))
+    results, missing = _check_cache(cache, world, item_ids)
+    if missing:
+        fetched = await fetch_prices_from_api_async(
+            missing, max_concurrency, session, world,
+        )
+        cache.put_many(world, fetched)
+        results.update((result["item_id"], result) for result in fetched)
+    return _ordered_results(item_ids, results)
+
+def merge_prices(
+        data: pd.DataFrame,
+        price_results: List[PriceResult],
+        normalize_by: Optional[str] = None,
+        cols_to_normalize: Iterable[str] = (),
+    ) -> pd.DataFrame:
+    """
+    Join lookup_prices output onto data by its "id" column and return a new
+    frame, leaving data untouched. Each of cols_to_normalize gets a
+    normalized_{col} counterpart divided by the normalize_by column.
+    """
+    prices = pd.DataFrame.from_records(
+        price_results, columns=["item_id", *PRICE_COL_MAP],
+    ).rename(columns=PRICE_COL_MAP).set_index("item_id")
+    # prices are replaced wholesale if data already carries them
+    merged = data.drop(
+        columns=[col for col in prices.columns if col in data.columns],
+    ).join(prices, on="id")
+    if normalize_by is not None:
+        divisor = merged[normalize_by].to_numpy(dtype=float)
+        merged = merged.assign(**{
+            f"normalized_{col}": merged[col].to_numpy(dtype=float) / divisor
+            for col in cols_to_normalize
+        })
+    return merged
+
 async def lookup_item_by_name(
         client: pyxivapi.XIVAPIClient, item_name: str,
     ) -> Dict[str, Union[str, int]]:
+    # the local catalog answers without a round trip when it has the item
+    catalog = get_catalog()
+    record = None if catalog is None else catalog.find(item_name)
+    if record is not None:
+        return {
+            "ID": record["id"],
+            "Name": record["item_name"],
+            "cost": record["price_low"] or record["price_mid"],
+        }
     # https://github.com/xivapi/xivapi-py
-    response = await client.index_search(
+    response = await get_http_client().xivapi_call(
+        client.index_search,
         indexes=["item"],
         name=item_name,
         string_algo="match",
@@ -47,4 +573,4 @@ async def lookup_item_by_name(
     else:
         results["cost"] = results["PriceMid"]
     del results["PriceMid"], results["PriceLow"]
-    return results
\ No newline at end of file
+    return results
@@ -10,17 +10,33 @@ setup(
     long_description=long_description,
     author="Shugo Boy",
     # url="",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks", "tests", "tests.*"]),
     # packages=["ffixv_shugo"],
     # package_dir={"ffxiv_shugo": "src"},
     python_requires=">=3.9.5",
     install_requires=[
+        "aiohttp==3.8.5",
         "beautifulsoup4==4.12.2",
         "lxml==4.9.3",
         "numpy==1.23.5",
         "pandas==1.5.3",
+        "pyarrow==12.0.1",
         "pyxivapi==0.5.1",
+        "requests==2.31.0",
         "selenium==4.11.2",
         "streamlit==1.22.0",
     ],
+    extras_require={
+        # incremental parsing of large universalis responses
+        "streaming": ["ijson==3.2.3"],
+        # decoding the universalis websocket's bson messages
+        "live": ["pymongo==4.5.0"],
+        "tests": ["pytest==7.4.0"],
+    },
+    entry_points={
+        "console_scripts": [
+            "ffxiv-roi-report=ffxiv_shugo.scripts.roi_report:main",
+            "ffxiv-price-service=ffxiv_shugo.price_service:main",
+        ],
+    },
 )
\ No newline at end of file
@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# constants needs a BASE_DIR with secrets.toml before anything is imported
+if "BASE_DIR" not in os.environ:
+    base_dir = tempfile.mkdtemp(prefix="ffxiv_shugo_tests_")
+    os.makedirs(os.path.join(base_dir, "data"))
+    with open(os.path.join(base_dir, "secrets.toml"), "w") as f:
+        f.write('[ffxivapi]\napi_key = "test"\n')
+    os.environ["BASE_DIR"] = base_dir
@@ -0,0 +1,50 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ffxiv_shugo import http_client
+from ffxiv_shugo.http_client import XIVAPI_HOST, HttpClient
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b"x" * 1000
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+
+def test_streamed_responses_hold_their_slot_until_closed(url):
+    client = HttpClient()
+    limiter = client.limiter(url)
+    with client.stream("GET", url) as response:
+        assert limiter.in_flight == 1
+        assert len(response.raw.read()) == 1000
+    assert limiter.in_flight == 0
+
+    assert len(client.request("GET", url).content) == 1000
+    assert limiter.in_flight == 0
+
+def test_xivapi_none_results_are_retried_without_pausing(monkeypatch):
+    monkeypatch.setattr(http_client, "backoff_delay", lambda *args: 0.0)
+    results = iter([None, {"ID": 1}])
+
+    async def call():
+        return next(results)
+
+    client = HttpClient()
+    assert asyncio.run(client.xivapi_call(call)) == {"ID": 1}
+    limiter = client.limiter(XIVAPI_HOST)
+    assert limiter.in_flight == 0
+    assert limiter._paused_until == 0.0
@@ -0,0 +1,124 @@
+import time
+import pytest
+from typing import Callable
+
+from ffxiv_shugo import live_listings
+from ffxiv_shugo.live_listings import LiveListings
+from tests.universalis_ws import UniversalisWsStandIn
+
+WORLD = 53
+ITEM_ID = 5
+TIMEOUT = 10.0
+
+def listing(listing_id: str, price: int, quantity: int = 1):
+    return {
+        "listingID": listing_id,
+        "pricePerUnit": price,
+        "quantity": quantity,
+        "hq": False,
+    }
+
+def event(name: str, *listings, item_id: int = ITEM_ID):
+    return {
+        "event": f"listings/{name}",
+        "item": item_id,
+        "world": WORLD,
+        "listings": list(listings),
+    }
+
+def wait_for(condition: Callable[[], bool]) -> None:
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+def listing_ids(feed: LiveListings):
+    book = feed.book(WORLD, ITEM_ID)
+    return None if book is None else [row["listingID"] for row in book.listings()]
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    stand_in = UniversalisWsStandIn().start()
+    monkeypatch.setattr(
+        live_listings, "UNIVERSALIS_API_URL", f"{stand_in.url}/api/v2",
+    )
+    stand_in.listings[str(WORLD)] = {
+        ITEM_ID: [listing("a", 100), listing("b", 120)],
+    }
+    yield stand_in
+    stand_in.stop()
+
+@pytest.fixture
+def feed(stand_in):
+    feed = LiveListings([WORLD], url=stand_in.ws_url, encoding="json")
+    feed.watch([ITEM_ID])
+    yield feed.start()
+    feed.stop()
+
+def test_add_and_remove_events(stand_in, feed):
+    assert feed.connected.wait(TIMEOUT)
+    assert listing_ids(feed) == ["a", "b"]
+    assert {"event": "subscribe", "channel": f"listings/add{{world={WORLD}}}"} in (
+        stand_in.subscriptions
+    )
+
+    stand_in.push(event("add", listing("c", 90)))
+    wait_for(lambda: listing_ids(feed) == ["c", "a", "b"])
+    assert feed.min_prices(WORLD) == {ITEM_ID: 90.0}
+
+    # a relisting at a new price replaces the old listing
+    stand_in.push(event("add", listing("a", 130)))
+    wait_for(lambda: listing_ids(feed) == ["c", "b", "a"])
+
+    stand_in.push(event("remove", listing("c", 90)))
+    wait_for(lambda: listing_ids(feed) == ["b", "a"])
+
+    # unwatched items don't get a book
+    stand_in.push(event("add", listing("d", 1), item_id=ITEM_ID + 1))
+    stand_in.push(event("remove", listing("b", 120)))
+    wait_for(lambda: listing_ids(feed) == ["a"])
+    assert feed.book(WORLD, ITEM_ID + 1) is None
+
+def test_events_during_backfill_are_replayed(stand_in):
+    stand_in.hold_backfill.clear()
+    feed = LiveListings([WORLD], url=stand_in.ws_url, encoding="json")
+    feed.watch([ITEM_ID])
+    feed.start()
+    try:
+        wait_for(lambda: stand_in.backfill_requests == 1)
+        stand_in.push(event("add", listing("c", 90)))
+        stand_in.push(event("remove", listing("b", 120)))
+        wait_for(lambda: len(feed._pending.get(ITEM_ID, [])) == 2)
+        assert not feed.connected.is_set()
+        assert feed.book(WORLD, ITEM_ID) is None
+
+        stand_in.hold_backfill.set()
+        assert feed.connected.wait(TIMEOUT)
+        assert listing_ids(feed) == ["c", "a"]
+    finally:
+        feed.stop()
+
+def test_books_are_rebuilt_after_reconnecting(stand_in, feed):
+    assert feed.connected.wait(TIMEOUT)
+    stand_in.push(event("add", listing("c", 90)))
+    wait_for(lambda: listing_ids(feed) == ["c", "a", "b"])
+
+    # what happened while the feed was away only shows up in the backfill
+    stand_in.listings[str(WORLD)][ITEM_ID] = [listing("b", 120), listing("e", 80)]
+    stand_in.drop_connections()
+    wait_for(lambda: stand_in.backfill_requests == 2)
+    wait_for(lambda: listing_ids(feed) == ["e", "b"])
+    assert feed.connected.wait(TIMEOUT)
+
+    stand_in.push(event("add", listing("f", 70)))
+    wait_for(lambda: listing_ids(feed) == ["f", "e", "b"])
+
+def test_failed_backfills_of_newly_watched_items_are_retried(stand_in, feed):
+    assert feed.connected.wait(TIMEOUT)
+    stand_in.listings[str(WORLD)][ITEM_ID + 1] = [listing("x", 10)]
+    stand_in.fail_backfill = 1
+    feed.watch([ITEM_ID + 1])
+    wait_for(lambda: feed.book(WORLD, ITEM_ID + 1) is not None)
+    assert stand_in.backfill_requests == 3
+    assert feed.min_prices(WORLD) == {ITEM_ID: 100.0, ITEM_ID + 1: 10.0}
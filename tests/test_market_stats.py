@@ -0,0 +1,33 @@
+import pytest
+
+from ffxiv_shugo.market_stats import MIN_SPAN_DAYS, market_stats
+
+NOW = 1_700_000_000
+
+def sale(seconds_ago: int, price: float = 100, quantity: int = 1, hq: bool = False):
+    return {
+        "pricePerUnit": price,
+        "quantity": quantity,
+        "hq": hq,
+        "timestamp": NOW - seconds_ago,
+    }
+
+def test_sales_within_the_hour_are_not_spread_over_a_day():
+    # 50 sales, one a minute, as universalis returns for a busy item
+    items = {1: {"recentHistory": [sale(60 * k, quantity=2) for k in range(1, 51)]}}
+    stats = market_stats(items, now=NOW).loc[1]
+    days = 50 * 60 / 86400
+    assert stats["sales_per_day"] == pytest.approx(50 / days)
+    assert stats["units_per_day"] == pytest.approx(100 / days)
+    assert stats["sales_per_day"] > 50
+
+def test_sales_over_several_days():
+    items = {1: {"recentHistory": [sale(86400 * k) for k in (1, 2, 4)]}}
+    stats = market_stats(items, now=NOW).loc[1]
+    assert stats["sales_per_day"] == pytest.approx(3 / 4)
+
+def test_a_sale_made_just_now():
+    items = {1: {"recentHistory": [sale(0)]}, 2: {"recentHistory": []}}
+    stats = market_stats(items, now=NOW)
+    assert stats.loc[1, "sales_per_day"] == pytest.approx(1 / MIN_SPAN_DAYS)
+    assert stats.loc[2].isna().all()
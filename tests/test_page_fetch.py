@@ -0,0 +1,37 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ffxiv_shugo.page_fetch import WebDriverPageFetcher
+
+class FakeDriver:
+    def __init__(self):
+        self.page_source = ""
+
+    def get(self, url: str) -> None:
+        self.page_source = url
+        time.sleep(0.01)
+
+    def quit(self) -> None:
+        pass
+
+def test_webdriver_pool_never_grows_past_pool_size():
+    fetcher = WebDriverPageFetcher(pool_size=2)
+    started = []
+    lock = threading.Lock()
+
+    def new_driver():
+        # slow enough that every worker sees the pool as not yet full
+        time.sleep(0.05)
+        driver = FakeDriver()
+        with lock:
+            started.append(driver)
+        return driver
+
+    fetcher._new_driver = new_driver
+    urls = [f"https://example.com/{k}" for k in range(32)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        pages = list(executor.map(fetcher.fetch, urls))
+    assert [page.text for page in pages] == urls
+    assert len(started) == 2
+    fetcher.close()
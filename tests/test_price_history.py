@@ -0,0 +1,47 @@
+import glob
+import os
+import pandas as pd
+
+from ffxiv_shugo import price_history
+from ffxiv_shugo.price_history import (
+    CLAIM_SUFFIX,
+    append_snapshot,
+    read_history,
+    rollup,
+)
+
+NOW = 1_700_000_000
+DAY = "2023-11-14"
+
+def prices(*item_ids):
+    return pd.DataFrame({
+        "item_id": list(item_ids),
+        "min_price": [float(item_id) for item_id in item_ids],
+    })
+
+def raw_files(root, pattern="*.parquet"):
+    return glob.glob(os.path.join(root, "raw", f"date={DAY}", pattern))
+
+def test_appends_are_compacted_once_files_pile_up(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    monkeypatch.setattr(price_history, "PRICE_HISTORY_COMPACT_FILES", 4)
+    for k in range(9):
+        append_snapshot(53, prices(1, 2), timestamp=NOW + k, root=root)
+    # compacted at the 4th and 7th appends, leaving that and the 8th and 9th
+    assert len(raw_files(root)) == 3
+    history = read_history([1, 2], root=root)
+    assert len(history) == 18
+    assert history["timestamp"].nunique() == 9
+
+def test_rollup_puts_back_abandoned_claims(tmp_path):
+    root = str(tmp_path)
+    for k in range(3):
+        append_snapshot(53, prices(1), timestamp=NOW + k, root=root)
+    path = raw_files(root)[0]
+    os.rename(path, f"{path}.0123abcd{CLAIM_SUFFIX}")
+    assert len(read_history([1], root=root)) == 2
+
+    rollup(now=NOW + 86400, root=root)
+    assert raw_files(root, f"*{CLAIM_SUFFIX}") == []
+    assert len(raw_files(root)) == 1
+    assert len(read_history([1], root=root)) == 3
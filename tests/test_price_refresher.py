@@ -0,0 +1,25 @@
+import pytest
+
+from ffxiv_shugo.constants import REFRESHER_MIN_INTERVAL
+from ffxiv_shugo.scripts import price_refresher
+
+class Stop(Exception):
+    pass
+
+def test_empty_catalog_is_waited_on_unless_once(monkeypatch):
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 3:
+            raise Stop
+
+    monkeypatch.setattr(price_refresher, "CATALOG_TABLES", ["no_such_table"])
+    monkeypatch.setattr(price_refresher, "rollup", lambda: None)
+    monkeypatch.setattr(price_refresher.time, "sleep", sleep)
+    price_refresher.run([53], once=True)
+    assert sleeps == []
+
+    with pytest.raises(Stop):
+        price_refresher.run([53])
+    assert sleeps == [REFRESHER_MIN_INTERVAL] * 3
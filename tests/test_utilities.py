@@ -0,0 +1,66 @@
+import time
+import numpy as np
+import pandas as pd
+import pytest
+
+from ffxiv_shugo import utilities
+from ffxiv_shugo.price_cache import PriceCache
+from ffxiv_shugo.utilities import lookup_world_prices_local, world_id
+
+@pytest.mark.parametrize("world", [
+    53,
+    np.int64(53),
+    np.int32(53),
+    pd.Series([53])[0],
+    "53",
+    " 53 ",
+    "Exodus",
+    "exodus",
+])
+def test_world_id(world):
+    assert world_id(world) == 53
+    assert type(world_id(world)) is int
+
+@pytest.mark.parametrize("world", ["Primal", "Nowhere", 53.5])
+def test_world_id_rejects_non_worlds(world):
+    with pytest.raises(ValueError):
+        world_id(world)
+
+def test_stale_prices_are_refetched_the_way_misses_are(tmp_path, monkeypatch):
+    # everything is stale as soon as it's cached
+    cache = PriceCache(
+        str(tmp_path / "prices.sqlite"), ttl=-1, stale_while_revalidate=True,
+    )
+    monkeypatch.setattr(utilities, "get_price_cache", lambda: cache)
+    calls = []
+
+    def fetch(item_ids_by_world, max_concurrency):
+        if item_ids_by_world:
+            calls.append(item_ids_by_world)
+        return {
+            world: [{"item_id": item_id} for item_id in item_ids]
+            for world, item_ids in item_ids_by_world.items()
+        }
+
+    lookup_world_prices_local([1, 2], [53], fetch=fetch)
+    assert calls == [{53: [1, 2]}]
+    results = lookup_world_prices_local([1, 2], [53], fetch=fetch)
+    assert results == {53: [{"item_id": 1}, {"item_id": 2}]}
+    deadline = time.monotonic() + 10
+    while len(calls) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert calls == [{53: [1, 2]}, {53: [1, 2]}]
+
+def test_refetches_go_through_the_price_service(monkeypatch):
+    lookups = []
+
+    def lookup_from_service(item_ids, worlds, refresh=False):
+        lookups.append((item_ids, worlds, refresh))
+        return {world: [] for world in worlds}
+
+    monkeypatch.setattr(utilities, "PRICE_SERVICE_URL", "http://prices")
+    monkeypatch.setattr(
+        utilities, "lookup_world_prices_from_service", lookup_from_service,
+    )
+    assert utilities._revalidate([1, 2], 53) == []
+    assert lookups == [([1, 2], [53], True)]
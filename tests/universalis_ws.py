@@ -0,0 +1,103 @@
+"""
+A local stand-in for the universalis websocket and the REST listings it's
+backfilled from, speaking json so that no bson library is needed.
+"""
+
+import asyncio
+import json
+import threading
+from typing import Any, Dict, List
+from aiohttp import web
+
+class UniversalisWsStandIn:
+    """
+    Serves /api/ws and /api/v2/{world}/{ids} on a free local port. listings
+    (str(world) -> item_id -> listings) is what the REST API answers with.
+    Close hold_backfill to keep REST requests waiting until it's set again,
+    and set fail_backfill to answer that many of them with a 404.
+    """
+    def __init__(self):
+        self.listings: Dict[str, Dict[int, List[Dict[str, Any]]]] = {}
+        self.subscriptions: List[Dict[str, Any]] = []
+        self.hold_backfill = threading.Event()
+        self.hold_backfill.set()
+        self.backfill_requests = 0
+        self.fail_backfill = 0
+        self._clients: List[web.WebSocketResponse] = []
+        self._loop = asyncio.new_event_loop()
+        self._runner = None
+        self.url = None
+
+    async def _ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._clients.append(ws)
+        async for message in ws:
+            self.subscriptions.append(json.loads(message.data))
+        self._clients.remove(ws)
+        return ws
+
+    async def _listings(self, request: web.Request) -> web.Response:
+        self.backfill_requests += 1
+        await self._loop.run_in_executor(None, self.hold_backfill.wait)
+        if self.fail_backfill:
+            self.fail_backfill -= 1
+            raise web.HTTPNotFound()
+        world = request.match_info["world"]
+        item_ids = [int(item_id) for item_id in request.match_info["ids"].split(",")]
+        world_listings = self.listings.get(world, {})
+        items = {
+            str(item_id): {"listings": world_listings.get(item_id, [])}
+            for item_id in item_ids
+        }
+        if len(item_ids) == 1:
+            return web.json_response(items[str(item_ids[0])])
+        return web.json_response({"items": items})
+
+    def start(self) -> "UniversalisWsStandIn":
+        app = web.Application()
+        app.router.add_get("/api/ws", self._ws)
+        app.router.add_get("/api/v2/{world}/{ids}", self._listings)
+        self._runner = web.AppRunner(app)
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, "127.0.0.1", 0)
+            self._loop.run_until_complete(site.start())
+            port = self._runner.addresses[0][1]
+            self.url = f"http://127.0.0.1:{port}"
+            started.set()
+            self._loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        started.wait()
+        return self
+
+    @property
+    def ws_url(self) -> str:
+        return self.url.replace("http://", "ws://") + "/api/ws"
+
+    def _run(self, coro) -> Any:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(10)
+
+    def push(self, event: Dict[str, Any]) -> None:
+        """
+        Send event to every connected client.
+        """
+        async def send():
+            for ws in list(self._clients):
+                await ws.send_str(json.dumps(event))
+        self._run(send())
+
+    def drop_connections(self) -> None:
+        async def close():
+            for ws in list(self._clients):
+                await ws.close()
+        self._run(close())
+
+    def stop(self) -> None:
+        self.hold_backfill.set()
+        self._run(self._runner.cleanup())
+        self._loop.call_soon_threadsafe(self._loop.stop)